@@ -0,0 +1,117 @@
+import re, threading
+from typing import List, Sequence, Tuple
+import numpy as np
+from api.corpus import Corpus, get_corpus
+from api.context_packer import count_tokens
+
+_SEQ = re.compile(r"-c(\d+)$")
+SEPARATOR = "\n\n"  # how chunk_brl.py joins children into a parent
+
+class AdjacencyIndex:
+    """
+    Sibling links over the corpus rows (children of a work are contiguous, in c00001.. order):
+      prev[i] / next[i]   neighbouring child of the same work with seq -/+ 1, or -1
+      parent_lo/hi[i]     row span [lo, hi) of the children sharing i's parent
+    Token counts are filled lazily, only for rows an expansion touches.
+    """
+    def __init__(self, corpus: Corpus | None = None):
+        self.corpus = corpus or get_corpus()
+        rows = self.corpus.children
+        n = len(rows)
+        self.prev = np.full(n, -1, dtype=np.int32)
+        self.next = np.full(n, -1, dtype=np.int32)
+        self.parent_lo = np.arange(n, dtype=np.int32)
+        self.parent_hi = np.arange(1, n + 1, dtype=np.int32)
+        self._toks = np.full(n, -1, dtype=np.int32)
+
+        seq = [int(m.group(1)) if (m := _SEQ.search(r["id"])) else -1 for r in rows]
+        for i in range(1, n):
+            a, b = rows[i - 1], rows[i]
+            if a["work_id"] == b["work_id"] and seq[i - 1] >= 0 and seq[i] == seq[i - 1] + 1:
+                self.prev[i], self.next[i - 1] = i - 1, i
+        lo = 0
+        for i in range(1, n + 1):
+            if i == n or not rows[i]["parent_id"] or rows[i]["parent_id"] != rows[lo]["parent_id"] or self.prev[i] != i - 1:
+                self.parent_lo[lo:i], self.parent_hi[lo:i] = lo, i
+                lo = i
+
+    def __len__(self):
+        return len(self.prev)
+
+    def tokens(self, i: int) -> int:
+        t = int(self._toks[i])
+        if t < 0:
+            t = count_tokens(self.corpus.children[i]["text"])
+            self._toks[i] = t
+        return t
+
+    def neighbors(self, i: int) -> Tuple[int, int]:
+        return int(self.prev[i]), int(self.next[i])
+
+    def parent_span(self, i: int) -> Tuple[int, int]:
+        return int(self.parent_lo[i]), int(self.parent_hi[i])
+
+    def expand(self, i: int, max_tokens: int) -> Tuple[int, int]:
+        """
+        Grow a contiguous run [lo, hi) around row i up to max_tokens: siblings inside
+        i's parent first, then following text before preceding text.
+        """
+        lo, hi = i, i + 1
+        used = self.tokens(i)
+        plo, phi = self.parent_span(i)
+        while True:
+            after = hi if self.next[hi - 1] == hi else -1
+            before = lo - 1 if self.prev[lo] == lo - 1 else -1
+            order = sorted((c for c in (after, before) if c >= 0),
+                           key=lambda c: (not plo <= c < phi, c != after))
+            for c in order:
+                t = self.tokens(c)
+                if used + t <= max_tokens:
+                    used += t
+                    lo, hi = min(lo, c), max(hi, c + 1)
+                    break
+            else:
+                return lo, hi
+
+    def expand_hits(self, rows: Sequence[int], max_tokens: int) -> List[Tuple[int, int, List[int]]]:
+        """
+        Runs for hits given in rank order. A hit already inside an earlier run is
+        folded into it; runs that overlap or touch are merged. Returns
+        (lo, hi, hit_positions) in rank order of each run's best hit. A merged run
+        can exceed max_tokens (each side was capped on its own).
+        """
+        runs: List[List] = []
+        for pos, i in enumerate(rows):
+            owner = next((r for r in runs if r[0] <= i < r[1]), None)
+            if owner is not None:
+                owner[2].append(pos); continue
+            lo, hi = self.expand(i, max_tokens)
+            run = [lo, hi, [pos]]
+            for other in [r for r in runs if r[0] <= hi and lo <= r[1] and self._same_work(r[0], lo)]:
+                run[0], run[1] = min(run[0], other[0]), max(run[1], other[1])
+                run[2] = sorted(other[2] + run[2])
+                runs.remove(other)
+            runs.append(run)
+        runs.sort(key=lambda r: r[2][0])
+        return [(lo, hi, hits) for lo, hi, hits in runs]
+
+    def _same_work(self, a: int, b: int) -> bool:
+        return self.corpus.children[a]["work_id"] == self.corpus.children[b]["work_id"]
+
+    def text(self, lo: int, hi: int) -> str:
+        return SEPARATOR.join(self.corpus.children[j]["text"] for j in range(lo, hi))
+
+    def ids(self, lo: int, hi: int) -> List[str]:
+        return [self.corpus.children[j]["id"] for j in range(lo, hi)]
+
+_ADJ: AdjacencyIndex | None = None
+_LOCK = threading.Lock()
+
+def get_adjacency() -> AdjacencyIndex:
+    """Process-wide adjacency index over get_corpus(), built on first use."""
+    global _ADJ
+    if _ADJ is None:
+        with _LOCK:
+            if _ADJ is None:
+                _ADJ = AdjacencyIndex()
+    return _ADJ
@@ -0,0 +1,174 @@
+"""
+Admission control: one concurrency pool per route class, each with a bounded FIFO
+wait queue and a queueing deadline.
+
+  ADMIT_SEARCH_CONCURRENCY / _QUEUE / _WAIT   /search, /search/batch                  (12 / 8 / 2s)
+  ADMIT_ANSWER_CONCURRENCY / _QUEUE / _WAIT   /answer, /answer/stream, /answer/batch  (20 / 6 / 10s)
+
+A request over its pool's limit waits in the queue for at most _WAIT seconds. A full
+queue answers 429 at once; a missed deadline answers 503. Both carry Retry-After,
+estimated from how long requests have recently held a slot. Other routes (/healthz,
+/readyz, /metrics, /stats) are never queued, so a burst of slow answers cannot
+starve searches or health checks. ADMISSION=0 disables it.
+
+Shedding (ANSWER_SHED=1, off by default): an /answer or /answer/stream request the answer
+pool turns away is served in extractive mode instead (quoted sentences, no LLM call;
+api/extractive.py) under a search pool slot, marked by scope["state"]["shed"]. It is
+rejected only when the search pool is overloaded too.
+
+Both pools' slots and queues together (46 by default) must stay under fly.toml's
+hard_limit (50), or the proxy turns requests away before the app can queue them per route.
+"""
+import os, math, time, asyncio
+from collections import deque
+from typing import Dict
+from starlette.responses import JSONResponse
+from api.metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE, ADMISSION_WAIT, ADMISSION_REJECTED, ADMISSION_SHED
+
+ADMISSION = os.getenv("ADMISSION", "1") == "1"
+ANSWER_SHED = os.getenv("ANSWER_SHED", "0") == "1"
+
+class Overloaded(Exception):
+    def __init__(self, pool: str, reason: str, retry_after: int):
+        super().__init__(f"{pool} pool {'queue is full' if reason == 'queue_full' else 'queue wait exceeded its deadline'}")
+        self.pool, self.reason, self.retry_after = pool, reason, retry_after
+
+    @property
+    def status(self) -> int:
+        return 429 if self.reason == "queue_full" else 503
+
+class Pool:
+    """A concurrency limit whose waiters are served first come, first served, each for at most `wait` seconds."""
+    def __init__(self, name: str, concurrency: int, queue: int, wait: float):
+        self.name, self.concurrency, self.queue, self.wait = name, concurrency, queue, wait
+        self.active = 0
+        self.hold = 1.0  # EWMA of seconds a request keeps its slot (Retry-After estimate)
+        self._waiters: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        return max(1, min(60, math.ceil(self.hold * (self.waiting + 1) / self.concurrency)))
+
+    def _gauges(self):
+        ADMISSION_ACTIVE.set(self.active, pool=self.name)
+        ADMISSION_QUEUE.set(self.waiting, pool=self.name)
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.inc(pool=self.name, reason=reason)
+        raise Overloaded(self.name, reason, self.retry_after())
+
+    def _forget(self, fut: asyncio.Future):
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    async def acquire(self) -> float:
+        """Take a slot, queueing if needed; returns the seconds waited. Raises Overloaded."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            ADMISSION_WAIT.observe(0.0, pool=self.name)
+            self._gauges()
+            return 0.0
+        if self.waiting >= self.queue:
+            self._reject("queue_full")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._gauges()
+        t = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, self.wait)
+        except asyncio.TimeoutError:
+            self._forget(fut)
+            self._reject("deadline")
+        except BaseException:  # client went away while queued
+            if fut.done() and not fut.cancelled():
+                self.release()  # the slot was handed over just before; pass it on
+            else:
+                self._forget(fut)
+            raise
+        finally:
+            waited = time.perf_counter() - t
+            ADMISSION_WAIT.observe(waited, pool=self.name)
+            self._gauges()
+        return waited
+
+    def release(self, held: float | None = None):
+        """Hand the slot to the oldest waiter, else free it."""
+        if held is not None:
+            self.hold = 0.8 * self.hold + 0.2 * held
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # `active` is unchanged: the slot moves to the waiter
+                self._gauges()
+                return
+        self.active -= 1
+        self._gauges()
+
+    def stats(self) -> Dict:
+        return {"concurrency": self.concurrency, "queue": self.queue, "wait": self.wait,
+                "active": self.active, "waiting": self.waiting, "hold_seconds": round(self.hold, 3)}
+
+def _pool(name: str, concurrency: int, queue: int, wait: float) -> Pool:
+    env = f"ADMIT_{name.upper()}_"
+    return Pool(name, int(os.getenv(env + "CONCURRENCY", str(concurrency))), int(os.getenv(env + "QUEUE", str(queue))),
+                float(os.getenv(env + "WAIT", str(wait))))
+
+SEARCH = _pool("search", 12, 8, 2.0)
+ANSWER = _pool("answer", 20, 6, 10.0)
+POOLS = (SEARCH, ANSWER)
+ROUTES: Dict[str, Pool] = {
+    "/search": SEARCH, "/search/batch": SEARCH,
+    "/answer": ANSWER, "/answer/stream": ANSWER, "/answer/batch": ANSWER,
+}
+# Where an overloaded route's requests go instead (served without the LLM)
+SHED: Dict[str, Pool] = {"/answer": SEARCH, "/answer/stream": SEARCH} if ANSWER_SHED else {}
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware, so a slot is held until the response body (including a
+    stream) has been sent. Goes inside CORSMiddleware so rejections carry CORS headers.
+    """
+    def __init__(self, app, routes: Dict[str, Pool] = ROUTES, shed: Dict[str, Pool] = SHED):
+        self.app = app
+        self.routes = routes
+        self.shed = shed
+
+    async def __call__(self, scope, receive, send):
+        pool = self.routes.get(scope.get("path")) if ADMISSION and scope["type"] == "http" else None
+        if pool is None or scope.get("method") != "POST":
+            return await self.app(scope, receive, send)
+        try:
+            await pool.acquire()
+        except Overloaded as e:
+            pool = await self._shed(scope, e)
+            if pool is not None:
+                return await self._run(pool, scope, receive, send)
+            resp = JSONResponse({"detail": str(e), "pool": e.pool, "reason": e.reason}, status_code=e.status,
+                                headers={"Retry-After": str(e.retry_after)})
+            return await resp(scope, receive, send)
+        await self._run(pool, scope, receive, send)
+
+    async def _shed(self, scope, e: Overloaded) -> Pool | None:
+        """The fallback pool, acquired, with the request marked for extractive mode; None to reject."""
+        fallback = self.shed.get(scope["path"])
+        if fallback is None:
+            return None
+        try:
+            await fallback.acquire()
+        except Overloaded:
+            return None
+        ADMISSION_SHED.inc(pool=e.pool, reason=e.reason)
+        scope.setdefault("state", {})["shed"] = e.reason
+        return fallback
+
+    async def _run(self, pool: Pool, scope, receive, send):
+        t = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(time.perf_counter() - t)
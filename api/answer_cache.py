@@ -0,0 +1,91 @@
+import time, threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from api.embed_cache import normalize_query
+
+class AnswerCache:
+    """
+    TTL + LRU cache of generated answers.
+
+    Exact key: (normalized query, k, filter scope, retrieved chunk ids). Because the
+    evidence set is part of the key, a hit always carries the same citations.
+    Near-duplicate lookup (near_threshold > 0): among entries with the same
+    (k, scope, evidence), reuse one whose query embedding has cosine >= threshold.
+    """
+    def __init__(self, max_items: int = 512, ttl: float = 3600.0, near_threshold: float = 0.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.near_threshold = near_threshold
+        self._items: "OrderedDict[Tuple, Tuple[float, Any, Tuple, np.ndarray | None]]" = OrderedDict()
+        self._by_evidence: Dict[Tuple, List[Tuple]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _keys(query: str, k: int, scope: str | None, chunk_ids: Sequence[str]):
+        evidence = (k, scope or "", tuple(sorted(chunk_ids)))
+        return (normalize_query(query),) + evidence, evidence
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray | None:
+        if vec is None: return None
+        v = np.asarray(vec, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def _drop(self, key: Tuple):
+        _, _, evidence, _ = self._items.pop(key)
+        keys = self._by_evidence.get(evidence, [])
+        if key in keys: keys.remove(key)
+        if not keys: self._by_evidence.pop(evidence, None)
+
+    def get(self, query: str, k: int, scope: str | None, chunk_ids: Sequence[str], query_vec=None):
+        """Returns (value, "exact" | "near") or (None, None)."""
+        key, evidence = self._keys(query, k, scope, chunk_ids)
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] < now:
+                self._drop(key); item = None
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1], "exact"
+            q = self._unit(query_vec) if self.near_threshold > 0 else None
+            if q is not None:
+                for other in list(self._by_evidence.get(evidence, [])):
+                    expires, value, _, vec = self._items[other]
+                    if expires < now:
+                        self._drop(other); continue
+                    if vec is not None and float(vec @ q) >= self.near_threshold:
+                        self._items.move_to_end(other)
+                        self.near_hits += 1
+                        return value, "near"
+            self.misses += 1
+            return None, None
+
+    def put(self, query: str, k: int, scope: str | None, chunk_ids: Sequence[str], value: Any, query_vec=None):
+        if self.max_items <= 0: return
+        key, evidence = self._keys(query, k, scope, chunk_ids)
+        with self._lock:
+            if key in self._items: self._drop(key)
+            self._items[key] = (time.time() + self.ttl, value, evidence, self._unit(query_vec))
+            self._by_evidence.setdefault(evidence, []).append(key)
+            while len(self._items) > self.max_items:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._items),
+            "max_items": self.max_items,
+            "hit_rate": ((self.hits + self.near_hits) / total) if total else 0.0,
+        }
@@ -1,16 +1,55 @@
-import os, glob, json
-from typing import List, Dict, Any
+import os, json, time, asyncio
+IMPORT_T0 = time.perf_counter()  # start of the import -> ready -> first request timeline (/readyz)
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Literal
 from dotenv import load_dotenv
-from fastapi import FastAPI, Body
-from api.fusion_generic import pick_with_fusion
+from fastapi import FastAPI, Body, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from api.fusion_generic import pick_with_fusion, rrf_fuse, CorpusTfidf, TFIDF_PATH
 from api.synthesis_rules import system_hint_for
+from api.embed_cache import EmbedCache
+from api.local_index import LocalIndex
+from api.embedding_profile import EmbeddingProfile, field_dim, check_dim
+from api.filters import get_catalog, get_corpus_bitmaps, milvus_filter, UnknownFilter
+from api.bm25 import BM25Index
+from api.diversity import mmr, MMR_LAMBDA
+from api.phrase_index import PhraseIndex, looks_like_quote, token_spans, anchor
+from api.extractive import extract, EXTRACTIVE_QUOTES
+from api.corpus import get_corpus
+from api.parent_store import open_parent_store
+from api.answer_cache import AnswerCache
+from api.context_packer import pack_context, count_tokens
+from api.adjacency import get_adjacency, SEPARATOR
+from api.singleflight import AsyncSingleFlight, StreamFlight
+from api.upstream import (EMBED, MILVUS, LLM, LLM_MAX_OUTPUT_TOKENS, AsyncMilvus, UpstreamTimeout, make_async_openai, run_blocking,
+                          MILVUS_EXECUTOR)
+from api.lifecycle import Startup, DependencyUnavailable
+from api.admission import AdmissionMiddleware, POOLS as ADMISSION_POOLS
+from api.embed_cache import normalize_query
+from api.metrics import (span, render as render_metrics, observe_usage, TimingMiddleware,
+                         STAGE_SECONDS, FALLBACKS, RETRIEVAL_MODE, RETRIEVED_CHUNKS, CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED,
+                         COALESCED, FLIGHTS, DIVERSITY_REMOVED)
+from fastapi.responses import PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import OpenAI, APITimeoutError
+import numpy as np
 from pymilvus import connections, Collection
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Bahai Assistant API", version="0.1.0")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+@asynccontextmanager
+async def lifespan(app):
+    await STARTUP.start()
+    yield
+    await STARTUP.stop()
+    if AMILVUS is not None: await AMILVUS.close()
+    if aclient is not None and hasattr(aclient, "close"): await aclient.close()
+    MILVUS_EXECUTOR.shutdown(wait=False)
+
+app = FastAPI(title="Bahai Assistant API", version="0.1.0", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)  # per-pool slots + bounded queues (api/admission.py); inside CORS
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"], expose_headers=["Server-Timing"])
+app.add_middleware(TimingMiddleware)
 
 # Optional hybrid helpers (if pymilvus has them)
 HAVE_SR=False
@@ -25,28 +64,167 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PROMPT_ID = os.getenv("PROMPT_ID")
 ZILLIZ_URI = os.getenv("ZILLIZ_URI")
 ZILLIZ_TOKEN = os.getenv("ZILLIZ_TOKEN")
-assert OPENAI_API_KEY and PROMPT_ID and ZILLIZ_URI and ZILLIZ_TOKEN, "Missing required env vars"
+# "zilliz" (default) or "local": exact search over data/index/child_vectors.npy, no vector DB needed
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "zilliz").lower()
+
+# Clients, the vector index and on-disk data are STARTUP dependencies (bottom of this section):
+# loaded after the server is up (STARTUP_MODE, api/lifecycle.py) or by the first request needing them
+client = None    # batch retrieval (search_many), which runs on the threadpool
+aclient = None   # everything else; pool and limits in api/upstream.py
+
+# Model, dimensions and local-index quantization (api/embedding_profile.py)
+EMBED_PROFILE = EmbeddingProfile.from_env()
+EMBED_MODEL = EMBED_PROFILE.cache_model  # embedding cache namespace
+EMBED_CACHE = EmbedCache(
+    max_items=int(os.getenv("EMBED_CACHE_SIZE", "1024")),
+    path=os.getenv("EMBED_CACHE_PATH", "data/cache/embeddings.sqlite") or None,
+)
+
+# Client-side BM25 over data/exports, fused with dense via RRF when server-side hybrid is unavailable
+LOCAL_BM25 = os.getenv("LOCAL_BM25", "1") == "1"
+
+COL = None
+AMILVUS = None
+LOCAL_INDEX = None
+BM25 = None
+# Precomputed corpus TF-IDF for the optional /search rerank stage (scripts/build_tfidf.py)
+TFIDF = None
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "100"))
+# Optional MMR stage ("diversify": true): choose k out of MMR_CANDIDATES over-fetched passages
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "50"))
+# Word-level suffix array for the exact-quote fast path of /search (scripts/build_phrase_index.py)
+PHRASE_SEARCH = os.getenv("PHRASE_SEARCH", "1") == "1"
+PHRASES = None
+# Parent texts for expansion: mmap-packed store (scripts/pack_parents.py), else read from exports
+PARENTS = None
+# Default token cap per run when a request sets "expand": true (contiguous siblings from data/exports)
+EXPAND_MAX_TOKENS = int(os.getenv("EXPAND_MAX_TOKENS", "1500"))
+
+# Generated answers keyed on query + retrieved evidence; ANSWER_CACHE_NEAR > 0 enables near-duplicate reuse
+ANSWER_CACHE = AnswerCache(
+    max_items=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    near_threshold=float(os.getenv("ANSWER_CACHE_NEAR", "0.97")),
+)
+
+def _check_env():
+    if not (OPENAI_API_KEY and PROMPT_ID):
+        raise RuntimeError("Missing required env vars OPENAI_API_KEY / PROMPT_ID")
+    if RETRIEVAL_BACKEND != "local" and not (ZILLIZ_URI and ZILLIZ_TOKEN):
+        raise RuntimeError("Missing ZILLIZ_URI/ZILLIZ_TOKEN")
+
+def _init_openai():
+    global client, aclient
+    if client is None: client = OpenAI()
+    if aclient is None: aclient = make_async_openai()
+
+def _init_index():
+    global COL, AMILVUS, LOCAL_INDEX
+    if RETRIEVAL_BACKEND == "local":
+        index = LocalIndex(quant=EMBED_PROFILE.quant, rescore=EMBED_PROFILE.rescore)
+        if EMBED_PROFILE.dim and index.dim > EMBED_PROFILE.dim:  # longer queries are truncated, shorter ones cannot be
+            check_dim(EMBED_PROFILE, index.dim, "the local index")
+        LOCAL_INDEX = index
+        return
+    connections.connect(alias="default", uri=ZILLIZ_URI, token=ZILLIZ_TOKEN, timeout=30)
+    col = Collection("brl_chunks")
+    check_dim(EMBED_PROFILE, field_dim(col), "brl_chunks.text_dense")
+    col.load()
+    COL, AMILVUS = col, AsyncMilvus(ZILLIZ_URI, ZILLIZ_TOKEN, "brl_chunks", col=col)
+
+def _init_bm25():
+    global BM25
+    BM25 = BM25Index.load_or_build() if LOCAL_BM25 else None
+
+def _init_tfidf():
+    global TFIDF
+    TFIDF = CorpusTfidf.load_or_build() if os.path.exists(TFIDF_PATH) else None
+
+def _init_phrases():
+    global PHRASES
+    PHRASES = PhraseIndex.load_or_build() if PHRASE_SEARCH else None
+
+def _init_parents():
+    global PARENTS
+    PARENTS = open_parent_store()
 
-client = OpenAI()
+# Optional warmup once everything is loaded: tokenizer, corpus, and query embeddings for the
+# queries in WARMUP_QUERIES (one per line), so common questions skip the embeddings call
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_QUERIES = os.getenv("WARMUP_QUERIES", "data/warmup_queries.txt")
+WARMUP_MAX = int(os.getenv("WARMUP_MAX", "100"))
 
-# Connect to Zilliz
-connections.connect(alias="default", uri=ZILLIZ_URI, token=ZILLIZ_TOKEN, timeout=30)
-COL = Collection("brl_chunks")
-COL.load()
+def _warmup() -> Dict[str, Any]:
+    count_tokens("warmup")  # loads the tiktoken encoding
+    if BM25 is not None: get_corpus_bitmaps()  # loads the corpus too
+    queries = []
+    if WARMUP_QUERIES and os.path.exists(WARMUP_QUERIES):
+        with open(WARMUP_QUERIES, encoding="utf-8") as f:
+            queries = [q for q in (line.strip() for line in f) if q and not q.startswith("#")][:WARMUP_MAX]
+    if queries:
+        vecs = embed_many(queries)
+        dense_search_many(vecs[:1], 6, None)  # first search against the index / collection
+    return {"queries": len(queries)}
 
-# Load parents into memory for expansion
-PARENTS: Dict[str, Dict[str, Any]] = {}
-for path in glob.glob("data/exports/*_parents.jsonl"):
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip(): continue
-            r = json.loads(line)
-            PARENTS[r["id"]] = r
+STARTUP = Startup(IMPORT_T0)
+STARTUP.add("env", _check_env)
+STARTUP.add("openai", _init_openai)
+STARTUP.add("index", _init_index)
+STARTUP.add("bm25", _init_bm25)
+STARTUP.add("parents", _init_parents)
+# optional, and may rebuild for seconds on a stale file: loaded after readiness, without blocking it
+STARTUP.add("tfidf", _init_tfidf, deferred=True)
+STARTUP.add("phrases", _init_phrases, deferred=True)
+if WARMUP: STARTUP.warmup = _warmup
+STARTUP.mark("imported")
+
+async def ready():
+    """Route dependency: waits for (or triggers) loading of whatever is not up yet."""
+    STARTUP.mark("first_request")
+    await STARTUP.ensure()
+
+NEEDS_READY = [Depends(ready)]
+
+@app.exception_handler(DependencyUnavailable)
+async def dependency_unavailable(request, exc: DependencyUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+# Concurrent identical requests share one upstream run (SINGLEFLIGHT=0 disables)
+SINGLEFLIGHT = os.getenv("SINGLEFLIGHT", "1") == "1"
+FLIGHT = AsyncSingleFlight()
+STREAM_FLIGHT = StreamFlight()
+
+def _flight_key(mode: str, req: BaseModel):
+    return (mode, normalize_query(req.query), json.dumps(req.dict(exclude={"query"}), sort_keys=True))
+
+async def coalesce(mode: str, req: BaseModel, fn):
+    """Run fn() once per identical in-flight (mode, normalized query, options); duplicates await it."""
+    if not SINGLEFLIGHT:
+        return await fn()
+    result, shared = await FLIGHT.do(_flight_key(mode, req), fn)
+    (COALESCED if shared else FLIGHTS).inc(mode=mode)
+    return result
+
+@app.exception_handler(UpstreamTimeout)
+async def upstream_timeout(request, exc: UpstreamTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
 
 class SearchRequest(BaseModel):
     query: str
     k: int = 6
     work_id: str | None = None
+    # Filters from data/manifests (api/filters.py): any of the listed values, all of the given kinds
+    work_ids: List[str] | None = None
+    authors: List[str] | None = None      # e.g. "Bahá’u’lláh" (accents/apostrophes optional)
+    collections: List[str] | None = None  # e.g. "compilations", "shoghi-effendi"
+    quote: bool | None = None  # phrase lookup first: None = when the query looks like a quote, False = never
+    rerank: str | None = None  # "tfidf": over-fetch, then TF-IDF + RRF rerank (fusion_generic.pick_with_fusion)
+    expand: bool = False       # grow each hit into its contiguous run of siblings (api/adjacency.py)
+    expand_tokens: int | None = None  # per-run token cap, default EXPAND_MAX_TOKENS
+    diversify: bool = False    # MMR over MMR_CANDIDATES candidates (api/diversity.py), after rerank, before expand
+    mmr_lambda: float | None = None     # relevance vs novelty, default MMR_LAMBDA
+    max_per_parent: int | None = None   # caps applied while diversifying
+    max_per_work: int | None = None
 
 class Passage(BaseModel):
     id: str
@@ -57,13 +235,41 @@ class Passage(BaseModel):
     text: str
     source_url: str | None = None
     score: float | None = None
+    span_ids: List[str] | None = None  # child ids covered by `text` when expanded
+    highlight: List[int] | None = None  # [start, end) of the matched quote in `text` (phrase results)
+    anchor: str | None = None           # deep link to the matched quote (`#paragraph:~:text=...`)
 
 class SearchResponse(BaseModel):
     results: List[Passage]
     used_mode: str
+    timings: Dict[str, float] | None = None
+    diversity: Dict[str, int] | None = None  # candidates, removed, and removed per reason
 
-def embed(text: str) -> List[float]:
-    return client.embeddings.create(model="text-embedding-3-large", input=[text]).data[0].embedding
+async def _embed_cache(fn, *args):
+    """EMBED_CACHE calls off the event loop when the SQLite tier is on (busy timeout, periodic prune, shared lock)."""
+    return await run_in_threadpool(fn, *args) if EMBED_CACHE.path else fn(*args)
+
+async def embed(text: str) -> List[float]:
+    with span("embed"):
+        vec = await _embed_cache(EMBED_CACHE.get, text, EMBED_MODEL)
+        if vec is None:
+            resp = await EMBED.call(lambda: aclient.embeddings.create(**EMBED_PROFILE.create_kwargs(), input=[text]))
+            vec = resp.data[0].embedding
+            await _embed_cache(EMBED_CACHE.put, text, EMBED_MODEL, vec)
+    return vec
+
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """One embeddings call for all cache misses (duplicates embedded once)."""
+    with span("embed"):
+        out = [EMBED_CACHE.get(t, EMBED_MODEL) for t in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, out) if v is None))
+        if missing:
+            data = client.embeddings.create(**EMBED_PROFILE.create_kwargs(), input=missing).data
+            got = {t: d.embedding for t, d in zip(missing, data)}
+            for t, v in got.items():
+                EMBED_CACHE.put(t, EMBED_MODEL, v)
+            out = [v if v is not None else got[t] for t, v in zip(texts, out)]
+    return out
 
 def _hits_to_passages(hits, limit=6):
     out=[]
@@ -80,65 +286,383 @@ def _hits_to_passages(hits, limit=6):
         ))
     return out
 
-def dense_search(q: str, k: int, expr: str | None):
-    e = embed(q)
-    res = COL.search(
-        data=[e],
-        anns_field="text_dense",
-        param={"metric_type":"COSINE","params":{"nprobe":16}},
-        limit=k,
-        output_fields=["parent_id","work_id","work_title","paragraph_id","text","source_url"],
-        expr=expr
-    )
+def request_works(req) -> frozenset | None:
+    """Work ids allowed by a request's work_id / work_ids / authors / collections; None = no filter."""
+    work_ids = list(req.work_ids or []) + ([req.work_id] if req.work_id else [])
+    try:
+        return get_catalog().resolve(work_ids=work_ids, authors=req.authors, collections=req.collections)
+    except UnknownFilter as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def filter_key(works: frozenset | None) -> str | None:
+    return ",".join(sorted(works)) if works is not None else None
+
+async def dense_search(e: List[float], k: int, works: frozenset | None):
+    with span("dense_search"):
+        if LOCAL_INDEX is not None:
+            res = await run_in_threadpool(LOCAL_INDEX.search, e, k, works=works)
+        else:
+            expr, params = milvus_filter(works)
+            res = await AMILVUS.search(
+                data=[e],
+                anns_field="text_dense",
+                param={"metric_type":"COSINE","params":{"nprobe":16}},
+                limit=k,
+                output_fields=["parent_id","work_id","work_title","paragraph_id","text","source_url"],
+                expr=expr, expr_params=params,
+            )
     return _hits_to_passages(res, limit=max(120, k))
 
-def hybrid_rrf(q: str, k: int, expr: str | None):
-    e = embed(q)
-    dense_req = AnnSearchRequest([e], "text_dense", {"metric_type":"COSINE","params":{"nprobe":16}}, limit=max(k*3, 20), expr=expr)
-    bm25_req = SparseSearchRequest("text", q, params={"type":"bm25","limit":max(k*3, 20)}, expr=expr)
-    fused = COL.hybrid_search(
-        reqs=[dense_req, bm25_req],
-        rerank=RRFRanker(),
-        limit=k,
-        output_fields=["parent_id","work_id","work_title","paragraph_id","text","source_url"]
-    )
+async def hybrid_rrf(q: str, e: List[float], k: int, works: frozenset | None):
+    expr, params = milvus_filter(works)
+    dense_req = AnnSearchRequest([e], "text_dense", {"metric_type":"COSINE","params":{"nprobe":16}}, limit=max(k*3, 20),
+                                 expr=expr, expr_params=params)
+    bm25_req = SparseSearchRequest("text", q, params={"type":"bm25","limit":max(k*3, 20)}, expr=expr, expr_params=params)
+    with span("hybrid_search"):
+        fused = await MILVUS.call(lambda: run_blocking(lambda: COL.hybrid_search(
+            reqs=[dense_req, bm25_req],
+            rerank=RRFRanker(),
+            limit=k,
+            output_fields=["parent_id","work_id","work_title","paragraph_id","text","source_url"]
+        )))
     return _hits_to_passages(fused, limit=max(120, k))
 
-def build_expr(work_id: str | None):
-    if not work_id:
-        return None
-    return f'work_id == "{work_id}"'
+def dense_search_many(vecs: List[List[float]], k: int, works: frozenset | None) -> List[List[Passage]]:
+    """Multi-vector search sharing one filter: a single matmul locally, one COL.search remotely."""
+    with span("dense_search"):
+        if LOCAL_INDEX is not None:
+            res = LOCAL_INDEX.search_many(vecs, k, works=works)
+        else:
+            expr, params = milvus_filter(works)
+            res = COL.search(
+                data=vecs,
+                anns_field="text_dense",
+                param={"metric_type":"COSINE","params":{"nprobe":16}},
+                limit=k,
+                output_fields=["parent_id","work_id","work_title","paragraph_id","text","source_url"],
+                expr=expr, expr_params=params,
+            )
+    return [_hits_to_passages([hits], limit=max(120, k)) for hits in res]
+
+async def local_hybrid(q: str, e: List[float], k: int, works: frozenset | None):
+    dense = await dense_search(e, max(k*3, 20), works)
+    return await run_in_threadpool(fuse_bm25, q, k, works, dense)
+
+def fuse_bm25(q: str, k: int, works: frozenset | None, dense: List[Passage]):
+    n = max(k*3, 20)
+    dense = dense[:n]
+    with span("bm25"):
+        sparse = BM25.search(q, n, allowed=get_corpus_bitmaps().mask(works) if works is not None else None)
+    corpus = get_corpus()
+    by_idx = {corpus.id_to_idx[p.id]: p for p in dense if p.id in corpus.id_to_idx}
+    fused = rrf_fuse([(i, p.score or 0.0) for i, p in by_idx.items()], sparse, k=60.0)
+    out = []
+    for i, score in sorted(fused.items(), key=lambda x: x[1], reverse=True)[:k]:
+        psg = by_idx.get(i)
+        if psg is None:
+            r = corpus.children[i]
+            psg = Passage(id=r["id"], parent_id=r["parent_id"], work_id=r["work_id"], work_title=r["work_title"],
+                          paragraph_id=r["paragraph_id"], text=r["text"], source_url=r["source_url"])
+        out.append(psg.copy(update={"score": score}))
+    return out
 
-@app.post("/search", response_model=SearchResponse)
-def search(req: SearchRequest):
-    expr = build_expr(req.work_id)
-    if HAVE_SR:
+async def retrieve(query: str, k: int, works: frozenset | None):
+    """(passages, used_mode, query embedding or None when no embedding call was made)."""
+    results, used_mode, e = await _retrieve(query, k, works)
+    RETRIEVAL_MODE.inc(mode=used_mode)
+    return results, used_mode, e
+
+async def _retrieve(query: str, k: int, works: frozenset | None):
+    if works is not None and not works:
+        return [], "filtered_empty", None  # the filter kinds do not intersect
+    e = await embed(query)
+    if LOCAL_INDEX is None and HAVE_SR:
         try:
-            results = hybrid_rrf(req.query, req.k, expr)
-            return SearchResponse(results=results, used_mode="hybrid_rrf")
+            return await hybrid_rrf(query, e, k, works), "hybrid_rrf", e
         except Exception:
-            results = dense_search(req.query, req.k, expr)
-            return SearchResponse(results=results, used_mode="dense_only")
-    else:
-        results = dense_search(req.query, req.k, expr)
-        return SearchResponse(results=results, used_mode="dense_only")
+            FALLBACKS.inc(kind="hybrid_rrf")
+    if BM25 is not None:
+        return await local_hybrid(query, e, k, works), "hybrid_local_bm25", e
+    return await dense_search(e, k, works), "dense_local" if LOCAL_INDEX is not None else "dense_only", e
+
+def phrase_search(query: str, k: int, works: frozenset | None):
+    """Exact / near-exact quote matches as (passages, used_mode), primary sources before compilations; None if nothing matches."""
+    if works is not None and not works:
+        return None
+    with span("phrase"):
+        bitmaps = get_corpus_bitmaps()
+        compilations = get_catalog().collections.get("compilations")
+        prefer = ~bitmaps.mask(frozenset(compilations)) if compilations else None
+        matches = PHRASES.search(query, k, allowed=bitmaps.mask(works) if works is not None else None, prefer=prefer)
+        if not matches:
+            return None
+        corpus, out = get_corpus(), []
+        for m in matches:
+            r = corpus.children[m.doc]
+            spans = token_spans(r["text"], limit=m.end)
+            hl = [spans[m.start][0], spans[m.end - 1][1]] if m.end <= len(spans) else None
+            out.append(Passage(id=r["id"], parent_id=r["parent_id"], work_id=r["work_id"], work_title=r["work_title"],
+                               paragraph_id=r["paragraph_id"], text=r["text"], source_url=r["source_url"],
+                               score=m.coverage, highlight=hl,
+                               anchor=anchor(r["source_url"], r["paragraph_id"], r["text"], *hl) if hl else None))
+    return out, "phrase_exact" if matches[0].exact else "phrase_near"
+
+def wants_phrase(req: SearchRequest) -> bool:
+    if PHRASES is None or req.quote is False:
+        return False
+    return bool(req.quote) or looks_like_quote(req.query)
+
+def mmr_pool(req: SearchRequest) -> int:
+    """Passages retrieval (and rerank) should hand over: the MMR candidate pool, or just k."""
+    return max(MMR_CANDIDATES, req.k) if req.diversify else req.k
+
+def _vector_matrix(ids: List[str], found: Dict[str, Any]):
+    dim = len(next(iter(found.values()))) if found else 1
+    V, has = np.zeros((len(ids), dim), dtype=np.float32), np.zeros(len(ids), dtype=bool)
+    for j, i in enumerate(ids):
+        if i in found:
+            V[j], has[j] = found[i], True
+    return V, has
+
+def candidate_vectors(ids: List[str]):
+    """Blocking: stored vectors of the candidates (local index rows, else text_dense from Milvus) and a found mask."""
+    if LOCAL_INDEX is not None:
+        return LOCAL_INDEX.vectors(ids)
+    rows = COL.query(expr="id in {ids}", expr_params={"ids": ids}, output_fields=["id", "text_dense"])
+    return _vector_matrix(ids, {r["id"]: r["text_dense"] for r in rows})
+
+def apply_mmr(req: SearchRequest, qvec, passages: List[Passage], V: np.ndarray, has: np.ndarray):
+    with span("mmr"):
+        picked, removed = mmr(qvec, V, has, req.k, MMR_LAMBDA if req.mmr_lambda is None else req.mmr_lambda,
+                              parents=[p.parent_id or p.id for p in passages], works=[p.work_id for p in passages],
+                              max_per_parent=req.max_per_parent, max_per_work=req.max_per_work)
+    for reason, n in removed.items():
+        DIVERSITY_REMOVED.inc(n, reason=reason)
+    return [passages[i] for i in picked], {"candidates": len(passages), "removed": sum(removed.values()), **removed}
+
+async def diversify(req: SearchRequest, passages: List[Passage], qvec: List[float] | None):
+    """MMR with the embedding retrieval already computed; nothing to diversify without one (filtered-out scope)."""
+    if qvec is None or not passages:
+        return passages, None
+    ids = [p.id for p in passages]
+    with span("mmr_vectors"):
+        V, has = LOCAL_INDEX.vectors(ids) if LOCAL_INDEX is not None else _vector_matrix(ids, await AMILVUS.vectors(ids))
+    return await run_in_threadpool(apply_mmr, req, qvec, passages, V, has)
+
+def expand_passages(passages: List[Passage], max_tokens: int) -> List[Passage]:
+    """
+    Replace each hit by its contiguous run of siblings (up to max_tokens); hits that
+    land in the same run collapse into the best-ranked one. Hits not in the local
+    exports are returned unchanged.
+    """
+    adj = get_adjacency()
+    id_to_idx = adj.corpus.id_to_idx
+    known = [i for i, p in enumerate(passages) if p.id in id_to_idx]
+    if not known:
+        return passages
+    with span("expand"):
+        runs = adj.expand_hits([id_to_idx[passages[i].id] for i in known], max_tokens)
+    first = {known[hits[0]]: (lo, hi) for lo, hi, hits in runs}
+    out = []
+    for i, p in enumerate(passages):
+        if i in first:
+            lo, hi = first[i]
+            update = {"text": adj.text(lo, hi), "span_ids": adj.ids(lo, hi)}
+            if p.highlight:  # keep pointing at the quote inside the run
+                shift = len(adj.text(lo, id_to_idx[p.id])) + len(SEPARATOR) if id_to_idx[p.id] > lo else 0
+                update["highlight"] = [p.highlight[0] + shift, p.highlight[1] + shift]
+            out.append(p.copy(update=update))
+        elif p.id not in id_to_idx:
+            out.append(p)
+    return out
+
+def rerank_tfidf(query: str, passages: List[Passage], k: int) -> List[Passage]:
+    rows = [dict(p.dict(), score=p.score or 0.0) for p in passages]
+    with span("rerank"):
+        picked = pick_with_fusion(rows, query, take_dense=len(rows), final_k=k, corpus_tfidf=TFIDF)
+    by_id = {p.id: p for p in passages}
+    return [by_id[r["id"]] for r in picked]
+
+@app.post("/search", response_model=SearchResponse, dependencies=NEEDS_READY)
+async def search(req: SearchRequest):
+    return (await search_with_vec(req))[0]
+
+async def search_with_vec(req: SearchRequest):
+    """(SearchResponse, query embedding); the embedding is None when retrieval made no embedding call (quotes)."""
+    return await coalesce("search", req, lambda: _search(req))
+
+async def _search(req: SearchRequest):
+    # CPU-bound stages (BM25 fusion, rerank, expansion) run on the threadpool, upstream calls are awaited
+    works = request_works(req)
+    phrase = await run_in_threadpool(phrase_search, req.query, req.k, works) if wants_phrase(req) else None
+    if phrase is not None:  # quote found: no embedding call, no rerank
+        results, used_mode = phrase
+        RETRIEVAL_MODE.inc(mode=used_mode)
+        RETRIEVED_CHUNKS.observe(len(results), route="search")
+        if req.expand:
+            results = await run_in_threadpool(expand_passages, results, req.expand_tokens or EXPAND_MAX_TOKENS)
+        return SearchResponse(results=results, used_mode=used_mode), None
+    pool, diversity = mmr_pool(req), None
+    if req.rerank != "tfidf":
+        results, used_mode, qvec = await retrieve(req.query, pool, works)
+        if req.diversify:
+            results, diversity = await diversify(req, results, qvec)
+            used_mode += "+mmr"
+        RETRIEVED_CHUNKS.observe(len(results), route="search")
+        if req.expand:
+            results = await run_in_threadpool(expand_passages, results, req.expand_tokens or EXPAND_MAX_TOKENS)
+        return SearchResponse(results=results, used_mode=used_mode, diversity=diversity), qvec
+    t0 = time.perf_counter()
+    cands, used_mode, qvec = await retrieve(req.query, max(RERANK_CANDIDATES, pool), works)
+    t1 = time.perf_counter()
+    results = await run_in_threadpool(rerank_tfidf, req.query, cands, pool)
+    t2 = time.perf_counter()
+    used_mode += "+tfidf_corpus" if TFIDF is not None else "+tfidf_fit"
+    if req.diversify:
+        results, diversity = await diversify(req, results, qvec)
+        used_mode += "+mmr"
+    RETRIEVED_CHUNKS.observe(len(results), route="search")
+    if req.expand:
+        results = await run_in_threadpool(expand_passages, results, req.expand_tokens or EXPAND_MAX_TOKENS)
+    return SearchResponse(
+        results=results, used_mode=used_mode, diversity=diversity,
+        timings={"retrieve_ms": (t1 - t0) * 1000, "rerank_ms": (t2 - t1) * 1000, "candidates": len(cands)},
+    ), qvec
+
+BATCH_MAX = int(os.getenv("BATCH_MAX", "64"))
+
+class SearchBatchRequest(BaseModel):
+    queries: List[SearchRequest]
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchResponse]
+    timings: Dict[str, float]
+
+def search_many(reqs: List[SearchRequest]) -> List[SearchResponse]:
+    """
+    Batched retrieval: quotes answered from the phrase index, one embeddings call
+    for the rest, one multi-vector search per distinct filter, then per-query BM25
+    fusion / rerank.
+    """
+    return search_many_with_vecs(reqs)[0]
+
+def search_many_with_vecs(reqs: List[SearchRequest]):
+    """search_many() plus each query's embedding (None for phrase-index answers)."""
+    filters = [request_works(r) for r in reqs]  # before embedding: a bad filter fails the batch for free
+    out: List[SearchResponse | None] = [None] * len(reqs)
+    for i, (r, works) in enumerate(zip(reqs, filters)):
+        t0 = time.perf_counter()
+        phrase = phrase_search(r.query, r.k, works) if wants_phrase(r) else None
+        if phrase is not None:
+            results, used_mode = phrase
+            RETRIEVAL_MODE.inc(mode=used_mode)
+            if r.expand:
+                results = expand_passages(results, r.expand_tokens or EXPAND_MAX_TOKENS)
+            out[i] = SearchResponse(results=results, used_mode=used_mode,
+                                    timings={"phrase_ms": (time.perf_counter() - t0) * 1000})
+            RETRIEVED_CHUNKS.observe(len(results), route="search_batch")
+    rest = [i for i, o in enumerate(out) if o is None]
+    if not rest:
+        return out, [None] * len(reqs)
+    t0 = time.perf_counter()
+    vecs = dict(zip(rest, embed_many([reqs[i].query for i in rest])))
+    embed_ms = (time.perf_counter() - t0) * 1000
+    groups: Dict[frozenset | None, List[int]] = {}
+    for i in rest:
+        groups.setdefault(filters[i], []).append(i)
+
+    def candidates(r: SearchRequest) -> int:
+        return max(RERANK_CANDIDATES, mmr_pool(r)) if r.rerank == "tfidf" else mmr_pool(r)
+
+    for works, idxs in groups.items():
+        fetch = max(max(candidates(reqs[i]) * 3, 20) if BM25 is not None else candidates(reqs[i]) for i in idxs)
+        t1 = time.perf_counter()
+        if works is not None and not works:
+            dense_lists = [[] for _ in idxs]
+        else:
+            dense_lists = dense_search_many([vecs[i] for i in idxs], fetch, works)
+        search_ms = (time.perf_counter() - t1) * 1000
+        for i, dense in zip(idxs, dense_lists):
+            r = reqs[i]
+            t2 = time.perf_counter()
+            n = candidates(r)
+            if BM25 is not None:
+                results, used_mode = fuse_bm25(r.query, n, works, dense), "hybrid_local_bm25"
+            else:
+                results, used_mode = dense[:n], "dense_local" if LOCAL_INDEX is not None else "dense_only"
+            RETRIEVAL_MODE.inc(mode=used_mode)
+            if r.rerank == "tfidf":
+                results = rerank_tfidf(r.query, results, mmr_pool(r))
+                used_mode += "+tfidf_corpus" if TFIDF is not None else "+tfidf_fit"
+            diversity = None
+            if r.diversify:
+                results, diversity = apply_mmr(r, vecs[i], results, *candidate_vectors([p.id for p in results]))
+                used_mode += "+mmr"
+            if r.expand:
+                results = expand_passages(results, r.expand_tokens or EXPAND_MAX_TOKENS)
+            out[i] = SearchResponse(results=results, used_mode=used_mode, diversity=diversity, timings={
+                "embed_ms": embed_ms,          # shared by the batch's non-phrase queries
+                "search_ms": search_ms,        # shared by queries with the same filter
+                "post_ms": (time.perf_counter() - t2) * 1000,
+                "group_size": len(idxs),
+            })
+            RETRIEVED_CHUNKS.observe(len(results), route="search_batch")
+    return out, [vecs.get(i) for i in range(len(reqs))]
+
+def _check_batch(n: int):
+    if not n:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if n > BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"at most {BATCH_MAX} queries per batch")
+
+@app.post("/search/batch", response_model=SearchBatchResponse, dependencies=NEEDS_READY)
+def search_batch(req: SearchBatchRequest):
+    _check_batch(len(req.queries))
+    t0 = time.perf_counter()
+    results = search_many(req.queries)
+    return SearchBatchResponse(results=results, timings={"total_ms": (time.perf_counter() - t0) * 1000, "n": len(results)})
 
 class AnswerRequest(BaseModel):
     query: str
     k: int = 6
     work_id: str | None = None
+    work_ids: List[str] | None = None  # filters, see SearchRequest
+    authors: List[str] | None = None
+    collections: List[str] | None = None
+    quote: bool | None = None  # phrase lookup first, see SearchRequest
+    diversify: bool = False    # MMR stage and caps, see SearchRequest
+    mmr_lambda: float | None = None
+    max_per_parent: int | None = None
+    max_per_work: int | None = None
+    cache: bool = True  # false bypasses the answer cache (no lookup, no store)
+    expand: bool = False  # send complete contiguous runs instead of parent paragraphs (see SearchRequest)
+    expand_tokens: int | None = None
+    mode: Literal["generate", "extractive"] = "generate"  # extractive: quoted sentences, no LLM call (api/extractive.py)
 
 class Citation(BaseModel):
     work_title: str
     paragraph_id: str | None
     source_url: str
     work_id: str
+    anchor: str | None = None  # deep link to the quoted passage (phrase matches)
+
+class Quote(BaseModel):
+    text: str            # verbatim sentence from a retrieved passage or its parent paragraph
+    score: float
+    passage_id: str
+    work_id: str
+    work_title: str | None = None
+    paragraph_id: str | None = None
+    source_url: str | None = None
+    anchor: str | None = None  # deep link to the sentence
 
 class AnswerResponse(BaseModel):
     answer: str
     citations: List[Citation]
     context_preview: List[str]
     used_mode: str
+    timings: Dict[str, float] | None = None
+    quotes: List[Quote] | None = None  # extractive mode
 
 DISCLAIMER = (
     "This assistant retrieves and cites passages from the Bahá’í writings. "
@@ -222,16 +746,22 @@ For **every user question**, format your response as follows:
 * Your ultimate role: **help users discover and reflect** on the Bahá’í writings, not to provide final answers.
 """
 
-@app.post("/answer", response_model=AnswerResponse)
-def answer(req: AnswerRequest):
-    sresp = search(SearchRequest(query=req.query, k=req.k, work_id=req.work_id))
+GEN_PARAMS = {"model": "gpt-4.1", "temperature": 0.15, "max_output_tokens": LLM_MAX_OUTPUT_TOKENS}  # LLM_TIMEOUT follows the budget
+# Evidence tokens per prompt (passages + parent context), filled in score order by api/context_packer.py
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
 
-    parent_texts = []
-    for psg in sresp.results:
-        if psg.parent_id and psg.parent_id in PARENTS:
-            parent_texts.append(PARENTS[psg.parent_id]["text"])
-        else:
-            parent_texts.append(psg.text)
+def _parent_block(b: Dict[str, Any]) -> str:
+    head = f"{b['work_title'] or b['work_id']}" + (f" ¶{b['paragraph_id']}" if b.get("paragraph_id") else "")
+    return f"[{head}] {b['source_url'] or ''}\n{b['text']}"
+
+def _build_context(req: AnswerRequest, sresp: SearchResponse):
+    """Returns (citations, context_snippets, prompt_vars, pack); pack carries the token accounting."""
+    # expanded runs already carry their surrounding text, so parents are not added on top
+    parent_text = (lambda pid: None) if req.expand else PARENTS.get
+    with span("parents"):
+        pack = pack_context(sresp.results, parent_text, CONTEXT_TOKEN_BUDGET, max_parents=req.k)
+    CONTEXT_TOKENS.observe(pack["tokens"])
+    CONTEXT_TOKENS_SAVED.observe(pack["saved_tokens"])
 
     citations = []
     context_snippets = []
@@ -243,79 +773,340 @@ def answer(req: AnswerRequest):
                 paragraph_id=psg.paragraph_id,
                 source_url=psg.source_url,
                 work_id=psg.work_id,
+                anchor=psg.anchor,
             ))
 
+    # children already inside an included parent are not repeated; parents are sent once each
     prompt_vars = {
         "user_query": req.query,
         "disclaimer": DISCLAIMER,
-        "passages": [
-            {
-                "text": psg.text,
-                "work_title": psg.work_title,
-                "paragraph_id": psg.paragraph_id,
-                "source_url": psg.source_url,
-                "work_id": psg.work_id,
-            }
-            for psg in sresp.results
-        ],
-        "parent_context": parent_texts[: req.k],
+        "passages": pack["passages"],
+        "parent_context": [_parent_block(b) for b in pack["parents"]],
     }
+    return citations, context_snippets, prompt_vars, pack
 
-    try:
-        # Try PROMPT_ID path
-        resp = client.responses.create(
-            model="gpt-4.1",
-            temperature=0.15,
-            max_output_tokens=32000,
-            prompt_id=PROMPT_ID,
-            input=prompt_vars
-        )
-        answer_text = resp.output_text
-    except TypeError:
-        # Inline fallback
-        USER = (
-            f"User Query: {req.query}\n\n"
-            "Passages:\n" +
-            "\n\n".join(
-                f"- {d['work_title']} ¶{d.get('paragraph_id') or ''} {d['source_url']}\n{d['text']}"
-                for d in prompt_vars["passages"]
-            ) +
-            "\n\nParent Context (for background only):\n" +
-            "\n\n---\n\n".join(parent_texts[: req.k])
-        )
+def _pack_timings(pack: Dict[str, Any]) -> Dict[str, float]:
+    return {"context_tokens": pack["tokens"], "context_tokens_saved": pack["saved_tokens"]}
 
-        resp = client.responses.create(
-            model="gpt-4.1",
-            temperature=0.15,
-            max_output_tokens=32000,
-            input=[
-                {"role": "system", "content": SYSTEM_INSTRUCTIONS},
-                {"role": "user", "content": USER},
-            ],
-        )
-        answer_text = resp.output_text
-    except Exception:
-        # Last resort fallback
-        lines = [f"{DISCLAIMER}\n", f"**Query:** {req.query}\n"]
-        if not sresp.results:
-            lines.append("No strong matches were found.")
-        else:
-            lines.append("**Quoted passages:**")
-            for psg in sresp.results[: req.k]:
-                q = (psg.text or "").strip().replace("\n", " ")
-                if len(q) > 400: q = q[:400] + "…"
-                cite = f" — *{psg.work_title}*" + (f", ¶{psg.paragraph_id}" if psg.paragraph_id else "")
-                link = f" ({psg.source_url})" if psg.source_url else ""
-                lines.append(f"“{q}”{cite}{link}")
-        answer_text = "\n".join(lines)
+def _inline_input(prompt_vars: Dict[str, Any]) -> List[Dict[str, str]]:
+    USER = (
+        f"User Query: {prompt_vars['user_query']}\n\n"
+        "Passages:\n" +
+        "\n\n".join(
+            f"- {d['work_title']} ¶{d.get('paragraph_id') or ''} {d['source_url']}\n{d['text']}"
+            for d in prompt_vars["passages"]
+        ) +
+        "\n\nParent Context (full paragraphs around the retrieved passages):\n" +
+        "\n\n---\n\n".join(prompt_vars["parent_context"])
+    )
+    return [
+        {"role": "system", "content": SYSTEM_INSTRUCTIONS},
+        {"role": "user", "content": USER},
+    ]
+
+def _fallback_answer(req: AnswerRequest, sresp: SearchResponse) -> str:
+    lines = [f"{DISCLAIMER}\n", f"**Query:** {req.query}\n"]
+    if not sresp.results:
+        lines.append("No strong matches were found.")
+    else:
+        lines.append("**Quoted passages:**")
+        for psg in sresp.results[: req.k]:
+            q = (psg.text or "").strip().replace("\n", " ")
+            if len(q) > 400: q = q[:400] + "…"
+            cite = f" — *{psg.work_title}*" + (f", ¶{psg.paragraph_id}" if psg.paragraph_id else "")
+            link = f" ({psg.source_url})" if psg.source_url else ""
+            lines.append(f"“{q}”{cite}{link}")
+    return "\n".join(lines)
+
+def parent_siblings(child_id: str) -> List[Dict[str, Any]]:
+    """Corpus rows sharing the child's parent, in order ([] for ids outside the local exports)."""
+    adj = get_adjacency()
+    i = adj.corpus.id_to_idx.get(child_id)
+    if i is None:
+        return []
+    lo, hi = adj.parent_span(i)
+    return adj.corpus.children[lo:hi]
 
+def _extractive(req: AnswerRequest, sresp: SearchResponse, shed: str | None = None) -> AnswerResponse:
+    """Answer from the best-matching sentences of the retrieved passages, without the LLM."""
+    parent_text = (lambda pid: None) if req.expand else PARENTS.get
+    with span("extractive"):
+        quotes = [Quote(**q) for q in extract(req.query, sresp.results, parent_text, min(req.k, EXTRACTIVE_QUOTES), TFIDF,
+                                              siblings=parent_siblings)]
+    lines = [f"{DISCLAIMER}\n", f"**Query:** {req.query}\n"]
+    if not quotes:
+        lines.append("No strong matches were found.")
+    else:
+        lines.append("**Quoted passages:**")
+        for q in quotes:
+            cite = f" — *{q.work_title or q.work_id}*" + (f", ¶{q.paragraph_id}" if q.paragraph_id else "")
+            link = f" ({q.anchor})" if q.anchor else ""
+            lines.append(f"“{q.text}”{cite}{link}")
+    citations, seen = [], set()
+    for q in quotes:
+        if q.source_url and q.work_title and (q.passage_id, q.paragraph_id) not in seen:
+            seen.add((q.passage_id, q.paragraph_id))
+            citations.append(Citation(work_title=q.work_title, paragraph_id=q.paragraph_id, source_url=q.source_url,
+                                      work_id=q.work_id, anchor=q.anchor))
     return AnswerResponse(
+        answer="\n".join(lines),
+        citations=citations,
+        context_preview=[p.text for p in sresp.results],
+        used_mode=sresp.used_mode + "+extractive",
+        timings={"shed": 1.0} if shed else None,
+        quotes=quotes,
+    )
+
+def _search_request(req: AnswerRequest) -> SearchRequest:
+    return SearchRequest(query=req.query, k=req.k, work_id=req.work_id, work_ids=req.work_ids, authors=req.authors,
+                         collections=req.collections, quote=req.quote, expand=req.expand, expand_tokens=req.expand_tokens,
+                         diversify=req.diversify, mmr_lambda=req.mmr_lambda, max_per_parent=req.max_per_parent,
+                         max_per_work=req.max_per_work)
+
+def _cache_args(req: AnswerRequest, sresp: SearchResponse, qvec: List[float] | None):
+    """Cache key parts, and the retrieval embedding for the near-duplicate lookup (None: exact key only, e.g. quotes)."""
+    qvec = qvec if ANSWER_CACHE.near_threshold > 0 else None
+    return (req.query, req.k, filter_key(request_works(req)), [i for p in sresp.results for i in (p.span_ids or [p.id])]), qvec
+
+@app.post("/answer", response_model=AnswerResponse, dependencies=NEEDS_READY)
+async def answer(req: AnswerRequest, request: Request):
+    shed = getattr(request.state, "shed", None)  # set by AdmissionMiddleware when the answer pool is overloaded
+    return await coalesce("answer_shed" if shed else "answer", req, lambda: _answer(req, shed))
+
+async def _answer(req: AnswerRequest, shed: str | None = None):
+    sresp, qvec = await search_with_vec(_search_request(req))
+    if req.cache and req.mode == "generate":  # a shed request still takes a cached generated answer
+        with span("answer_cache"):
+            cache_args, qvec = _cache_args(req, sresp, qvec)
+            cached, _ = ANSWER_CACHE.get(*cache_args, query_vec=qvec)
+        if cached is not None:
+            return cached
+    if req.mode == "extractive" or shed:
+        return await run_in_threadpool(_extractive, req, sresp, shed)
+    citations, context_snippets, prompt_vars, pack = await run_in_threadpool(_build_context, req, sresp)
+    answer_text, generated = await _agenerate(req, sresp, prompt_vars)
+
+    out = AnswerResponse(
         answer=answer_text,
         citations=citations,
         context_preview=context_snippets,
         used_mode=sresp.used_mode,
+        timings=_pack_timings(pack),
     )
+    if req.cache and generated:
+        ANSWER_CACHE.put(*cache_args, out, query_vec=qvec)
+    return out
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/answer/stream", dependencies=NEEDS_READY)
+async def answer_stream(req: AnswerRequest, request: Request):
+    """
+    Server-sent events variant of /answer:
+      event: meta  -> citations, context_preview, used_mode (as soon as retrieval is done); quotes in extractive mode
+      event: delta -> {"text": ...} answer tokens as the model produces them (one delta in extractive mode)
+      event: error -> generation failed after some text was already sent
+      event: done
+    An identical stream already in flight is joined (replayed from its first event)
+    instead of starting another generation.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    shed = getattr(request.state, "shed", None)
+    if not SINGLEFLIGHT:
+        return StreamingResponse(await _answer_events(req, shed), media_type="text/event-stream", headers=headers)
+    key = _flight_key("stream_shed" if shed else "stream", req)
+    b, shared = STREAM_FLIGHT.join_or_lead(key)
+    (COALESCED if shared else FLIGHTS).inc(mode="stream")
+    if not shared:
+        try:
+            STREAM_FLIGHT.run(key, b, await _answer_events(req, shed))
+        except BaseException as e:  # incl. cancellation: never leave followers waiting
+            STREAM_FLIGHT.abort(key, b, _sse("error", {"detail": type(e).__name__}), _sse("done", {}))
+            raise
+    return StreamingResponse(b.subscribe(), media_type="text/event-stream", headers=headers)
+
+async def _answer_events(req: AnswerRequest, shed: str | None = None):
+    """Retrieval (awaited here, so it shows in Server-Timing), then the SSE event generator."""
+    sresp, qvec = await search_with_vec(_search_request(req))
+    cached = None
+    if req.cache and req.mode == "generate":
+        cache_args, qvec = _cache_args(req, sresp, qvec)
+        cached, _ = ANSWER_CACHE.get(*cache_args, query_vec=qvec)
+    if cached is None and (req.mode == "extractive" or shed):
+        cached = await run_in_threadpool(_extractive, req, sresp, shed)  # replayed like a cached answer
+
+    async def replay():
+        meta = {
+            "citations": [c.dict() for c in cached.citations],
+            "context_preview": cached.context_preview,
+            "used_mode": cached.used_mode,
+        }
+        if cached.quotes is not None:
+            meta.update(quotes=[q.dict() for q in cached.quotes], timings=cached.timings)
+        yield _sse("meta", meta)
+        yield _sse("delta", {"text": cached.answer})
+        yield _sse("done", {})
+
+    async def events():
+        yield _sse("meta", {
+            "citations": [c.dict() for c in citations],
+            "context_preview": context_snippets,
+            "used_mode": sresp.used_mode,
+            "timings": _pack_timings(pack),
+        })
+        sent = False
+        stream = None
+        parts = []
+        try:
+            t0 = time.perf_counter()
+            # the LLM limit gates opening the stream; chunk reads are bounded by the httpx read timeout
+            try:
+                stream = await LLM.call(lambda: aclient.responses.create(**GEN_PARAMS, prompt_id=PROMPT_ID, input=prompt_vars, stream=True))
+            except TypeError:
+                FALLBACKS.inc(kind="prompt_id")
+                stream = await LLM.call(lambda: aclient.responses.create(**GEN_PARAMS, input=_inline_input(prompt_vars), stream=True))
+            async for ev in stream:
+                if ev.type == "response.output_text.delta":
+                    if not sent:
+                        STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm_first_token")
+                    sent = True
+                    parts.append(ev.delta)
+                    yield _sse("delta", {"text": ev.delta})
+                elif ev.type == "response.completed":
+                    observe_usage(ev.response)
+            STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm")
+            if req.cache and parts:
+                ANSWER_CACHE.put(*cache_args, AnswerResponse(
+                    answer="".join(parts),
+                    citations=citations,
+                    context_preview=context_snippets,
+                    used_mode=sresp.used_mode,
+                ), query_vec=qvec)
+        except Exception as e:
+            timed_out = isinstance(e, (UpstreamTimeout, APITimeoutError))
+            if timed_out:
+                FALLBACKS.inc(kind="llm_timeout")
+            if sent:
+                yield _sse("error", {"detail": type(e).__name__})
+            else:
+                if not timed_out: FALLBACKS.inc(kind="last_resort")
+                yield _sse("delta", {"text": _fallback_answer(req, sresp)})
+        finally:
+            if stream is not None:
+                await stream.close()
+        yield _sse("done", {})
+
+    if cached is not None:
+        return replay()
+    citations, context_snippets, prompt_vars, pack = await run_in_threadpool(_build_context, req, sresp)
+    return events()
+
+ANSWER_BATCH_CONCURRENCY = int(os.getenv("ANSWER_BATCH_CONCURRENCY", "8"))
+
+class AnswerBatchRequest(BaseModel):
+    queries: List[AnswerRequest]
+    concurrency: int = 4  # parallel LLM calls, capped by ANSWER_BATCH_CONCURRENCY
+
+class AnswerBatchResponse(BaseModel):
+    results: List[AnswerResponse]
+    timings: Dict[str, float]
+
+async def _agenerate(req: AnswerRequest, sresp: SearchResponse, prompt_vars: Dict[str, Any]):
+    """Generation step of /answer and /answer/batch; returns (text, generated)."""
+    try:
+        with span("llm"):
+            try:
+                # Try PROMPT_ID path; no bytes arrive before the answer is complete, so the
+                # httpx read timeout is raised to the LLM deadline for this call
+                resp = await LLM.call(lambda: aclient.responses.create(**GEN_PARAMS, prompt_id=PROMPT_ID, input=prompt_vars,
+                                                                       timeout=LLM.timeout))
+            except TypeError:
+                # Inline fallback
+                FALLBACKS.inc(kind="prompt_id")
+                resp = await LLM.call(lambda: aclient.responses.create(**GEN_PARAMS, input=_inline_input(prompt_vars),
+                                                                       timeout=LLM.timeout))
+        observe_usage(resp)
+        return resp.output_text, True
+    except (UpstreamTimeout, APITimeoutError):
+        # LLM_TIMEOUT or the read timeout: counted apart from other failures, same fallback text
+        FALLBACKS.inc(kind="llm_timeout")
+        return _fallback_answer(req, sresp), False
+    except Exception:
+        # Last resort fallback
+        FALLBACKS.inc(kind="last_resort")
+        return _fallback_answer(req, sresp), False
+
+@app.post("/answer/batch", response_model=AnswerBatchResponse, dependencies=NEEDS_READY)
+async def answer_batch(req: AnswerBatchRequest):
+    _check_batch(len(req.queries))
+    t0 = time.perf_counter()
+    sresps, qvecs = await run_in_threadpool(search_many_with_vecs, [_search_request(a) for a in req.queries])
+    retrieve_ms = (time.perf_counter() - t0) * 1000
+    sem = asyncio.Semaphore(max(1, min(req.concurrency, ANSWER_BATCH_CONCURRENCY)))
+
+    async def one(a: AnswerRequest, sresp: SearchResponse, qvec: List[float] | None) -> AnswerResponse:
+        t1 = time.perf_counter()
+        if a.mode == "extractive":
+            out = await run_in_threadpool(_extractive, a, sresp)
+            return out.copy(update={"timings": {"retrieve_ms": retrieve_ms, "generate_ms": (time.perf_counter() - t1) * 1000}})
+        if a.cache:
+            cache_args, qvec = _cache_args(a, sresp, qvec)
+            cached, _ = ANSWER_CACHE.get(*cache_args, query_vec=qvec)
+            if cached is not None:
+                return cached.copy(update={"timings": {"retrieve_ms": retrieve_ms, "generate_ms": 0.0, "cached": 1.0}})
+        citations, context_snippets, prompt_vars, pack = await run_in_threadpool(_build_context, a, sresp)
+        async with sem:
+            t2 = time.perf_counter()
+            text, generated = await _agenerate(a, sresp, prompt_vars)
+        out = AnswerResponse(
+            answer=text,
+            citations=citations,
+            context_preview=context_snippets,
+            used_mode=sresp.used_mode,
+        )
+        if a.cache and generated:
+            ANSWER_CACHE.put(*cache_args, out, query_vec=qvec)
+        t3 = time.perf_counter()
+        return out.copy(update={"timings": {
+            "retrieve_ms": retrieve_ms,                # batched retrieval, shared
+            "queue_ms": (t2 - t1) * 1000,
+            "generate_ms": (t3 - t2) * 1000,
+            **_pack_timings(pack),
+        }})
+
+    results = await asyncio.gather(*[one(a, s, v) for a, s, v in zip(req.queries, sresps, qvecs)])
+    return AnswerBatchResponse(results=list(results), timings={"total_ms": (time.perf_counter() - t0) * 1000, "n": len(results)})
 
 @app.get("/healthz")
 def healthz():
+    """Liveness: the process serves HTTP. Dependencies are /readyz."""
     return {"ok": True}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once every required dependency is loaded, else 503; per-dependency state and warmup."""
+    status = STARTUP.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/filters")
+def filters():
+    """Values accepted by the work_ids / authors / collections request filters."""
+    return get_catalog().describe()
+
+@app.get("/stats")
+def stats():
+    return {
+        "embed_cache": EMBED_CACHE.stats(),
+        "answer_cache": ANSWER_CACHE.stats(),
+        "inflight": {"calls": len(FLIGHT), "streams": len(STREAM_FLIGHT)},
+        "upstreams": {u.name: u.stats() for u in (EMBED, MILVUS, LLM)},
+        "admission": {p.name: p.stats() for p in ADMISSION_POOLS},
+        "embedding": {**EMBED_PROFILE.to_dict(), **(LOCAL_INDEX.memory() if LOCAL_INDEX is not None else {})},
+        "phrases": PHRASES.stats() if PHRASES is not None else None,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition: stage/request histograms, fallback counters, chunk and token counts."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
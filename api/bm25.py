@@ -0,0 +1,143 @@
+import os, re, math, heapq, pickle
+from array import array
+from bisect import bisect_left
+from typing import List, Dict, Tuple, Iterable
+from api.fusion_generic import norm_text
+from api.corpus import Corpus, get_corpus
+
+BM25_PATH = os.getenv("BM25_INDEX_PATH", "data/index/bm25.pkl")
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(s: str) -> List[str]:
+    """Lowercase, diacritic-folded word tokens (Bahá’u’lláh -> baha, u, llah)."""
+    return TOKEN_RE.findall(norm_text(s))
+
+class BM25Index:
+    """
+    Inverted index over the child chunks. Each term keeps two parallel arrays
+    (sorted doc ids, term freqs) plus a precomputed per-term score upper bound,
+    which lets search() skip documents with MaxScore-style early termination.
+    Doc ids are Corpus row indices, so a saved index is only reused for the corpus
+    whose fingerprint it was built from.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.doc_ids: List[array] = []
+        self.tfs: List[array] = []
+        self.idf: array = array("f")
+        self.ub: array = array("f")
+        self.doc_len: array = array("I")
+        self.avgdl = 0.0
+        self.fingerprint = ""  # Corpus.fingerprint at build time
+
+    @classmethod
+    def build(cls, corpus: Corpus, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        idx = cls(k1, b)
+        idx.fingerprint = corpus.fingerprint
+        for d, rec in enumerate(corpus.children):
+            toks = tokenize(rec["text"])
+            idx.doc_len.append(len(toks))
+            counts: Dict[str, int] = {}
+            for t in toks:
+                counts[t] = counts.get(t, 0) + 1
+            for t, c in counts.items():
+                tid = idx.vocab.get(t)
+                if tid is None:
+                    tid = idx.vocab[t] = len(idx.doc_ids)
+                    idx.doc_ids.append(array("I")); idx.tfs.append(array("H"))
+                idx.doc_ids[tid].append(d); idx.tfs[tid].append(min(c, 65535))
+        n = len(idx.doc_len)
+        idx.avgdl = (sum(idx.doc_len) / n) if n else 0.0
+        for tid in range(len(idx.doc_ids)):
+            df = len(idx.doc_ids[tid])
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            idx.idf.append(idf)
+            idx.ub.append(max(idx._term_score(idf, tf, idx.doc_len[d]) for d, tf in zip(idx.doc_ids[tid], idx.tfs[tid])))
+        return idx
+
+    def _term_score(self, idf: float, tf: int, dl: int) -> float:
+        return idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl))
+
+    def save(self, path: str = BM25_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_PATH) -> "BM25Index":
+        idx = cls()
+        with open(path, "rb") as f:
+            idx.__dict__.update(pickle.load(f))
+        idx.__dict__.pop("work_ranges", None)  # pre-bitmap indexes; filters are api/filters.py masks
+        return idx
+
+    @classmethod
+    def load_or_build(cls, path: str = BM25_PATH, corpus: Corpus | None = None) -> "BM25Index":
+        corpus = corpus or get_corpus()
+        if os.path.exists(path):
+            idx = cls.load(path)
+            if idx.fingerprint == corpus.fingerprint:
+                return idx
+        return cls.build(corpus)
+
+    def search(self, query: str, k: int = 20, allowed: Iterable | None = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (doc_id, score) by BM25. `allowed` is an optional per-doc mask
+        (bytearray / bool array indexed by doc id).
+
+        MaxScore: terms are ordered by upper bound; the low-bound prefix whose
+        summed bounds cannot beat the current k-th score is "non-essential", so
+        only docs from the essential lists are visited and the rest are probed
+        by binary search only while the doc can still enter the top-k.
+        """
+        tids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab}, key=lambda t: self.ub[t])
+        if not tids or k <= 0: return []
+        ubs = [self.ub[t] for t in tids]
+        cum = list(ubs)
+        for i in range(1, len(cum)):
+            cum[i] += cum[i-1]
+        plists = [self.doc_ids[t] for t in tids]
+        tlists = [self.tfs[t] for t in tids]
+        idfs = [self.idf[t] for t in tids]
+        ptr = [0] * len(tids)
+        heap: List[Tuple[float, int]] = []
+        theta = 0.0
+        first = 0  # terms[first:] are essential
+        end = 1 << 62
+
+        while True:
+            d = end
+            for i in range(first, len(tids)):
+                if ptr[i] < len(plists[i]) and plists[i][ptr[i]] < d:
+                    d = plists[i][ptr[i]]
+            if d == end: break
+            score = 0.0
+            dl = self.doc_len[d]
+            for i in range(first, len(tids)):
+                p = ptr[i]
+                if p < len(plists[i]) and plists[i][p] == d:
+                    score += self._term_score(idfs[i], tlists[i][p], dl)
+                    ptr[i] = p + 1
+            if allowed is not None and not allowed[d]:
+                continue
+            for i in range(first - 1, -1, -1):
+                if len(heap) >= k and score + cum[i] <= theta: break
+                p = bisect_left(plists[i], d, ptr[i])
+                ptr[i] = p
+                if p < len(plists[i]) and plists[i][p] == d:
+                    score += self._term_score(idfs[i], tlists[i][p], dl)
+            if len(heap) < k:
+                heapq.heappush(heap, (score, d))
+            elif score > theta:
+                heapq.heapreplace(heap, (score, d))
+            else:
+                continue
+            if len(heap) >= k:
+                theta = heap[0][0]
+                while first < len(tids) and cum[first] <= theta:
+                    first += 1
+        return [(d, s) for s, d in sorted(heap, reverse=True)]
@@ -0,0 +1,76 @@
+import os
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+import tiktoken
+
+GEN_MODEL = "gpt-4.1"
+
+@lru_cache(maxsize=1)
+def _encoding():
+    name = os.getenv("CONTEXT_TOKENIZER")
+    if name:
+        return tiktoken.get_encoding(name)
+    try:
+        return tiktoken.encoding_for_model(GEN_MODEL)   # o200k_base
+    except Exception:
+        return tiktoken.get_encoding("cl100k_base")     # offline: close enough for budgeting
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text or "", disallowed_special=()))
+
+def _source(psg) -> Dict[str, str | None]:
+    return {
+        "work_title": psg.work_title,
+        "paragraph_id": psg.paragraph_id,
+        "source_url": psg.source_url,
+        "work_id": psg.work_id,
+    }
+
+def pack_context(passages: Sequence, parent_text: Callable[[str], str | None], budget: int, max_parents: int | None = None) -> Dict:
+    """
+    Choose prompt evidence for `passages` (best first) under a token budget.
+
+    Each hit contributes its parent text once; children whose parent is already
+    included are dropped, since their text is inside it. When a parent does not
+    fit, the child alone is tried. Returns:
+      passages        child passages sent on their own (dicts with text + source)
+      parents         included parent blocks (id, text + source of the best child)
+      tokens          evidence tokens sent
+      baseline_tokens what the unpacked prompt sent: every child + one parent per hit
+      saved_tokens    baseline_tokens - tokens
+      dropped         hits with no room left in the budget
+    """
+    max_parents = len(passages) if max_parents is None else max_parents
+    out_passages: List[Dict] = []
+    parents: List[Dict] = []
+    seen_parents: Dict[str, int] = {}
+    used = baseline = dropped = 0
+    for i, psg in enumerate(passages):
+        child_toks = count_tokens(psg.text)
+        ptext = parent_text(psg.parent_id) if psg.parent_id else None
+        baseline += child_toks
+        if i < max_parents:
+            baseline += count_tokens(ptext) if ptext is not None else child_toks
+        if psg.parent_id in seen_parents:
+            continue  # text already inside an included parent
+        if ptext is not None and len(parents) < max_parents:
+            ptoks = count_tokens(ptext)
+            if used + ptoks <= budget:
+                seen_parents[psg.parent_id] = len(parents)
+                parents.append(dict(_source(psg), id=psg.parent_id, text=ptext))
+                used += ptoks
+                continue
+        if used + child_toks <= budget:
+            out_passages.append(dict(_source(psg), text=psg.text))
+            used += child_toks
+        else:
+            dropped += 1
+    return {
+        "passages": out_passages,
+        "parents": parents,
+        "tokens": used,
+        "baseline_tokens": baseline,
+        "saved_tokens": max(0, baseline - used),
+        "dropped": dropped,
+    }
@@ -0,0 +1,46 @@
+import glob, json, os, hashlib, threading
+from functools import cached_property
+from typing import List, Dict, Any
+
+EXPORTS_DIR = os.getenv("EXPORTS_DIR", "data/exports")
+
+# Fields the API needs from each child record (hash/lang/section are ingestion-only)
+CHILD_FIELDS = ("id", "parent_id", "work_id", "author", "work_title", "paragraph_id", "text", "source_url")
+
+class Corpus:
+    """
+    All child chunks from data/exports/*_children.jsonl, in file order
+    (so each work's children are contiguous and in c00001.. order).
+    """
+    def __init__(self, exports_dir: str = EXPORTS_DIR):
+        self.children: List[Dict[str, Any]] = []
+        for path in sorted(glob.glob(os.path.join(exports_dir, "*_children.jsonl"))):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip(): continue
+                    r = json.loads(line)
+                    self.children.append({k: r.get(k) or "" for k in CHILD_FIELDS})
+        self.id_to_idx: Dict[str, int] = {r["id"]: i for i, r in enumerate(self.children)}
+
+    def __len__(self):
+        return len(self.children)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Hash of the ordered child ids and texts; indexes keyed by row number store it to detect staleness."""
+        h = hashlib.sha256()
+        for r in self.children:
+            h.update(r["id"].encode("utf-8") + b"\0" + r["text"].encode("utf-8") + b"\0")
+        return h.hexdigest()
+
+_CORPUS: Corpus | None = None
+_LOCK = threading.Lock()
+
+def get_corpus() -> Corpus:
+    """Process-wide corpus, loaded on first use."""
+    global _CORPUS
+    if _CORPUS is None:
+        with _LOCK:
+            if _CORPUS is None:
+                _CORPUS = Corpus()
+    return _CORPUS
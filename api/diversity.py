@@ -0,0 +1,66 @@
+"""
+Diversity stage for over-fetched candidates: Maximal Marginal Relevance with
+optional per-parent / per-work caps.
+
+Each step picks the candidate maximizing
+
+    lam * sim(query, c) - (1 - lam) * max_{s in selected} sim(c, s)
+
+over one (n, n) similarity matrix; the running max is updated with the new pick's
+row, so selecting k of n costs one matmul plus k vector ops. Candidates without a
+vector (e.g. BM25-only hits missing from the vector store) count as unlike the rest.
+"""
+import os
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+def _unit(X: np.ndarray) -> np.ndarray:
+    return X / np.maximum(np.linalg.norm(X, axis=-1, keepdims=True), 1e-12)
+
+def mmr(query: np.ndarray, vectors: np.ndarray, has_vector: np.ndarray, k: int, lam: float = MMR_LAMBDA,
+        parents: Sequence[str] | None = None, works: Sequence[str] | None = None,
+        max_per_parent: int | None = None, max_per_work: int | None = None) -> Tuple[List[int], Dict[str, int]]:
+    """
+    Picks up to k candidate indices (in pick order) from `vectors` (n, d), rows in
+    input order = retrieval rank. Returns (picked, removed): `removed` counts the
+    first-k candidates of the input that were left out, by reason
+    ("similar", "parent_cap", "work_cap").
+    """
+    n = len(vectors)
+    if n == 0 or k <= 0:
+        return [], {}
+    V = _unit(np.asarray(vectors, dtype=np.float32)) * has_vector[:, None]
+    rel = V @ _unit(np.asarray(query, dtype=np.float32)[:V.shape[1]])
+    rel[~has_vector] = np.median(rel[has_vector]) if has_vector.any() else 0.0
+    S = V @ V.T
+    maxsim = np.zeros(n, dtype=np.float32)
+    open_ = np.ones(n, dtype=bool)
+    capped: Dict[int, str] = {}
+    groups = [(parents, max_per_parent, "parent_cap"), (works, max_per_work, "work_cap")]
+    counts: List[Dict[str, int]] = [{}, {}]
+    picked: List[int] = []
+    while len(picked) < k and open_.any():
+        score = lam * rel - (1 - lam) * maxsim
+        score[~open_] = -np.inf
+        j = int(np.argmax(score))
+        picked.append(j)
+        open_[j] = False
+        maxsim = np.maximum(maxsim, S[j])
+        for (keys, cap, reason), c in zip(groups, counts):
+            if keys is None or not cap:
+                continue
+            c[keys[j]] = c.get(keys[j], 0) + 1
+            if c[keys[j]] >= cap:
+                full = open_ & (np.asarray(keys) == keys[j])
+                for i in np.flatnonzero(full).tolist():
+                    capped.setdefault(i, reason)
+                open_ &= ~full
+    removed: Dict[str, int] = {}
+    chosen = set(picked)
+    for i in range(min(k, n)):
+        if i not in chosen:
+            reason = capped.get(i, "similar")
+            removed[reason] = removed.get(reason, 0) + 1
+    return picked, removed
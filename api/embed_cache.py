@@ -0,0 +1,115 @@
+import os, re, time, sqlite3, hashlib, threading, unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Dict
+
+def normalize_query(s: str) -> str:
+    s = unicodedata.normalize("NFC", s or "")
+    return re.sub(r"\s+", " ", s).strip().lower()
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+class EmbedCache:
+    """
+    Two-tier query embedding cache keyed on (normalized text, model).
+    1) in-process LRU of float32 arrays (bounded by max_items)
+    2) optional SQLite file shared by all workers on the machine (WAL), survives restarts;
+       `created_at` is refreshed on disk hits, so pruning drops the least recently used rows
+    """
+    PRUNE_BATCH = 1000  # rows per DELETE, so other workers get the write lock in between
+
+    def __init__(self, max_items: int = 1024, path: str | None = None, max_rows: int = 100_000):
+        self.max_items = max_items
+        self.max_rows = max_rows
+        self.path = path
+        self._lru: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vec BLOB, created_at INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings(created_at)")
+
+    def _remember(self, key: str, vec: array):
+        if self.max_items <= 0: return
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, text: str, model: str) -> List[float] | None:
+        key = cache_key(text, model)
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits_mem += 1
+                return vec.tolist()
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT vec FROM embeddings WHERE key=?", (key,)).fetchone()
+                    if row:
+                        self._db.execute("UPDATE embeddings SET created_at=? WHERE key=?", (int(time.time()), key))
+                except sqlite3.Error:
+                    row = None
+                if row:
+                    vec = array("f"); vec.frombytes(row[0])
+                    self._remember(key, vec)
+                    self.hits_disk += 1
+                    return vec.tolist()
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model: str, embedding: List[float]):
+        key = cache_key(text, model)
+        vec = array("f", embedding)
+        with self._lock:
+            self._remember(key, vec)
+            if self._db is None: return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vec, created_at) VALUES (?,?,?,?,?)",
+                    (key, model, len(vec), vec.tobytes(), int(time.time())),
+                )
+                self._puts += 1
+                if self.max_rows and self._puts % 500 == 0:
+                    self._prune()
+            except sqlite3.Error:
+                # a locked/readonly cache file must never fail a request
+                pass
+
+    def _prune(self):
+        """Keep the shared file bounded: drop the least recently used rows, in batches, via the created_at index."""
+        excess = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_rows
+        while excess > 0:
+            n = min(excess, self.PRUNE_BATCH)
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created_at LIMIT ?)", (n,)
+            )
+            excess -= n
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.hits_mem + self.hits_disk
+        total = hits + self.misses
+        return {
+            "hits_mem": self.hits_mem,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._lru),
+            "max_items": self.max_items,
+            "hit_rate": (hits / total) if total else 0.0,
+        }
@@ -0,0 +1,105 @@
+"""
+Embedding profile shared by ingestion, the API and the eval scripts:
+
+  OPENAI_EMBEDDING_MODEL   text-embedding-3-large (default)
+  EMBED_DIMENSIONS         0 = the model's full size; e.g. 1024 / 256 sends `dimensions` to the
+                           embeddings API (Matryoshka truncation, re-normalized by OpenAI)
+  EMBED_QUANT              none | int8 | binary: how the local index scans (coarse stage)
+  EMBED_RESCORE            quantized scans keep k * EMBED_RESCORE candidates, then rescore
+                           them against the full-precision rows
+
+Truncating a full vector to its first d components and re-normalizing gives the same
+vector as asking the API for `dimensions=d`, so one full-size index can be cut down
+(scripts/build_local_index.py --dimensions) without re-embedding.
+"""
+import os
+from typing import Any, Dict, Sequence, Tuple
+import numpy as np
+
+QUANTS = ("none", "int8", "binary")
+FULL_DIMENSIONS = {"text-embedding-3-large": 3072, "text-embedding-3-small": 1536, "text-embedding-ada-002": 1536}
+
+class EmbeddingProfile:
+    def __init__(self, model: str = "text-embedding-3-large", dimensions: int | None = None,
+                 quant: str = "none", rescore: int = 4):
+        if quant not in QUANTS:
+            raise ValueError(f"EMBED_QUANT must be one of {QUANTS}, got {quant!r}")
+        full = FULL_DIMENSIONS.get(model)
+        if dimensions and full and dimensions > full:
+            raise ValueError(f"{model} has {full} dimensions, EMBED_DIMENSIONS={dimensions}")
+        self.model = model
+        self.dimensions = dimensions or None
+        self.quant = quant
+        self.rescore = max(1, rescore)
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingProfile":
+        return cls(
+            model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large"),
+            dimensions=int(os.getenv("EMBED_DIMENSIONS", "0")) or None,
+            quant=os.getenv("EMBED_QUANT", "none").lower(),
+            rescore=int(os.getenv("EMBED_RESCORE", "4")),
+        )
+
+    @property
+    def dim(self) -> int | None:
+        """Vector size this profile produces (None if the model is unknown and no dimensions set)."""
+        return self.dimensions or FULL_DIMENSIONS.get(self.model)
+
+    @property
+    def cache_model(self) -> str:
+        """Embedding cache namespace: vectors of different sizes must not share keys."""
+        return self.model if not self.dimensions else f"{self.model}@{self.dimensions}"
+
+    def create_kwargs(self) -> Dict[str, Any]:
+        """Arguments for embeddings.create besides `input`."""
+        return {"model": self.model, **({"dimensions": self.dimensions} if self.dimensions else {})}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"model": self.model, "dimensions": self.dim, "quant": self.quant, "rescore": self.rescore}
+
+    def __str__(self):
+        return f"{self.dim or '?'}d/{self.quant}"
+
+def reduce_dims(X: np.ndarray, d: int | None) -> np.ndarray:
+    """Matryoshka truncation: first d columns, rows re-normalized (float32)."""
+    X = np.asarray(X, dtype=np.float32)
+    if d and d < X.shape[-1]:
+        X = X[..., :d]
+    return X / np.maximum(np.linalg.norm(X, axis=-1, keepdims=True), 1e-12)
+
+# ---- quantization (coarse stage of a two-stage search) ----
+
+def quantize_int8(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-dimension int8 codes and the float32 scales (code * scale ~= x)."""
+    scale = np.maximum(np.abs(X).max(axis=0), 1e-12).astype(np.float32) / 127.0
+    codes = np.clip(np.rint(X / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+def quantize_binary(X: np.ndarray) -> np.ndarray:
+    """Sign bits packed 8 per byte, (n, ceil(d / 8)) uint8."""
+    return np.packbits(np.asarray(X) > 0, axis=-1)
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def hamming(q: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """Bit distance between one packed code q and every row of B."""
+    x = np.bitwise_xor(B, q)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[x].sum(axis=1, dtype=np.int32)
+
+def nbytes(*arrays: Sequence) -> int:
+    return int(sum(a.nbytes for a in arrays if a is not None))
+
+def field_dim(col, field: str = "text_dense") -> int | None:
+    """Declared dim of a pymilvus Collection's vector field."""
+    for f in col.schema.fields:
+        if f.name == field:
+            return int(f.params.get("dim")) if f.params.get("dim") else None
+    return None
+
+def check_dim(profile: EmbeddingProfile, dim: int | None, where: str):
+    if dim and profile.dim and dim != profile.dim:
+        raise RuntimeError(f"{where} holds {dim}-d vectors but the embedding profile is {profile.dim}-d "
+                           f"(EMBED_DIMENSIONS={profile.dimensions or 0})")
@@ -0,0 +1,109 @@
+"""
+Extractive answers: the retrieved passages' best-matching sentences, quoted verbatim
+with their citations and deep links, in retrieval time (no LLM call).
+
+Sentences come from every retrieved child and from its parent paragraph, within
+PARENT_WINDOW characters either side of the child (parents can run to tens of KB). All of them
+are scored against the query in one sparse product: the corpus TF-IDF when
+data/index/tfidf.joblib is loaded, else a TF-IDF fitted on the sentences themselves.
+Sentences of higher-ranked passages get a small bonus. A sentence from the parent window
+is cited with the paragraph of the sibling child it comes from.
+"""
+import os, re
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from api.fusion_generic import CorpusTfidf, norm_text
+from api.phrase_index import anchor
+from api.adjacency import SEPARATOR
+
+EXTRACTIVE_QUOTES = int(os.getenv("EXTRACTIVE_QUOTES", "5"))  # at most this many (and at most k) quotes
+MIN_WORDS = 6         # shorter sentences (headings, verse numbers) are not quoted alone
+MAX_PER_PASSAGE = 2
+RANK_PRIOR = 0.05     # + RANK_PRIOR / rank of the passage a sentence comes from
+PARENT_WINDOW = int(os.getenv("EXTRACTIVE_PARENT_WINDOW", "1500"))
+SENTENCE_RE = re.compile(r"[^\s.!?][^.!?\n]*(?:[.!?]+[\"'”’»)\]]*|$)")
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    return [(m.start(), m.end()) for m in SENTENCE_RE.finditer(text or "") if len(m.group().split()) >= MIN_WORDS]
+
+def _parent_spans(parent: str, child: str) -> List[Tuple[int, int]]:
+    at = max(parent.find(child[:80]), 0)
+    lo, hi = at - PARENT_WINDOW, at + len(child) + PARENT_WINDOW
+    return [(s, e) for s, e in sentence_spans(parent) if s >= lo and e <= hi]
+
+def _sibling_starts(parent: str, siblings: Sequence[Dict[str, Any]]) -> List[int]:
+    """Offset of each sibling child in the parent text; [] unless the parent is exactly their SEPARATOR join."""
+    starts, pos = [], 0
+    for r in siblings:
+        if not parent.startswith(r["text"], pos):
+            return []
+        starts.append(pos)
+        pos += len(r["text"]) + len(SEPARATOR)
+    return starts if siblings and pos - len(SEPARATOR) == len(parent) else []
+
+def similarity(query: str, texts: List[str], tfidf: CorpusTfidf | None = None) -> np.ndarray:
+    """Cosine of each text vs the query (rows are L2-normalized by the vectorizer)."""
+    if tfidf is not None:
+        S, q = tfidf.vectorizer.transform([norm_text(t) for t in texts]), tfidf.transform_query(query)
+    else:
+        X = TfidfVectorizer(ngram_range=(1, 2)).fit_transform([norm_text(t) for t in texts] + [norm_text(query)])
+        S, q = X[:-1], X[-1]
+    return (S @ q.T).toarray().ravel()
+
+def extract(query: str, passages: Sequence[Any], parent_text: Callable[[str], str | None], n: int,
+            tfidf: CorpusTfidf | None = None,
+            siblings: Callable[[str], Sequence[Dict[str, Any]]] = lambda child_id: ()) -> List[Dict[str, Any]]:
+    """
+    Up to n quotes, best first: {"text", "score", "passage_id", "work_id", "work_title",
+    "paragraph_id", "source_url", "anchor"}. Identical sentences (a passage and its
+    parent, or the same text quoted in several works) are quoted once.
+
+    `siblings(child_id)` gives the corpus rows sharing the child's parent, in order; a
+    parent sentence takes its paragraph_id / source_url from the row it falls in, or
+    no paragraph_id when the parent cannot be mapped onto its rows. A missing paragraph_id
+    or source_url is always None (the exports carry "").
+    """
+    # (rank, source text, start, end, passage, (paragraph_id, source_url))
+    cands: List[Tuple[int, str, int, int, Any, Tuple[str | None, str | None]]] = []
+    parents = set()
+    for rank, p in enumerate(passages, start=1):
+        own = (p.paragraph_id or None, p.source_url or None)
+        cands.extend((rank, p.text, s, e, p, own) for s, e in sentence_spans(p.text))
+        if p.parent_id and p.parent_id not in parents:
+            parents.add(p.parent_id)
+            pt = parent_text(p.parent_id) or ""
+            rows = siblings(p.id)
+            starts = _sibling_starts(pt, rows)
+            for s, e in _parent_spans(pt, p.text):
+                r = rows[bisect_right(starts, s) - 1] if starts else None
+                cite = (r["paragraph_id"] or None, r["source_url"] or own[1]) if r else (None, own[1])
+                cands.append((rank, pt, s, e, p, cite))
+    if not cands or n <= 0:
+        return []
+    first: Dict[str, int] = {}  # a child's sentences recur in its parent's window: score each text once
+    for i, (_, src, s, e, _, _) in enumerate(cands):
+        first.setdefault(src[s:e], i)
+    cands = [cands[i] for i in first.values()]
+    texts = list(first)
+    sims = similarity(query, texts, tfidf)
+    scores = sims + RANK_PRIOR / np.array([c[0] for c in cands], dtype=np.float32)
+    out, seen, per = [], set(), {}
+    for i in np.argsort(-scores, kind="stable").tolist():
+        if sims[i] <= 0:
+            continue
+        _, src, s, e, p, (paragraph_id, source_url) = cands[i]
+        key = norm_text(texts[i])
+        if key in seen or per.get(p.id, 0) >= MAX_PER_PASSAGE:
+            continue
+        seen.add(key)
+        per[p.id] = per.get(p.id, 0) + 1
+        out.append({
+            "text": texts[i].strip(), "score": float(scores[i]), "passage_id": p.id, "work_id": p.work_id,
+            "work_title": p.work_title, "paragraph_id": paragraph_id, "source_url": source_url,
+            "anchor": anchor(source_url, paragraph_id, src, s, e) if source_url else None,
+        })
+        if len(out) >= n:
+            break
+    return out
@@ -0,0 +1,166 @@
+"""
+Search filters over the works in data/manifests: work ids, authors and collections
+(the library section of a work's bahai.org URL, e.g. "compilations", "bahaullah").
+
+A request's filter resolves to a frozenset of work ids: values within one kind are
+OR-ed, kinds are AND-ed. Names match loosely ("Baha'u'llah" == "Bahá’u’lláh").
+WorkBitmaps turns that set into a row mask for one row space (local index rows,
+corpus doc ids); Milvus gets a templated `work_id in {works}` expression.
+"""
+import os, re, glob, json, threading, unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+import numpy as np
+
+MANIFESTS_DIR = os.getenv("MANIFESTS_DIR", "data/manifests")
+
+class UnknownFilter(ValueError):
+    pass
+
+def fold(name: str) -> str:
+    """Case, accent, apostrophe and separator insensitive key."""
+    s = unicodedata.normalize("NFKD", name or "")
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", "", s.lower())
+
+def _collection(m: Dict) -> str:
+    url = m.get("downloads_page_url") or m.get("about_page_url") or ""
+    parts = url.split("/library/", 1)[-1].strip("/").split("/")
+    return parts[1] if len(parts) > 2 else ""
+
+class Catalog:
+    def __init__(self, manifests_dir: str = MANIFESTS_DIR):
+        self.works: Dict[str, Dict[str, str]] = {}
+        for path in sorted(glob.glob(os.path.join(manifests_dir, "*.json"))):
+            with open(path, "r", encoding="utf-8") as f:
+                m = json.load(f)
+            self.works[m["work_id"]] = {"author": m.get("author") or "", "work_title": m.get("work_title") or "",
+                                        "collection": _collection(m)}
+        self.authors: Dict[str, Set[str]] = {}      # display name -> work ids
+        self.collections: Dict[str, Set[str]] = {}  # slug -> work ids
+        for w, info in self.works.items():
+            if info["author"]: self.authors.setdefault(info["author"], set()).add(w)
+            if info["collection"]: self.collections.setdefault(info["collection"], set()).add(w)
+        self._author_keys = {fold(a): a for a in self.authors}
+        self._collection_keys = {fold(c): c for c in self.collections}
+
+    def _lookup(self, kind: str, names: Iterable[str], keys: Dict[str, str], groups: Dict[str, Set[str]]) -> Set[str]:
+        out: Set[str] = set()
+        for name in names:
+            key = keys.get(fold(name))
+            if key is None:
+                raise UnknownFilter(f"unknown {kind} {name!r}; one of: {', '.join(sorted(groups))}")
+            out |= groups[key]
+        return out
+
+    def resolve(self, work_ids: Sequence[str] | None = None, authors: Sequence[str] | None = None,
+                collections: Sequence[str] | None = None) -> frozenset | None:
+        """Allowed work ids, or None when nothing is filtered."""
+        sets: List[Set[str]] = []
+        if work_ids:
+            unknown = [w for w in work_ids if w not in self.works]
+            if unknown:
+                raise UnknownFilter(f"unknown work_id {unknown[0]!r}")
+            sets.append(set(work_ids))
+        if authors:
+            sets.append(self._lookup("author", authors, self._author_keys, self.authors))
+        if collections:
+            sets.append(self._lookup("collection", collections, self._collection_keys, self.collections))
+        if not sets:
+            return None
+        return frozenset(set.intersection(*sets))
+
+    def describe(self) -> Dict:
+        return {
+            "authors": {a: sorted(ws) for a, ws in sorted(self.authors.items())},
+            "collections": {c: sorted(ws) for c, ws in sorted(self.collections.items())},
+            "works": {w: info for w, info in sorted(self.works.items())},
+        }
+
+class WorkBitmaps:
+    """
+    Row bitmaps for one row space (row i belongs to work row_works[i]): one per work,
+    and precomputed unions for every author and collection. Other work sets are
+    OR-ed on first use and kept in a small LRU, so repeated filters cost a lookup.
+    """
+    CACHE = 256
+
+    def __init__(self, row_works: Sequence[str], catalog: "Catalog"):
+        self.n = len(row_works)
+        rows: Dict[str, List[int]] = {}
+        for i, w in enumerate(row_works):
+            rows.setdefault(w, []).append(i)
+        self.work = {}
+        for w, r in rows.items():
+            m = np.zeros(self.n, dtype=bool)
+            m[r] = True
+            self.work[w] = m
+        self._lock = threading.Lock()
+        self._masks: "OrderedDict[frozenset, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._pinned: Dict[frozenset, Tuple[np.ndarray, np.ndarray]] = {}
+        for group in list(catalog.authors.values()) + list(catalog.collections.values()):
+            key = frozenset(group)
+            self._pinned[key] = self._build(key)
+
+    def _build(self, works: frozenset) -> Tuple[np.ndarray, np.ndarray]:
+        mask = np.zeros(self.n, dtype=bool)
+        for w in works:
+            m = self.work.get(w)
+            if m is not None:
+                mask |= m
+        return mask, np.flatnonzero(mask)
+
+    def _get(self, works: frozenset) -> Tuple[np.ndarray, np.ndarray]:
+        hit = self._pinned.get(works)
+        if hit is not None:
+            return hit
+        with self._lock:
+            hit = self._masks.get(works)
+            if hit is not None:
+                self._masks.move_to_end(works)
+                return hit
+        hit = self._build(works)
+        with self._lock:
+            self._masks[works] = hit
+            while len(self._masks) > self.CACHE:
+                self._masks.popitem(last=False)
+        return hit
+
+    def mask(self, works: frozenset) -> np.ndarray:
+        """Boolean row mask."""
+        return self._get(works)[0]
+
+    def rows(self, works: frozenset) -> np.ndarray:
+        """Sorted row indices (int64)."""
+        return self._get(works)[1]
+
+def milvus_filter(works: frozenset | None) -> Tuple[str | None, Dict | None]:
+    """Templated expression + params (no values interpolated into the string)."""
+    if works is None:
+        return None, None
+    return "work_id in {works}", {"works": sorted(works)}
+
+_CATALOG: Catalog | None = None
+_LOCK = threading.Lock()
+
+def get_catalog() -> Catalog:
+    """Process-wide catalog of data/manifests, loaded on first use."""
+    global _CATALOG
+    if _CATALOG is None:
+        with _LOCK:
+            if _CATALOG is None:
+                _CATALOG = Catalog()
+    return _CATALOG
+
+_CORPUS_BITMAPS: WorkBitmaps | None = None
+
+def get_corpus_bitmaps() -> WorkBitmaps:
+    """WorkBitmaps over corpus doc ids (the BM25 row space)."""
+    global _CORPUS_BITMAPS
+    if _CORPUS_BITMAPS is None:
+        from api.corpus import get_corpus
+        corpus, catalog = get_corpus(), get_catalog()
+        with _LOCK:
+            if _CORPUS_BITMAPS is None:
+                _CORPUS_BITMAPS = WorkBitmaps([r["work_id"] for r in corpus.children], catalog)
+    return _CORPUS_BITMAPS
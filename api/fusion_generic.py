@@ -1,7 +1,11 @@
 from typing import List, Dict, Tuple
-import re, math, unicodedata
+import os, re, math, unicodedata
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import linear_kernel
+from api.corpus import Corpus, get_corpus
+
+TFIDF_PATH = os.getenv("TFIDF_INDEX_PATH", "data/index/tfidf.joblib")
 
 def strip_diacritics(s: str) -> str:
     if not s: return s
@@ -14,16 +18,71 @@ def norm_text(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
-def tfidf_rerank(query: str, rows: List[Dict], top_k: int = 50) -> List[Tuple[int, float]]:
+class CorpusTfidf:
+    """
+    TF-IDF (1-2 gram) fitted once on every child chunk, with its L2-normalized CSR matrix.
+    Reranking slices candidate rows by chunk id and takes one sparse dot product,
+    so IDF is corpus-wide and nothing is re-fitted per request. A saved matrix is only
+    reused for the corpus whose fingerprint it was fitted on.
+    """
+    def __init__(self, vectorizer: TfidfVectorizer, matrix, ids: List[str], fingerprint: str = ""):
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr()
+        self.ids = ids
+        self.row_of = {cid: i for i, cid in enumerate(ids)}
+        self.fingerprint = fingerprint  # Corpus.fingerprint at build time
+
+    @classmethod
+    def build(cls, rows: List[Dict], fingerprint: str = "") -> "CorpusTfidf":
+        vec = TfidfVectorizer(ngram_range=(1,2), min_df=1, dtype=np.float32)
+        X = vec.fit_transform([norm_text(r.get("text","")) for r in rows])
+        vec.stop_words_ = None  # only needed for introspection; can be large
+        return cls(vec, X, [r["id"] for r in rows], fingerprint)
+
+    def save(self, path: str = TFIDF_PATH):
+        import joblib
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({"vectorizer": self.vectorizer, "matrix": self.matrix, "ids": self.ids,
+                     "fingerprint": self.fingerprint}, path)
+
+    @classmethod
+    def load(cls, path: str = TFIDF_PATH) -> "CorpusTfidf":
+        import joblib
+        d = joblib.load(path)
+        return cls(d["vectorizer"], d["matrix"], d["ids"], d.get("fingerprint", ""))
+
+    @classmethod
+    def load_or_build(cls, path: str = TFIDF_PATH, corpus: Corpus | None = None) -> "CorpusTfidf":
+        corpus = corpus or get_corpus()
+        if os.path.exists(path):
+            tfidf = cls.load(path)
+            if tfidf.fingerprint == corpus.fingerprint:
+                return tfidf
+        return cls.build(corpus.children, corpus.fingerprint)
+
+    def transform_query(self, query: str):
+        return self.vectorizer.transform([norm_text(query)])
+
+    def scores(self, query: str, ids: List[str]) -> np.ndarray | None:
+        """Cosine of query vs the given chunk ids; None if any id is not in the matrix."""
+        rows = [self.row_of.get(i) for i in ids]
+        if any(r is None for r in rows): return None
+        return (self.matrix[rows] @ self.transform_query(query).T).toarray().ravel()
+
+def tfidf_rerank(query: str, rows: List[Dict], top_k: int = 50, corpus_tfidf: CorpusTfidf | None = None) -> List[Tuple[int, float]]:
     """Generic TF-IDF reranker over candidate set (1-2 gram). Returns (idx, cosine) pairs."""
-    texts = [norm_text(r.get("text","")) for r in rows]
-    q = norm_text(query)
-    vec = TfidfVectorizer(ngram_range=(1,2), min_df=1)
-    X = vec.fit_transform(texts + [q])
-    tv = X[:-1]    # docs
-    qv = X[-1]     # query
-    sims = linear_kernel(qv, tv).flatten()
-    order = sims.argsort()[::-1][:min(top_k, len(texts))]
+    sims = None
+    if corpus_tfidf is not None:
+        sims = corpus_tfidf.scores(query, [r.get("id") for r in rows])
+    if sims is None:
+        texts = [norm_text(r.get("text","")) for r in rows]
+        q = norm_text(query)
+        vec = TfidfVectorizer(ngram_range=(1,2), min_df=1)
+        X = vec.fit_transform(texts + [q])
+        tv = X[:-1]    # docs
+        qv = X[-1]     # query
+        sims = linear_kernel(qv, tv).flatten()
+    order = sims.argsort()[::-1][:min(top_k, len(rows))]
     return [(idx, float(sims[idx])) for idx in order]
 
 def rrf_fuse(dense_scored: List[Tuple[int,float]], sparse_scored: List[Tuple[int,float]], k: float = 60.0) -> Dict[int, float]:
@@ -42,11 +101,12 @@ def rrf_fuse(dense_scored: List[Tuple[int,float]], sparse_scored: List[Tuple[int
     return fused
 
 def pick_with_fusion(rows: List[Dict], query: str, dense_key: str = "score",
-                     take_dense: int = 100, final_k: int = 10) -> List[Dict]:
+                     take_dense: int = 100, final_k: int = 10,
+                     corpus_tfidf: CorpusTfidf | None = None) -> List[Dict]:
     """
-    rows: [{'text', 'score', ...}] from dense search (higher is better).
+    rows: [{'id', 'text', 'score', ...}] from dense search (higher is better).
     1) take top-N dense
-    2) sparse (TF-IDF) rerank on that candidate set
+    2) sparse (TF-IDF) rerank on that candidate set (precomputed corpus rows when given)
     3) RRF fuse dense + sparse
     """
     if not rows: return []
@@ -59,7 +119,7 @@ def pick_with_fusion(rows: List[Dict], query: str, dense_key: str = "score",
     dense_pairs = [(i, r.get(dense_key, 0.0)) for i, r in zip(idxs, cand)]
 
     # 2) sparse rerank on cand (returns (cand_local_idx, score)); map back to original idx
-    sparse_local = tfidf_rerank(query, cand, top_k=len(cand))
+    sparse_local = tfidf_rerank(query, cand, top_k=len(cand), corpus_tfidf=corpus_tfidf)
     sparse_pairs = [(idxs[i], s) for (i, s) in sparse_local]
 
     # 3) fuse
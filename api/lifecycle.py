@@ -0,0 +1,177 @@
+"""
+Startup lifecycle: named dependencies that are loaded once, either in the background
+from the lifespan hook or lazily by the first request that needs them.
+
+  STARTUP_MODE=background   (default) serve immediately, load dependencies on a worker thread
+  STARTUP_MODE=eager        load everything before the server accepts connections
+  STARTUP_MODE=lazy         load nothing up front; the first request pays for it
+
+A failed dependency is retried by the next request that needs it; /readyz reports
+the state of each one. Deferred dependencies (optional features that may take seconds
+to build) load on their own thread once the required ones are ready, so readiness
+never waits for them; until then the app runs without them.
+"""
+import os, time, asyncio, threading
+from typing import Any, Callable, Dict, List
+from api.metrics import STARTUP_SECONDS
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()
+
+class DependencyUnavailable(Exception):
+    def __init__(self, name: str, error: str):
+        super().__init__(f"{name} unavailable: {error}")
+        self.name = name
+        self.error = error
+
+class Dependency:
+    def __init__(self, name: str, init: Callable[[], Any], required: bool = True, deferred: bool = False):
+        self.name, self.init, self.required, self.deferred = name, init, required and not deferred, deferred
+        self.state = "pending"  # pending | loading | ready | failed
+        self.error: str | None = None
+        self.seconds: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        """Run init() once; concurrent callers block until it finishes. Raises DependencyUnavailable."""
+        if self.ready: return
+        with self._lock:
+            if self.ready: return
+            self.state, self.error = "loading", None
+            t = time.perf_counter()
+            try:
+                self.init()
+            except Exception as e:
+                self.state, self.error = "failed", f"{type(e).__name__}: {e}"
+                raise DependencyUnavailable(self.name, self.error) from e
+            finally:
+                self.seconds = time.perf_counter() - t
+            self.state = "ready"
+            STARTUP_SECONDS.set(self.seconds, phase=f"load:{self.name}")
+
+    def status(self) -> Dict[str, Any]:
+        out = {"state": self.state, "required": self.required}
+        if self.deferred: out["deferred"] = True
+        if self.seconds is not None: out["seconds"] = round(self.seconds, 3)
+        if self.error: out["error"] = self.error
+        return out
+
+class Startup:
+    """
+    Dependencies in load order, an optional warmup run after them, and the
+    import -> ready -> first request timeline (seconds since `t0`).
+    """
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self.deps: List[Dependency] = []
+        self.warmup: Callable[[], Dict[str, Any]] | None = None
+        self.warmup_state: Dict[str, Any] = {"state": "pending"}
+        self.timeline: Dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+        self._deferred: threading.Thread | None = None
+        self._deferred_lock = threading.Lock()
+
+    def add(self, name: str, init: Callable[[], Any], required: bool = True, deferred: bool = False):
+        self.deps.append(Dependency(name, init, required, deferred))
+
+    def mark(self, phase: str):
+        """Record the first time `phase` is reached."""
+        if phase not in self.timeline:
+            self.timeline[phase] = time.perf_counter() - self.t0
+            STARTUP_SECONDS.set(self.timeline[phase], phase=phase)
+
+    @property
+    def ready(self) -> bool:
+        return all(d.ready for d in self.deps if d.required)
+
+    def load_ready(self):
+        """Blocking: load the non-deferred dependencies in order (optional ones may fail), then mark ready."""
+        for d in self.deps:
+            if d.deferred: continue
+            try:
+                d.load()
+            except DependencyUnavailable:
+                if d.required: raise
+        self.mark("ready")
+
+    def load_deferred(self):
+        """Blocking: load the deferred dependencies; a failure is only reported by /readyz."""
+        for d in self.deps:
+            if not d.deferred: continue
+            try:
+                d.load()
+            except DependencyUnavailable:
+                pass
+
+    def load_all(self):
+        """Blocking: load every dependency, deferred ones included (scripts, STARTUP_MODE=eager)."""
+        self.load_ready()
+        self.load_deferred()
+
+    def start_deferred(self):
+        """Load the deferred dependencies on a daemon thread, once per process."""
+        if self._deferred is not None: return
+        with self._deferred_lock:
+            if self._deferred is not None or not any(d.deferred for d in self.deps): return
+            self._deferred = threading.Thread(target=self.load_deferred, name="startup-deferred", daemon=True)
+            self._deferred.start()
+
+    async def ensure(self):
+        """Request-path guard: a no-op once ready, else loads what is missing on a worker thread."""
+        if not self.ready:
+            await asyncio.to_thread(self.load_ready)
+        self.start_deferred()  # lazy mode: the first request starts them
+
+    def run_warmup(self):
+        if self.warmup is None: return
+        self.warmup_state = {"state": "running"}
+        t = time.perf_counter()
+        try:
+            info = self.warmup() or {}
+            self.warmup_state = {"state": "done", **info}
+        except Exception as e:
+            self.warmup_state = {"state": "failed", "error": f"{type(e).__name__}: {e}"}
+        self.warmup_state["seconds"] = round(time.perf_counter() - t, 3)
+        self.mark("warm")
+
+    def _background(self):
+        try:
+            self.load_ready()
+        except DependencyUnavailable:
+            return  # reported by /readyz; the next request retries
+        self.start_deferred()
+        self.run_warmup()
+
+    def _eager(self):
+        try:
+            self.load_all()
+        except DependencyUnavailable:
+            return
+        self.run_warmup()
+
+    async def start(self):
+        """Lifespan startup according to STARTUP_MODE."""
+        self.mark("startup")
+        if STARTUP_MODE == "eager":
+            await asyncio.to_thread(self._eager)
+        elif STARTUP_MODE != "lazy":
+            self._task = asyncio.create_task(asyncio.to_thread(self._background))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), 5)
+            except asyncio.TimeoutError:
+                pass  # the worker thread cannot be cancelled; it dies with the process
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "mode": STARTUP_MODE,
+            "dependencies": {d.name: d.status() for d in self.deps},
+            "warmup": self.warmup_state if self.warmup is not None else {"state": "disabled"},
+            "timeline": {k: round(v, 3) for k, v in self.timeline.items()},
+        }
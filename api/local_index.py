@@ -0,0 +1,151 @@
+import os
+from typing import List, Dict, Sequence, Tuple
+import numpy as np
+from api.corpus import Corpus, get_corpus
+from api.filters import Catalog, WorkBitmaps, get_catalog
+from api.embedding_profile import reduce_dims, quantize_int8, quantize_binary, hamming, nbytes
+
+INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/index")
+VECTORS_FILE = "child_vectors.npy"
+IDS_FILE = "child_ids.txt"
+# Quantized copies for the coarse stage (scripts/build_local_index.py --quant); computed at load when absent
+INT8_FILE = "child_vectors.int8.npy"
+INT8_SCALE_FILE = "child_vectors.int8_scale.npy"
+BINARY_FILE = "child_vectors.bin.npy"
+
+OUTPUT_FIELDS = ("parent_id", "work_id", "work_title", "paragraph_id", "text", "source_url")
+
+class LocalHit:
+    """Duck-types a pymilvus Hit (id / fields / distance) so _hits_to_passages works unchanged."""
+    __slots__ = ("id", "fields", "distance")
+    def __init__(self, id: str, fields: Dict, distance: float):
+        self.id = id
+        self.fields = fields
+        self.distance = distance
+
+class LocalIndex:
+    """
+    Cosine search over an (n, d) matrix of L2-normalized child embeddings,
+    memory-mapped from a .npy file (float32 or float16). Row i belongs to ids[i].
+
+    quant="none" scans X exactly. "int8" / "binary" scan quantized codes instead and
+    rescore the best k * rescore candidates against X. Queries longer than d are
+    truncated to d (Matryoshka), so a reduced index works with full-size embeddings.
+    """
+    BLOCK = 4096  # rows cast per step when the matrix is not float32
+
+    def __init__(self, index_dir: str = INDEX_DIR, corpus: Corpus | None = None, quant: str = "none", rescore: int = 4,
+                 X: np.ndarray | None = None, ids: List[str] | None = None, catalog: Catalog | None = None):
+        in_memory = X is not None
+        if not in_memory:
+            X = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+            with open(os.path.join(index_dir, IDS_FILE), "r", encoding="utf-8") as f:
+                ids = [line.strip() for line in f if line.strip()]
+        self.X, self.ids = X, ids
+        if len(self.ids) != self.X.shape[0]:
+            raise ValueError(f"{IDS_FILE} has {len(self.ids)} ids but {VECTORS_FILE} has {self.X.shape[0]} rows")
+        self.corpus = corpus or get_corpus()
+        self.row_of = {i: r for r, i in enumerate(self.ids)}
+        self.row_to_doc = np.array([self.corpus.id_to_idx.get(i, -1) for i in self.ids], dtype=np.int64)
+        self.bitmaps = WorkBitmaps([self.corpus.children[d]["work_id"] if d >= 0 else "" for d in self.row_to_doc],
+                                   catalog or get_catalog())
+
+        self.quant = quant
+        self.rescore = max(1, rescore)
+        self.codes = self.scale = None
+        if quant == "int8":
+            if in_memory or not os.path.exists(os.path.join(index_dir, INT8_FILE)):
+                self.codes, self.scale = quantize_int8(np.asarray(self.X, dtype=np.float32))
+            else:
+                self.codes = np.load(os.path.join(index_dir, INT8_FILE), mmap_mode="r")
+                self.scale = np.load(os.path.join(index_dir, INT8_SCALE_FILE))
+        elif quant == "binary":
+            if in_memory or not os.path.exists(os.path.join(index_dir, BINARY_FILE)):
+                self.codes = quantize_binary(self.X)
+            else:
+                self.codes = np.load(os.path.join(index_dir, BINARY_FILE), mmap_mode="r")
+        elif quant != "none":
+            raise ValueError(f"unknown quant {quant!r}")
+        if self.codes is not None and self.codes.shape[0] != self.X.shape[0]:
+            raise ValueError(f"{quant} codes have {self.codes.shape[0]} rows but {VECTORS_FILE} has {self.X.shape[0]}")
+
+    @property
+    def dim(self) -> int:
+        return self.X.shape[1]
+
+    def memory(self) -> Dict[str, int]:
+        """Bytes of the matrix every query scans, and of the rows only candidates touch."""
+        if self.codes is None:
+            return {"scan_bytes": nbytes(self.X), "rescore_bytes": 0}
+        return {"scan_bytes": nbytes(self.codes, self.scale), "rescore_bytes": nbytes(self.X)}
+
+    def _matmul(self, Q: np.ndarray, M: np.ndarray) -> np.ndarray:
+        if M.dtype == np.float32:
+            return Q @ M.T
+        out = np.empty((Q.shape[0], M.shape[0]), dtype=np.float32)
+        for s in range(0, M.shape[0], self.BLOCK):
+            out[:, s:s + self.BLOCK] = Q @ np.asarray(M[s:s + self.BLOCK], dtype=np.float32).T
+        return out
+
+    def _scores(self, Q: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        """(n_queries, n_rows) cosine scores; Q rows are already normalized float32."""
+        return self._matmul(Q, self.X if rows is None else self.X[rows])
+
+    def _coarse(self, Q: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        """(n_queries, n_rows) approximate scores from the quantized codes (higher is closer)."""
+        C = self.codes if rows is None else self.codes[rows]
+        if self.quant == "int8":
+            return self._matmul(Q * self.scale, C)
+        qb = quantize_binary(Q)
+        return -np.stack([hamming(q, C) for q in qb]).astype(np.float32)
+
+    def _rescored(self, q: np.ndarray, coarse: np.ndarray, rows: np.ndarray | None, k: int) -> List[LocalHit]:
+        n = min(k * self.rescore, coarse.shape[0])
+        if n <= 0: return []
+        cand = np.argpartition(-coarse, n - 1)[:n]
+        cand = np.sort(cand if rows is None else rows[cand])  # sorted rows read the mmap in order
+        return self._hits(self._matmul(q[None, :], self.X[cand])[0], cand, k)
+
+    def _hits(self, scores: np.ndarray, rows: np.ndarray | None, k: int) -> List[LocalHit]:
+        k = min(k, scores.shape[0])
+        if k <= 0: return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = []
+        for j in top:
+            row = int(rows[j]) if rows is not None else int(j)
+            doc = self.row_to_doc[row]
+            rec = self.corpus.children[doc] if doc >= 0 else {}
+            hits.append(LocalHit(self.ids[row], {f: rec.get(f, "") for f in OUTPUT_FIELDS}, float(scores[j])))
+        return hits
+
+    def search_many(self, vecs: Sequence[Sequence[float]], k: int, works: frozenset | None = None) -> List[List[LocalHit]]:
+        """Top-k per query; `works` (api/filters.py) restricts the scan to those works' rows."""
+        Q = np.asarray(vecs, dtype=np.float32).reshape(len(vecs), -1)
+        if Q.shape[1] < self.dim:
+            raise ValueError(f"query has {Q.shape[1]} dimensions, the index {self.dim}")
+        Q = reduce_dims(Q, self.dim)
+        rows = None
+        if works is not None:
+            rows = self.bitmaps.rows(works)
+            if not len(rows):
+                return [[] for _ in range(len(Q))]
+        if self.codes is None:
+            S = self._scores(Q, rows)
+            return [self._hits(S[i], rows, k) for i in range(len(Q))]
+        C = self._coarse(Q, rows)
+        return [self._rescored(Q[i], C[i], rows, k) for i in range(len(Q))]
+
+    def vectors(self, ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(len(ids), dim) float32 rows for `ids` (zeros where missing) and the found mask."""
+        rows = np.array([self.row_of.get(i, -1) for i in ids], dtype=np.int64)
+        found = rows >= 0
+        V = np.zeros((len(ids), self.dim), dtype=np.float32)
+        if found.any():
+            order = np.argsort(rows[found])  # sorted rows read the mmap in order
+            V[np.flatnonzero(found)[order]] = self.X[rows[found][order]]
+        return V, found
+
+    def search(self, vec: Sequence[float], k: int, works: frozenset | None = None) -> List[List[LocalHit]]:
+        """Same shape as Collection.search for a single query: [[hit, ...]]."""
+        return self.search_many([vec], k, works=works)
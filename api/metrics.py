@@ -0,0 +1,193 @@
+"""
+Per-stage timing spans, Prometheus text exposition and a Server-Timing header.
+
+    with span("embed"): ...      # observed into bahai_stage_seconds{stage="embed"}
+                                 # and listed in the request's Server-Timing header
+
+Spans are collected per request through a contextvar set by TimingMiddleware;
+run_in_threadpool copies the context, so spans recorded in worker threads land
+on the same request.
+"""
+import math, time, threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 6, 8, 12, 16, 24, 32, 64, 128)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+REGISTRY: List["_Metric"] = []
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names: return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+def _num(v: float) -> str:
+    if v == math.inf: return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+class _Metric:
+    kind = ""
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    kind = "gauge"
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple, List] = {}  # key -> [per-bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, [list(s[0]), s[1], s[2]]) for k, s in self._series.items())
+        out = super().render()
+        for key, (counts, total, n) in items:
+            acc = 0
+            for le, c in zip(self.buckets, counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (_num(le),))} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return out
+
+def render() -> str:
+    return "\n".join(line for m in REGISTRY for line in m.render()) + "\n"
+
+STAGE_SECONDS = Histogram("bahai_stage_seconds", "Time spent per pipeline stage.", labelnames=("stage",))
+REQUEST_SECONDS = Histogram("bahai_request_seconds", "HTTP request latency.", labelnames=("route", "status"))
+FALLBACKS = Counter("bahai_fallback_total", "Fallback branches taken (hybrid_rrf, prompt_id, llm_timeout, last_resort).", labelnames=("kind",))
+RETRIEVAL_MODE = Counter("bahai_retrieval_total", "Retrievals by used_mode.", labelnames=("mode",))
+RETRIEVED_CHUNKS = Histogram("bahai_retrieved_chunks", "Chunks retrieved per request.", buckets=COUNT_BUCKETS, labelnames=("route",))
+PROMPT_TOKENS = Histogram("bahai_prompt_tokens", "LLM input tokens per answer.", buckets=TOKEN_BUCKETS)
+COMPLETION_TOKENS = Histogram("bahai_completion_tokens", "LLM output tokens per answer.", buckets=TOKEN_BUCKETS)
+COALESCED = Counter("bahai_coalesced_total", "Requests served by joining an identical in-flight request.", labelnames=("mode",))
+FLIGHTS = Counter("bahai_flights_total", "Requests that ran the upstream work themselves (coalescing leaders).", labelnames=("mode",))
+CONTEXT_TOKENS = Histogram("bahai_context_tokens", "Evidence tokens packed into the prompt.", buckets=TOKEN_BUCKETS)
+CONTEXT_TOKENS_SAVED = Histogram("bahai_context_tokens_saved", "Evidence tokens saved by parent dedup and the budget.", buckets=(0,) + TOKEN_BUCKETS)
+DIVERSITY_REMOVED = Counter("bahai_diversity_removed_total", "Top-k passages replaced by the MMR stage, by reason.", labelnames=("reason",))
+ADMISSION_ACTIVE = Gauge("bahai_admission_active", "Requests holding an admission slot.", labelnames=("pool",))
+ADMISSION_QUEUE = Gauge("bahai_admission_queue_depth", "Requests waiting for an admission slot.", labelnames=("pool",))
+ADMISSION_WAIT = Histogram("bahai_admission_wait_seconds", "Time admitted or rejected requests spent queued.", labelnames=("pool",))
+ADMISSION_REJECTED = Counter("bahai_admission_rejected_total", "Requests turned away: queue_full (429) or deadline (503).", labelnames=("pool", "reason"))
+ADMISSION_SHED = Counter("bahai_admission_shed_total", "Answers served extractively (no LLM) instead of being turned away.", labelnames=("pool", "reason"))
+STARTUP_SECONDS = Gauge("bahai_startup_seconds", "Seconds from import of api.app to each startup phase / dependency load time.", labelnames=("phase",))
+
+_SPANS: ContextVar[List[Tuple[str, float]] | None] = ContextVar("bahai_spans", default=None)
+
+@contextmanager
+def span(stage: str):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t
+        STAGE_SECONDS.observe(dt, stage=stage)
+        spans = _SPANS.get()
+        if spans is not None:
+            spans.append((stage, dt))
+
+def observe_usage(resp):
+    """Token counts from an OpenAI Responses result (or its usage object), if present."""
+    usage = getattr(resp, "usage", resp)
+    n_in = getattr(usage, "input_tokens", None)
+    n_out = getattr(usage, "output_tokens", None)
+    if isinstance(n_in, (int, float)): PROMPT_TOKENS.observe(n_in)
+    if isinstance(n_out, (int, float)): COMPLETION_TOKENS.observe(n_out)
+
+def server_timing(spans: List[Tuple[str, float]], total: float | None = None) -> str:
+    agg: Dict[str, float] = {}
+    for stage, dt in spans:
+        agg[stage] = agg.get(stage, 0.0) + dt
+    parts = [f"{stage};dur={dt * 1000:.1f}" for stage, dt in agg.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware: opens a span list per request, adds Server-Timing to the
+    response head and records bahai_request_seconds by route template. For streamed
+    responses the header covers what ran before the first byte (retrieval).
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        spans: List[Tuple[str, float]] = []
+        token = _SPANS.set(spans)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(spans, time.perf_counter() - t0).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _SPANS.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, route=getattr(route, "path", "unmatched"), status=str(status[0]))
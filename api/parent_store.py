@@ -0,0 +1,115 @@
+import os, glob, json, mmap, threading
+from typing import Dict
+import numpy as np
+from api.corpus import Corpus, get_corpus
+
+STORE_DIR = os.getenv("PARENT_STORE_DIR", "data/index")
+BLOB_FILE = "parents.bin"
+IDS_FILE = "parents.ids"
+OFFSETS_FILE = "parents.offsets.npy"
+FINGERPRINT_FILE = "parents.fingerprint"  # Corpus.fingerprint of the exports it was packed from
+
+def pack_parents(exports_dir: str = "data/exports", out_dir: str = STORE_DIR) -> int:
+    """
+    Pack every parent text into one UTF-8 blob plus a sorted id list and an
+    (n, 2) int64 array of (offset, length) rows, and record the corpus fingerprint
+    (replaced last, so a half-written pack never matches). Returns the number of parents.
+    """
+    texts: Dict[str, str] = {}
+    for path in sorted(glob.glob(os.path.join(exports_dir, "*_parents.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip(): continue
+                r = json.loads(line)
+                texts[r["id"]] = r["text"]
+    ids = sorted(texts)
+    offsets = np.zeros((len(ids), 2), dtype=np.int64)
+    os.makedirs(out_dir, exist_ok=True)
+    pos = 0
+    with open(os.path.join(out_dir, BLOB_FILE + ".tmp"), "wb") as fo:
+        for i, pid in enumerate(ids):
+            b = texts[pid].encode("utf-8")
+            fo.write(b)
+            offsets[i] = (pos, len(b))
+            pos += len(b)
+    with open(os.path.join(out_dir, IDS_FILE + ".tmp"), "w", encoding="utf-8") as fo:
+        fo.write("\n".join(ids) + "\n")
+    with open(os.path.join(out_dir, OFFSETS_FILE + ".tmp"), "wb") as fo:
+        np.save(fo, offsets)
+    with open(os.path.join(out_dir, FINGERPRINT_FILE + ".tmp"), "w", encoding="utf-8") as fo:
+        fo.write(Corpus(exports_dir).fingerprint + "\n")
+    for name in (BLOB_FILE, IDS_FILE, OFFSETS_FILE, FINGERPRINT_FILE):
+        os.replace(os.path.join(out_dir, name + ".tmp"), os.path.join(out_dir, name))
+    return len(ids)
+
+class ParentStore:
+    """
+    Read-only parent texts backed by mmap, so uvicorn workers share the pages
+    through the OS page cache. Files are opened on first lookup.
+    """
+    def __init__(self, store_dir: str = STORE_DIR):
+        self.store_dir = store_dir
+        self._lock = threading.Lock()
+        self._blob = None
+        self._offsets = None
+        self._row: Dict[str, int] | None = None
+
+    def _open(self):
+        with self._lock:
+            if self._row is not None: return
+            with open(os.path.join(self.store_dir, IDS_FILE), "r", encoding="utf-8") as f:
+                ids = [line.rstrip("\n") for line in f if line.strip()]
+            self._offsets = np.load(os.path.join(self.store_dir, OFFSETS_FILE), mmap_mode="r")
+            with open(os.path.join(self.store_dir, BLOB_FILE), "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+            self._row = {pid: i for i, pid in enumerate(ids)}
+
+    def get(self, parent_id: str) -> str | None:
+        if self._row is None: self._open()
+        i = self._row.get(parent_id)
+        if i is None: return None
+        off, n = self._offsets[i]
+        return self._blob[int(off):int(off) + int(n)].decode("utf-8")
+
+    def __contains__(self, parent_id: str) -> bool:
+        if self._row is None: self._open()
+        return parent_id in self._row
+
+    def __len__(self) -> int:
+        if self._row is None: self._open()
+        return len(self._row)
+
+class JsonlParentStore:
+    """Fallback when the packed store has not been built: parent texts read from the exports."""
+    def __init__(self, exports_dir: str = "data/exports"):
+        self._texts: Dict[str, str] = {}
+        for path in glob.glob(os.path.join(exports_dir, "*_parents.jsonl")):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip(): continue
+                    r = json.loads(line)
+                    self._texts[r["id"]] = r["text"]
+
+    def get(self, parent_id: str) -> str | None:
+        return self._texts.get(parent_id)
+
+    def __contains__(self, parent_id: str) -> bool:
+        return parent_id in self._texts
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+def packed_fingerprint(store_dir: str = STORE_DIR) -> str:
+    try:
+        with open(os.path.join(store_dir, FINGERPRINT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def open_parent_store(store_dir: str = STORE_DIR, corpus: Corpus | None = None):
+    """The packed store if it was packed from the current exports (corpus fingerprint), else the JSONL fallback."""
+    corpus = corpus or get_corpus()
+    if (all(os.path.exists(os.path.join(store_dir, f)) for f in (BLOB_FILE, IDS_FILE, OFFSETS_FILE))
+            and packed_fingerprint(store_dir) == corpus.fingerprint):
+        return ParentStore(store_dir)
+    return JsonlParentStore()
@@ -0,0 +1,264 @@
+"""
+Exact-quote / phrase lookup over the child texts in data/exports, without embeddings.
+
+Every child is tokenized like BM25 (lowercase, diacritic-folded `\\w+`), mapped to
+token ids and concatenated (0 separates children). A word-level suffix array over
+that stream, sorted on the first PHRASE_DEPTH tokens, answers "where does this
+token sequence occur" with two binary searches:
+
+  exact   the whole query occurs inside one child
+  near    the query's word pairs that occur in one child at consistent offsets
+          cover most of its words (a misremembered word, a dropped clause, other punctuation)
+
+Matches carry token offsets, mapped back to character offsets in the original text
+(`highlight`) and to a text-fragment deep link (`anchor`).
+"""
+import os, pickle, unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple
+from urllib.parse import quote
+import numpy as np
+from api.bm25 import tokenize, TOKEN_RE
+from api.corpus import Corpus, get_corpus
+
+PHRASE_PATH = os.getenv("PHRASE_INDEX_PATH", "data/index/phrases.pkl")
+PHRASE_DEPTH = int(os.getenv("PHRASE_DEPTH", "32"))        # suffix order resolved to this many tokens
+PHRASE_MIN_WORDS = int(os.getenv("PHRASE_MIN_WORDS", "6"))  # unquoted queries shorter than this are not quotes
+NEAR_WINDOW = 2
+NEAR_THRESHOLD = float(os.getenv("PHRASE_NEAR", "0.75"))   # share of query words a near match must cover
+NEAR_COMMON = 2000  # windows occurring more often than this only count on candidates, never nominate them
+NEAR_SLACK = 8      # tokens a window may drift from the best alignment and still count
+
+QUOTES_OPEN = "\"'“‘«„"
+QUOTES_CLOSE = "\"'”’»“"
+QUESTION_WORDS = {
+    "what", "who", "whom", "whose", "why", "how", "when", "where", "which", "is", "are", "was", "were",
+    "do", "does", "did", "can", "could", "should", "would", "will", "explain", "tell", "describe",
+    "list", "give", "summarize", "compare", "find",
+}
+
+def strip_quotes(q: str) -> Tuple[str, bool]:
+    """Query without surrounding quote marks, and whether it had them."""
+    s = (q or "").strip()
+    if len(s) > 2 and s[0] in QUOTES_OPEN and s[-1] in QUOTES_CLOSE:
+        return s[1:-1].strip(), True
+    return s, False
+
+def looks_like_quote(q: str) -> bool:
+    """Quoted text, or a long statement that is not phrased as a question."""
+    s, quoted = strip_quotes(q)
+    if quoted:
+        return True
+    toks = tokenize(s)
+    return len(toks) >= PHRASE_MIN_WORDS and not s.endswith("?") and toks[0] not in QUESTION_WORDS
+
+@lru_cache(maxsize=4096)
+def _fold_char(ch: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", ch.lower()) if not unicodedata.combining(c))
+
+def token_spans(text: str, limit: int | None = None) -> List[Tuple[int, int]]:
+    """Character spans in `text` of the (first `limit`) tokens tokenize() yields, in order."""
+    if text.isascii():
+        folded, pos = text.lower(), None
+    else:
+        parts, pos = [], []
+        for i, ch in enumerate(text):
+            f = ch if ch.isascii() else _fold_char(ch)
+            parts.append(f)
+            pos.extend([i] * len(f))
+        folded = "".join(parts)
+    out = []
+    for m in TOKEN_RE.finditer(folded):
+        if limit is not None and len(out) >= limit:
+            break
+        out.append((m.start(), m.end()) if pos is None else (pos[m.start()], pos[m.end() - 1] + 1))
+    return out
+
+def _fragment(s: str) -> str:
+    return quote(s, safe="").replace("-", "%2D")
+
+def anchor(source_url: str, paragraph_id: str, text: str, start: int, end: int) -> str:
+    """Deep link to text[start:end]: `#paragraph` (when known) plus a `:~:text=` fragment."""
+    words = text[start:end].split()
+    if len(words) <= 8:
+        directive = _fragment(" ".join(words))
+    else:
+        directive = _fragment(" ".join(words[:4])) + "," + _fragment(" ".join(words[-4:]))
+    return f"{source_url}#{paragraph_id or ''}:~:text={directive}"
+
+def suffix_array(T: np.ndarray, depth: int) -> np.ndarray:
+    """Prefix doubling until suffixes are ordered on their first `depth` tokens (int32)."""
+    n = len(T)
+    rank = T.astype(np.int64)
+    sa = np.argsort(rank, kind="stable")
+    k = 1
+    while k < depth:
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        r, s = rank[sa], second[sa]
+        new = np.empty(n, dtype=np.int64)
+        new[sa] = np.concatenate(([0], np.cumsum((r[1:] != r[:-1]) | (s[1:] != s[:-1]))))
+        rank = new
+        if rank[sa[-1]] == n - 1:  # all suffixes distinct
+            break
+        k *= 2
+    return sa.astype(np.int32)
+
+class PhraseMatch(NamedTuple):
+    doc: int          # corpus row
+    start: int        # token offsets within the child
+    end: int
+    coverage: float   # 1.0 for exact matches
+    exact: bool
+
+class PhraseIndex:
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.T = np.zeros(0, dtype=np.int32)          # token ids, 0 after every child
+        self.doc_start = np.zeros(1, dtype=np.int64)  # child d is T[doc_start[d]:doc_start[d+1]-1]
+        self.sa = np.zeros(0, dtype=np.int32)
+        self.depth = PHRASE_DEPTH
+        self.fingerprint = ""  # Corpus.fingerprint at build time: offsets are only valid for that corpus
+
+    @classmethod
+    def build(cls, corpus: Corpus, depth: int = PHRASE_DEPTH) -> "PhraseIndex":
+        idx = cls()
+        idx.depth = depth
+        idx.fingerprint = corpus.fingerprint
+        ids, starts = [], [0]
+        for rec in corpus.children:
+            ids.extend(idx.vocab.setdefault(t, len(idx.vocab) + 1) for t in tokenize(rec["text"]))
+            ids.append(0)
+            starts.append(len(ids))
+        idx.T = np.asarray(ids, dtype=np.int32)
+        idx.doc_start = np.asarray(starts, dtype=np.int64)
+        idx.sa = suffix_array(idx.T, depth)
+        return idx
+
+    def save(self, path: str = PHRASE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = PHRASE_PATH) -> "PhraseIndex":
+        idx = cls()
+        with open(path, "rb") as f:
+            idx.__dict__.update(pickle.load(f))
+        return idx
+
+    @classmethod
+    def load_or_build(cls, path: str = PHRASE_PATH, corpus: Corpus | None = None) -> "PhraseIndex":
+        corpus = corpus or get_corpus()
+        if os.path.exists(path):
+            idx = cls.load(path)
+            if idx.fingerprint == corpus.fingerprint:
+                return idx
+        return cls.build(corpus)
+
+    def __len__(self):
+        return len(self.doc_start) - 1
+
+    def encode(self, text: str) -> List[int]:
+        """Token ids of `text`; -1 for words that never occur in the corpus."""
+        return [self.vocab.get(t, -1) for t in tokenize(text)]
+
+    def occurrences(self, q: List[int]) -> np.ndarray:
+        """Stream positions where the token sequence q starts (within one child)."""
+        if not q or min(q) <= 0:
+            return np.zeros(0, dtype=np.int64)
+        T, sa, head = self.T, self.sa, q[:self.depth]
+        key = lambda i: T[sa[i]:sa[i] + len(head)].tolist()
+        lo = bisect_left(range(len(sa)), head, key=key)
+        hi = bisect_right(range(len(sa)), head, lo=lo, key=key)
+        pos = sa[lo:hi].astype(np.int64)
+        if len(q) > self.depth and len(pos):
+            tail = np.asarray(q[self.depth:], dtype=np.int32)
+            pos = np.asarray([p for p in pos if np.array_equal(T[p + self.depth:p + len(q)], tail)], dtype=np.int64)
+        return pos
+
+    def doc_of(self, pos: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.doc_start, pos, side="right") - 1
+
+    def exact(self, q: List[int], allowed: np.ndarray | None = None,
+              prefer: np.ndarray | None = None) -> List[PhraseMatch]:
+        """First occurrence per child; children with prefer[d] first, then corpus order."""
+        pos = np.sort(self.occurrences(q))
+        docs = self.doc_of(pos)
+        out, seen = [], set()
+        for p, d in zip(pos.tolist(), docs.tolist()):
+            if d in seen or (allowed is not None and not allowed[d]): continue
+            seen.add(d)
+            s = p - int(self.doc_start[d])
+            out.append(PhraseMatch(d, s, s + len(q), 1.0, True))
+        if prefer is not None:
+            out.sort(key=lambda m: not prefer[m.doc])
+        return out
+
+    def near(self, q: List[int], allowed: np.ndarray | None = None, prefer: np.ndarray | None = None,
+             threshold: float = NEAR_THRESHOLD, candidates: int = 30) -> List[PhraseMatch]:
+        """Children whose aligned windows cover >= threshold of q's tokens, best first."""
+        W = NEAR_WINDOW
+        windows = [q[i:i + W] for i in range(len(q) - W + 1)]
+        if not windows:
+            return []
+        votes: Counter = Counter()
+        for w in windows:
+            pos = self.occurrences(w)
+            if 0 < len(pos) <= NEAR_COMMON:
+                votes.update(np.unique(self.doc_of(pos)).tolist())
+        out = []
+        for d, _ in votes.most_common(candidates):
+            if allowed is not None and not allowed[d]:
+                continue
+            m = self._align(d, windows, len(q))
+            if m is not None and m.coverage >= threshold:
+                out.append(m)
+        out.sort(key=lambda m: (-m.coverage, prefer is not None and not prefer[m.doc], m.doc))
+        return out
+
+    def _align(self, d: int, windows: List[List[int]], n: int) -> PhraseMatch | None:
+        W = NEAR_WINDOW
+        D = self.T[int(self.doc_start[d]):int(self.doc_start[d + 1]) - 1]
+        if len(D) < W:
+            return None
+        Q = np.asarray(windows, dtype=np.int32)
+        eq = np.ones((len(Q), len(D) - W + 1), dtype=bool)
+        for j in range(W):
+            eq &= Q[:, j, None] == D[None, j:len(D) - W + 1 + j]
+        wi, ps = np.nonzero(eq)  # window i occurs at child position p
+        if not len(wi):
+            return None
+        drift = ps - wi
+        vals, counts = np.unique(drift, return_counts=True)
+        drift = np.abs(drift - vals[np.argmax(counts)])
+        keep: Dict[int, Tuple[int, int]] = {}  # window -> (drift, position) closest to the best alignment
+        for i, p, dr in zip(wi.tolist(), ps.tolist(), drift.tolist()):
+            if dr <= NEAR_SLACK and (i not in keep or dr < keep[i][0]):
+                keep[i] = (dr, p)
+        covered = set()
+        for i in keep:
+            covered.update(range(i, i + W))
+        pos = [p for _, p in keep.values()]
+        return PhraseMatch(d, min(pos), max(pos) + W, len(covered) / n, False)
+
+    def search(self, query: str, k: int, allowed: np.ndarray | None = None, prefer: np.ndarray | None = None,
+               threshold: float = NEAR_THRESHOLD) -> List[PhraseMatch]:
+        """Exact matches, then near ones, up to k children."""
+        q = self.encode(strip_quotes(query)[0])
+        if len(q) < NEAR_WINDOW + 1:
+            return []
+        out = self.exact(q, allowed, prefer)[:k]
+        if len(out) < k:
+            seen = {m.doc for m in out}
+            out += [m for m in self.near(q, allowed, prefer, threshold) if m.doc not in seen][:k - len(out)]
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {"children": len(self), "tokens": int(len(self.T)), "vocab": len(self.vocab),
+                "bytes": int(self.T.nbytes + self.sa.nbytes + self.doc_start.nbytes)}
@@ -0,0 +1,94 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls with the same key: the first caller's
+    fn() runs as its own task and every caller (leader included) awaits it
+    shielded, so a disconnecting leader does not cancel the work for the others.
+    Nothing is kept once the task finishes; that is the caches' job.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (result, shared); shared is True when another caller started the work."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here, so an unawaited failure is not logged as lost
+
+    def __len__(self):
+        return len(self._calls)
+
+class Broadcast:
+    """Append-only chunk log of one in-flight stream; every subscriber replays it from the start."""
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self._changed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def push(self, chunk: str):
+        self.chunks.append(chunk)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def close(self):
+        self.done = True
+        self._changed.set()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+class StreamFlight:
+    """
+    Coalesces identical streams (one event loop): the leader registers a Broadcast
+    with join_or_lead() before doing any work, then run() pumps its generator into
+    it on a background task, so the upstream call finishes even if the leader's
+    client disconnects. Followers subscribe to the same Broadcast.
+    """
+    def __init__(self):
+        self._live: Dict[Hashable, Broadcast] = {}
+
+    def join_or_lead(self, key: Hashable) -> Tuple[Broadcast, bool]:
+        """Returns (broadcast, shared); when shared is False the caller must run() or abort()."""
+        b = self._live.get(key)
+        if b is not None:
+            return b, True
+        b = self._live[key] = Broadcast()
+        return b, False
+
+    def run(self, key: Hashable, b: Broadcast, source: AsyncIterator[str]):
+        async def pump():
+            try:
+                async for chunk in source:
+                    b.push(chunk)
+            finally:
+                self.abort(key, b)
+        b.task = asyncio.create_task(pump())
+
+    def abort(self, key: Hashable, b: Broadcast, *final: str):
+        for chunk in final:
+            b.push(chunk)
+        b.close()
+        if self._live.get(key) is b:
+            del self._live[key]
+
+    def __len__(self):
+        return len(self._live)
@@ -0,0 +1,122 @@
+"""
+Async access to the upstream services, each behind its own concurrency limit and timeout.
+
+  OPENAI_MAX_CONNECTIONS / OPENAI_MAX_KEEPALIVE   httpx pool of the shared AsyncOpenAI client
+  EMBED_CONCURRENCY / EMBED_TIMEOUT               query embeddings
+  MILVUS_CONCURRENCY / MILVUS_TIMEOUT             vector search (AsyncMilvusClient, else ORM calls on a thread pool)
+  LLM_CONCURRENCY / LLM_TIMEOUT                   generation (non-streaming; streams use the httpx read timeout)
+
+LLM_TIMEOUT defaults to the time a full LLM_MAX_OUTPUT_TOKENS answer takes at
+LLM_MIN_TOKENS_PER_SECOND, plus a minute, so a long answer is not cut off by the deadline.
+"""
+import os, math, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+import httpx
+from openai import AsyncOpenAI
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "40"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "120"))
+
+class UpstreamTimeout(Exception):
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name} did not answer within {timeout:g}s")
+        self.name = name
+        self.timeout = timeout
+
+class Upstream:
+    """A named semaphore + deadline. Waiting for a slot counts against the deadline."""
+    def __init__(self, name: str, concurrency: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(concurrency)
+        self.inflight = 0
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], timeout: float | None = None):
+        timeout = self.timeout if timeout is None else timeout
+        async def run():
+            async with self._sem:
+                self.inflight += 1
+                try:
+                    return await fn()
+                finally:
+                    self.inflight -= 1
+        try:
+            return await asyncio.wait_for(run(), timeout)
+        except asyncio.TimeoutError:
+            raise UpstreamTimeout(self.name, timeout) from None
+
+    def stats(self):
+        return {"concurrency": self.concurrency, "timeout": self.timeout, "inflight": self.inflight}
+
+EMBED = Upstream("embeddings", int(os.getenv("EMBED_CONCURRENCY", "32")), float(os.getenv("EMBED_TIMEOUT", "10")))
+MILVUS = Upstream("milvus", int(os.getenv("MILVUS_CONCURRENCY", "16")), float(os.getenv("MILVUS_TIMEOUT", "10")))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "32000"))
+LLM_MIN_TOKENS_PER_SECOND = float(os.getenv("LLM_MIN_TOKENS_PER_SECOND", "50"))
+LLM = Upstream("llm", int(os.getenv("LLM_CONCURRENCY", "50")),
+               float(os.getenv("LLM_TIMEOUT", str(math.ceil(LLM_MAX_OUTPUT_TOKENS / LLM_MIN_TOKENS_PER_SECOND) + 60))))
+
+def make_async_openai() -> AsyncOpenAI:
+    """AsyncOpenAI on a pool sized for the per-machine request limit, instead of httpx's default 100/20."""
+    return AsyncOpenAI(http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    ))
+
+# Blocking pymilvus ORM calls (fallback, hybrid search) run here, not on Starlette's shared threadpool
+MILVUS_EXECUTOR = ThreadPoolExecutor(max_workers=MILVUS.concurrency, thread_name_prefix="milvus")
+
+async def run_blocking(fn: Callable[[], Any], executor: ThreadPoolExecutor = MILVUS_EXECUTOR):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn)
+
+class AsyncMilvus:
+    """
+    pymilvus AsyncMilvusClient, created on first use inside the event loop. When it
+    is unavailable (or MILVUS_ASYNC=0) search() runs Collection.search on MILVUS_EXECUTOR.
+    """
+    def __init__(self, uri: str | None, token: str | None, collection: str, col=None):
+        self.uri, self.token, self.collection, self.col = uri, token, collection, col
+        self._client = None
+        self.enabled = os.getenv("MILVUS_ASYNC", "1") == "1"
+        try:
+            from pymilvus import AsyncMilvusClient  # noqa: F401
+        except ImportError:
+            self.enabled = False
+
+    def _get(self):
+        if self._client is None:
+            from pymilvus import AsyncMilvusClient
+            self._client = AsyncMilvusClient(uri=self.uri, token=self.token or "")
+        return self._client
+
+    async def search(self, data, anns_field: str, param: dict, limit: int, output_fields, expr: str | None = None,
+                     expr_params: dict | None = None):
+        if self.enabled:
+            return await MILVUS.call(lambda: self._get().search(
+                collection_name=self.collection, data=data, anns_field=anns_field, search_params=param,
+                limit=limit, output_fields=output_fields, filter=expr or "", filter_params=expr_params or {},
+            ))
+        return await MILVUS.call(lambda: run_blocking(lambda: self.col.search(
+            data=data, anns_field=anns_field, param=param, limit=limit, output_fields=output_fields, expr=expr,
+            expr_params=expr_params,
+        )))
+
+    async def vectors(self, ids, field: str = "text_dense") -> dict:
+        """Stored vectors by primary key: {id: vector} for the ids that exist."""
+        if not ids:
+            return {}
+        if self.enabled:
+            rows = await MILVUS.call(lambda: self._get().query(
+                collection_name=self.collection, ids=list(ids), output_fields=["id", field]))
+        else:
+            rows = await MILVUS.call(lambda: run_blocking(lambda: self.col.query(
+                expr="id in {ids}", expr_params={"ids": list(ids)}, output_fields=["id", field])))
+        return {r["id"]: r[field] for r in rows}
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
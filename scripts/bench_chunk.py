@@ -0,0 +1,169 @@
+"""
+Timing + equivalence check for scripts/chunk_brl.py on the full manifest set.
+Runs the previous (quadratic) chunker, frozen below, and the current one over
+every data/normalized/*.html and fails if any JSONL output differs by a byte.
+
+  python3 scripts/bench_chunk.py [--jobs N]
+"""
+import sys, json, time, tempfile, argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from chunk_brl import MANIFESTS, NORM, ntoks, sha256, CHILD_MIN, CHILD_MAX, PARENT_MIN, PARENT_MAX, chunk_work
+from bs4 import BeautifulSoup
+
+# ---- previous implementation (reference output) ----
+def legacy_extract_blocks(html_path: Path):
+    html = html_path.read_text(encoding="utf-8")
+    soup = BeautifulSoup(html, "lxml")
+    for tag in soup.find_all(["header","nav","footer","script","style"]):
+        tag.decompose()
+    main = soup.find("main") or soup.body
+    blocks=[]
+    for el in main.find_all(["h1","h2","h3","h4","h5","h6","p","blockquote","li"], recursive=True):
+        txt=el.get_text(" ", strip=True)
+        if not txt: continue
+        el_id=el.get("id") or ""
+        base = soup.find("link", rel="canonical")
+        base_href = base["href"] if base and base.has_attr("href") else ""
+        src=f"{base_href}#{el_id}" if el_id and base_href else base_href or ""
+        blocks.append((el.name.upper(), el_id, txt, src))
+    return blocks
+
+def legacy_group_children(blocks, work_id, author, title):
+    children=[]
+    buf_text, buf_ids, buf_sources=[],[],[]
+    for kind, el_id, txt, src in blocks:
+        if kind.startswith("H"):
+            if buf_text and ntoks(" ".join(buf_text))>=CHILD_MIN:
+                child_text="\n".join(buf_text)
+                paragraph_id=next((i for i in buf_ids if i), "")
+                source_url=next((s for s in buf_sources if s), "")
+                children.append({
+                    "id": f"{work_id}-c{len(children)+1:05d}",
+                    "parent_id": "",
+                    "work_id": work_id,
+                    "author": author,
+                    "work_title": title,
+                    "section_id": "",
+                    "paragraph_id": paragraph_id,
+                    "text": child_text,
+                    "source_url": source_url,
+                    "lang": "en",
+                    "hash": sha256(child_text)
+                })
+                buf_text,buf_ids,buf_sources=[],[],[]
+            if ntoks(txt)<=40:
+                buf_text.append(txt); buf_ids.append(el_id); buf_sources.append(src)
+            continue
+        buf_text.append(txt); buf_ids.append(el_id); buf_sources.append(src)
+        toks=ntoks(" ".join(buf_text))
+        if CHILD_MIN<=toks<=CHILD_MAX or toks>CHILD_MAX+80:
+            child_text="\n".join(buf_text)
+            paragraph_id=next((i for i in buf_ids if i), "")
+            source_url=next((s for s in buf_sources if s), "")
+            children.append({
+                "id": f"{work_id}-c{len(children)+1:05d}",
+                "parent_id": "",
+                "work_id": work_id,
+                "author": author,
+                "work_title": title,
+                "section_id": "",
+                "paragraph_id": paragraph_id,
+                "text": child_text,
+                "source_url": source_url,
+                "lang": "en",
+                "hash": sha256(child_text)
+            })
+            buf_text,buf_ids,buf_sources=[],[],[]
+    if buf_text:
+        child_text="\n".join(buf_text)
+        paragraph_id=next((i for i in buf_ids if i), "")
+        source_url=next((s for s in buf_sources if s), "")
+        children.append({
+            "id": f"{work_id}-c{len(children)+1:05d}",
+            "parent_id": "",
+            "work_id": work_id,
+            "author": author,
+            "work_title": title,
+            "section_id": "",
+            "paragraph_id": paragraph_id,
+            "text": child_text,
+            "source_url": source_url,
+            "lang": "en",
+            "hash": sha256(child_text)
+        })
+    return children
+
+def legacy_group_parents(children, work_id):
+    parents=[]
+    cur=[]
+    for ch in children:
+        cur.append(ch)
+        toks=ntoks(" ".join(x["text"] for x in cur))
+        if PARENT_MIN<=toks<=PARENT_MAX or toks>PARENT_MAX+120:
+            parents.append(cur); cur=[]
+    if cur: parents.append(cur)
+    out_parents=[]
+    for i, group in enumerate(parents,1):
+        pid=f"{work_id}-p{i:04d}"
+        for ch in group: ch["parent_id"]=pid
+        parent_text="\n\n".join(x["text"] for x in group)
+        out_parents.append({
+            "id": pid,
+            "work_id": work_id,
+            "text": parent_text,
+            "hash": sha256(parent_text)
+        })
+    return out_parents, children
+
+def legacy_chunk_work(mpath: Path, out: Path):
+    m=json.loads(mpath.read_text(encoding="utf-8"))
+    work_id=m["work_id"]; author=m["author"]; title=m["work_title"]
+    html_path=NORM/f"{work_id}.html"
+    if not html_path.exists(): return None
+    blocks=legacy_extract_blocks(html_path)
+    children=legacy_group_children(blocks,work_id,author,title)
+    parents,children=legacy_group_parents(children,work_id)
+    with (out/f"{work_id}_children.jsonl").open("w",encoding="utf-8") as fo:
+        for r in children: fo.write(json.dumps(r,ensure_ascii=False)+"\n")
+    with (out/f"{work_id}_parents.jsonl").open("w",encoding="utf-8") as fo:
+        for r in parents: fo.write(json.dumps(r,ensure_ascii=False)+"\n")
+    return work_id
+
+def _new(args):
+    mpath, out = args
+    return chunk_work(mpath, NORM, out)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=4)
+    args = ap.parse_args()
+    mpaths = sorted(MANIFESTS.glob("*.json"))
+    with tempfile.TemporaryDirectory() as d:
+        old, new_serial, new_par = Path(d)/"old", Path(d)/"serial", Path(d)/"parallel"
+        for p in (old, new_serial, new_par): p.mkdir()
+
+        t = time.time(); done = [w for w in (legacy_chunk_work(m, old) for m in mpaths) if w]; t_old = time.time() - t
+        t = time.time(); [chunk_work(m, NORM, new_serial) for m in mpaths]; t_serial = time.time() - t
+        t = time.time()
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            list(ex.map(_new, [(m, new_par) for m in mpaths]))
+        t_par = time.time() - t
+
+        diffs = []
+        for f in sorted(old.glob("*.jsonl")):
+            ref = f.read_bytes()
+            for other in (new_serial, new_par):
+                if (other/f.name).read_bytes() != ref: diffs.append(f"{other.name}/{f.name}")
+        print(f"works: {len(done)}")
+        print(f"previous chunker (serial): {t_old:.2f}s")
+        print(f"current chunker  (serial): {t_serial:.2f}s")
+        print(f"current chunker  ({args.jobs} jobs): {t_par:.2f}s")
+        if diffs:
+            print("[FAIL] outputs differ: " + ", ".join(diffs)); sys.exit(1)
+        print("[OK] outputs are byte-identical")
+
+if __name__=="__main__":
+    main()
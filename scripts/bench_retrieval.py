@@ -0,0 +1,320 @@
+"""
+Offline retrieval + latency benchmark over the real /search and /answer routes.
+
+Stand-ins (no network):
+  - embeddings: recorded fixture eval/fixtures/query_embeddings.jsonl (--record fills it once from OpenAI)
+  - vector search: RETRIEVAL_BACKEND=local (data/index) by default; --backend zilliz with
+    ZILLIZ_URI=./bench.db runs against milvus-lite instead
+  - LLM: a stub that returns a fixed answer after --llm-latency-ms
+
+Reports hit@5/10 + MRR, p50/p95/p99 per endpoint and per stage, and throughput at
+several concurrency levels. --baseline fails (exit 1) on quality or latency regressions.
+
+Prerequisites (one-time, need credentials; the index, fixture and baseline are not committed):
+  python3 scripts/build_local_index.py                         # data/index, from Zilliz (or --reembed, OpenAI)
+  python3 scripts/bench_retrieval.py --record                  # eval/fixtures, needs OPENAI_API_KEY
+  python3 scripts/bench_retrieval.py --save-baseline eval/bench_baseline.json
+
+Then, offline:
+  python3 scripts/bench_retrieval.py --synthetic 200 --concurrency 1,8,32
+  python3 scripts/bench_retrieval.py --baseline eval/bench_baseline.json
+"""
+import os, sys, csv, json, time, random, asyncio, argparse, threading, statistics, types
+from pathlib import Path
+from typing import Dict, List
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+GOLDEN = ROOT / "eval" / "golden_set.csv"
+FIXTURE = ROOT / "eval" / "fixtures" / "query_embeddings.jsonl"
+REPORT = ROOT / "eval" / "bench_report.json"
+
+STAGES: Dict[str, List[float]] = {}
+_STAGE_LOCK = threading.Lock()
+
+def record_stage(name: str, ms: float):
+    with _STAGE_LOCK:
+        STAGES.setdefault(name, []).append(ms)
+
+def hook_stage_metrics():
+    """Keep raw samples of the app's own stage spans (api/metrics.py) for percentiles."""
+    from api import metrics
+    observe = metrics.STAGE_SECONDS.observe
+    def observe_and_record(value, **labels):
+        record_stage(labels.get("stage", "?"), value * 1000)
+        observe(value, **labels)
+    metrics.STAGE_SECONDS.observe = observe_and_record
+
+def pct(xs: List[float], p: float) -> float:
+    if not xs: return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, max(0, int(round(p / 100.0 * (len(xs) - 1)))))]
+
+def summarize(xs: List[float]) -> Dict[str, float]:
+    return {"n": len(xs), "p50": pct(xs, 50), "p95": pct(xs, 95), "p99": pct(xs, 99),
+            "mean": statistics.mean(xs) if xs else 0.0}
+
+# ---- stand-ins ----
+
+class FixtureEmbeddings:
+    def __init__(self, vectors: Dict[str, List[float]]):
+        self.vectors = vectors
+    def create(self, model, input, **kw):
+        from api.embed_cache import normalize_query
+        data = []
+        for text in input:
+            vec = self.vectors.get(normalize_query(text))
+            if vec is None:
+                raise KeyError(f"no recorded embedding for {text!r}; run with --record")
+            if kw.get("dimensions"):  # what the API returns for `dimensions`: truncated, re-normalized
+                from api.embedding_profile import reduce_dims
+                vec = reduce_dims(vec, kw["dimensions"]).tolist()
+            data.append(types.SimpleNamespace(embedding=vec))
+        return types.SimpleNamespace(data=data)
+
+class AsyncFixtureEmbeddings(FixtureEmbeddings):
+    async def create(self, model, input, **kw):
+        return FixtureEmbeddings.create(self, model, input, **kw)
+
+class StubResponses:
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+    def create(self, **kw):
+        time.sleep(self.latency_ms / 1000.0)
+        return types.SimpleNamespace(output_text="(stub answer)", usage=types.SimpleNamespace(input_tokens=0, output_tokens=0))
+
+class AsyncStubResponses(StubResponses):
+    async def create(self, **kw):
+        import asyncio
+        await asyncio.sleep(self.latency_ms / 1000.0)
+        return types.SimpleNamespace(output_text="(stub answer)", usage=types.SimpleNamespace(input_tokens=0, output_tokens=0))
+
+def load_fixture(path: Path = FIXTURE) -> Dict[str, List[float]]:
+    from api.embed_cache import normalize_query
+    out = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                r = json.loads(line)
+                out[normalize_query(r["query"])] = r["embedding"]
+    return out
+
+def record_fixture(queries: List[str], model: str, path: Path = FIXTURE):
+    from openai import OpenAI
+    from api.embed_cache import normalize_query
+    have = load_fixture(path)
+    todo = list(dict.fromkeys(q for q in queries if normalize_query(q) not in have))
+    if not todo:
+        print("fixture up to date"); return
+    client = OpenAI()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as fo:
+        for s in range(0, len(todo), 64):
+            chunk = todo[s:s+64]
+            for q, d in zip(chunk, client.embeddings.create(model=model, input=chunk).data):
+                fo.write(json.dumps({"model": model, "query": q, "embedding": d.embedding}) + "\n")
+    print(f"recorded {len(todo)} embeddings -> {path}")
+
+def synthetic_queries(A, n: int, seed: int = 0):
+    """Queries cut from random children; their embedding is the child's own stored vector."""
+    import numpy as np
+    idx = A.LOCAL_INDEX
+    rng = random.Random(seed)
+    out = []
+    for row in rng.sample(range(len(idx.ids)), min(n, len(idx.ids))):
+        doc = idx.row_to_doc[row]
+        if doc < 0: continue
+        rec = idx.corpus.children[doc]
+        words = rec["text"].split()
+        start = rng.randrange(max(1, len(words) - 12))
+        q = " ".join(words[start:start + 12])
+        out.append({"question": q, "expected": rec["work_id"], "golden": False, "vector": np.asarray(idx.X[row], dtype=np.float32).tolist()})
+    return out
+
+def request_body(q: Dict, k: int) -> Dict:
+    """Synthetic queries are unquoted 12-word statements, which looks_like_quote() sends to the
+    phrase index; `quote: false` keeps them measuring dense + BM25 retrieval."""
+    body = {"query": q["question"], "k": k}
+    if not q["golden"]:
+        body["quote"] = False
+    return body
+
+# ---- metrics ----
+
+def quality(results: List[Dict], expected: str) -> Dict[str, float]:
+    exp = {x.strip() for x in expected.split("|")}
+    rank = next((i for i, r in enumerate(results, start=1) if r["work_id"] in exp), None)
+    return {
+        "hit@5": 1.0 if rank and rank <= 5 else 0.0,
+        "hit@10": 1.0 if rank and rank <= 10 else 0.0,
+        "mrr@5": 1.0 / rank if rank and rank <= 5 else 0.0,
+        "mrr@10": 1.0 / rank if rank and rank <= 10 else 0.0,
+    }
+
+def asgi_client(app) -> httpx.AsyncClient:
+    """In-process client on the caller's event loop: the app's singleflight, admission and
+    upstream primitives are module-global and bound to one loop, so every request must share it."""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+async def run_load(client: httpx.AsyncClient, path: str, bodies: List[Dict], concurrency: int) -> Dict[str, float]:
+    """Latency percentiles and throughput over the 200 responses only; anything else counts as an error."""
+    lat: List[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(body):
+        nonlocal errors
+        async with sem:
+            t = time.perf_counter()
+            r = await client.post(path, json=body)
+            if r.status_code == 200:
+                lat.append((time.perf_counter() - t) * 1000)
+            else:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(b) for b in bodies])
+    wall = time.perf_counter() - t0
+    return dict(summarize(lat), concurrency=concurrency, throughput_rps=len(lat) / wall, errors=errors)
+
+def compare(report: Dict, baseline: Dict, max_quality_drop: float, max_latency_regression: float) -> List[str]:
+    problems = []
+    for key in ("hit@5", "hit@10", "mrr@5", "mrr@10"):
+        old, new = baseline["quality"].get(key, 0.0), report["quality"].get(key, 0.0)
+        if new < old - max_quality_drop:
+            problems.append(f"{key} {old:.3f} -> {new:.3f}")
+    for ep in ("search", "answer"):
+        old_l = {r["concurrency"]: r for r in baseline.get("load", {}).get(ep, [])}
+        for r in report.get("load", {}).get(ep, []):
+            if r.get("errors"):  # failed requests are fast: they would otherwise pass as a speed-up
+                problems.append(f"/{ep} @c={r['concurrency']}: {r['errors']} non-200 responses")
+            b = old_l.get(r["concurrency"])
+            if b and b["p95"] > 0 and r["p95"] > b["p95"] * (1 + max_latency_regression):
+                problems.append(f"/{ep} p95 @c={r['concurrency']} {b['p95']:.1f}ms -> {r['p95']:.1f}ms")
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["local", "zilliz"], default="local")
+    ap.add_argument("--fixture", default=str(FIXTURE))
+    ap.add_argument("--record", action="store_true", help="embed missing golden queries with OpenAI into the fixture")
+    ap.add_argument("--synthetic", type=int, default=0, help="extra queries sampled from the corpus (local backend)")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--concurrency", default="1,4,16")
+    ap.add_argument("--answers", type=int, default=20, help="/answer requests per concurrency level")
+    ap.add_argument("--llm-latency-ms", type=float, default=50.0)
+    ap.add_argument("--cache", action="store_true", help="keep the embedding/answer caches on")
+    ap.add_argument("--out", default=str(REPORT))
+    ap.add_argument("--baseline", help="fail on regressions against this report")
+    ap.add_argument("--save-baseline", help="also write the report here")
+    ap.add_argument("--max-quality-drop", type=float, default=0.02)
+    ap.add_argument("--max-latency-regression", type=float, default=0.25)
+    args = ap.parse_args()
+
+    golden = list(csv.DictReader(open(GOLDEN, newline="", encoding="utf-8")))
+    model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+    if args.record:
+        record_fixture([r["question"] for r in golden], model, Path(args.fixture))
+        return
+
+    os.chdir(ROOT)
+    if args.backend == "local":
+        from api.local_index import INDEX_DIR, VECTORS_FILE
+        if not os.path.exists(os.path.join(INDEX_DIR, VECTORS_FILE)):
+            sys.exit(f"no local index in {INDEX_DIR}; build it once with scripts/build_local_index.py "
+                     "(pulls vectors from Zilliz, or --reembed with OpenAI)")
+    if not Path(args.fixture).exists():
+        sys.exit(f"no recorded query embeddings at {args.fixture}; record them once with --record (needs OPENAI_API_KEY)")
+    os.environ["RETRIEVAL_BACKEND"] = args.backend
+    os.environ.setdefault("OPENAI_API_KEY", "bench-offline")
+    os.environ.setdefault("PROMPT_ID", "bench")
+    os.environ["ADMISSION"] = "0"  # the pools are sized for one fly machine; --concurrency would just measure 429s
+    if not args.cache:
+        os.environ.update(EMBED_CACHE_SIZE="0", EMBED_CACHE_PATH="", ANSWER_CACHE_SIZE="0")
+    t_import = time.perf_counter()
+    import api.app as A
+    import_ms = (time.perf_counter() - t_import) * 1000
+    t_load = time.perf_counter()
+    A.STARTUP.load_all()  # index, BM25, TF-IDF, parents (normally the lifespan hook / first request)
+    load_ms = (time.perf_counter() - t_load) * 1000
+
+    from api.embed_cache import normalize_query
+    vectors = load_fixture(Path(args.fixture))
+    queries = [{"question": r["question"], "expected": r["expected_work_id"], "golden": True} for r in golden]
+    if args.synthetic:
+        if A.LOCAL_INDEX is None:
+            sys.exit("--synthetic needs --backend local")
+        for q in synthetic_queries(A, args.synthetic):
+            vectors[normalize_query(q["question"])] = q.pop("vector")
+            queries.append(q)
+    missing = [q["question"] for q in queries if normalize_query(q["question"]) not in vectors]
+    if missing:
+        sys.exit(f"{len(missing)} queries have no recorded embedding (first: {missing[0]!r}); run with --record")
+
+    A.client = types.SimpleNamespace(embeddings=FixtureEmbeddings(vectors), responses=StubResponses(args.llm_latency_ms))
+    A.aclient = types.SimpleNamespace(embeddings=AsyncFixtureEmbeddings(vectors), responses=AsyncStubResponses(args.llm_latency_ms))
+    hook_stage_metrics()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    search_bodies = [request_body(q, args.k) for q in queries]
+    answer_qs = (queries * (args.answers // max(1, len(queries)) + 1))[:args.answers]
+    answer_bodies = [request_body(q, 6) for q in answer_qs]
+
+    async def drive():
+        """Quality pass (+ per-query /search latency, serial), then each load level, on one loop."""
+        scores, modes, load = [], {}, {"search": [], "answer": []}
+        async with asgi_client(A.app) as client:
+            for q, body in zip(queries, search_bodies):
+                r = (await client.post("/search", json=body)).json()
+                modes[r["used_mode"]] = modes.get(r["used_mode"], 0) + 1
+                scores.append(dict(quality(r["results"], q["expected"]), golden=q["golden"]))
+            for c in levels:
+                load["search"].append(await run_load(client, "/search", search_bodies, c))
+                load["answer"].append(await run_load(client, "/answer", answer_bodies, c))
+        return scores, modes, load
+
+    STAGES.clear()
+    scores, modes, load = asyncio.run(drive())
+    def mean(key, rows): return statistics.mean(s[key] for s in rows) if rows else 0.0
+    gold_rows = [s for s in scores if s["golden"]]
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "backend": args.backend,
+        "embedding": A.EMBED_PROFILE.to_dict(),
+        "import_ms": import_ms,
+        "load_ms": load_ms,
+        "n_queries": len(queries),
+        "used_modes": modes,
+        "quality": {k: mean(k, gold_rows) for k in ("hit@5", "hit@10", "mrr@5", "mrr@10")},
+        "quality_synthetic": {k: mean(k, [s for s in scores if not s["golden"]]) for k in ("hit@5", "hit@10", "mrr@5", "mrr@10")},
+        "stages": {k: summarize(v) for k, v in STAGES.items()},
+        "load": load,
+    }
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"quality (golden, n={len(gold_rows)}): " + "  ".join(f"{k} {v:.3f}" for k, v in report["quality"].items()))
+    if args.synthetic:
+        print("quality (synthetic):        " + "  ".join(f"{k} {v:.3f}" for k, v in report["quality_synthetic"].items()))
+    print(f"modes: {modes}   import: {import_ms:.0f} ms   load: {load_ms:.0f} ms")
+    for k, v in report["stages"].items():
+        print(f"stage {k:<13} p50 {v['p50']:8.2f}  p95 {v['p95']:8.2f}  p99 {v['p99']:8.2f} ms  (n={v['n']})")
+    for ep, rows in report["load"].items():
+        for r in rows:
+            print(f"/{ep:<7} c={r['concurrency']:<3} p50 {r['p50']:8.1f}  p95 {r['p95']:8.1f}  p99 {r['p99']:8.1f} ms  "
+                  f"{r['throughput_rps']:7.1f} req/s  errors {r['errors']}")
+
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+                           args.max_quality_drop, args.max_latency_regression)
+        if problems:
+            print("[FAIL] regressions vs baseline: " + "; ".join(problems))
+            sys.exit(1)
+        print("[OK] no regressions vs baseline")
+
+if __name__=="__main__":
+    main()
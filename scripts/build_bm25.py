@@ -0,0 +1,25 @@
+"""
+Prebuild the client-side BM25 index (data/index/bm25.pkl) so API workers load it
+instead of tokenizing data/exports at startup.
+
+  python3 scripts/build_bm25.py
+"""
+import sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from api.corpus import Corpus
+from api.bm25 import BM25Index
+
+def main():
+    t0 = time.time()
+    corpus = Corpus(str(ROOT / "data" / "exports"))
+    idx = BM25Index.build(corpus)
+    out = ROOT / "data" / "index" / "bm25.pkl"
+    idx.save(str(out))
+    print(f"Done. {len(corpus)} docs, {len(idx.vocab)} terms -> {out} ({time.time()-t0:.1f}s)")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Build data/index/child_vectors.npy + child_ids.txt for RETRIEVAL_BACKEND=local.
+
+  python3 scripts/build_local_index.py                 # pull text_dense from Zilliz (no embedding cost)
+  python3 scripts/build_local_index.py --reembed       # embed data/exports children with OpenAI instead
+  python3 scripts/build_local_index.py --dtype float16 # half the size; slower per query (cast per block)
+  python3 scripts/build_local_index.py --dimensions 1024 --quant int8   # reduced profile + coarse codes
+
+--dimensions truncates the stored vectors (Matryoshka) and re-normalizes; --quant also writes
+int8 / binary codes for the two-stage search (EMBED_QUANT). Defaults come from the
+embedding profile (api/embedding_profile.py).
+"""
+import os, sys, json, glob, argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+from tenacity import retry, wait_exponential, stop_after_attempt
+
+ROOT = Path(__file__).resolve().parents[1]
+EXPORTS = ROOT / "data" / "exports"
+INDEX = ROOT / "data" / "index"
+sys.path.insert(0, str(ROOT))
+from api.embedding_profile import EmbeddingProfile, reduce_dims, quantize_int8, quantize_binary
+from api.local_index import VECTORS_FILE, IDS_FILE, INT8_FILE, INT8_SCALE_FILE, BINARY_FILE
+
+load_dotenv()
+PROFILE = EmbeddingProfile.from_env()
+
+def load_children() -> List[Dict]:
+    out=[]
+    for path in sorted(glob.glob(str(EXPORTS / "*_children.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip(): out.append(json.loads(line))
+    return out
+
+def vectors_from_zilliz(ids: set) -> Dict[str, List[float]]:
+    from pymilvus import connections, Collection
+    uri, token = os.getenv("ZILLIZ_URI"), os.getenv("ZILLIZ_TOKEN")
+    assert uri and token, "Missing ZILLIZ_URI or ZILLIZ_TOKEN (or use --reembed)"
+    connections.connect(alias="default", uri=uri, token=token, timeout=30)
+    col = Collection("brl_chunks"); col.load()
+    it = col.query_iterator(batch_size=1000, expr="", output_fields=["id", "text_dense"])
+    vecs={}
+    while True:
+        batch = it.next()
+        if not batch: break
+        for r in batch:
+            if r["id"] in ids: vecs[r["id"]] = r["text_dense"]
+        print(f"   pulled {len(vecs)} vectors")
+    it.close()
+    return vecs
+
+def vectors_from_openai(children: List[Dict], dimensions: int | None) -> Dict[str, List[float]]:
+    from openai import OpenAI
+    client = OpenAI()
+
+    @retry(wait=wait_exponential(min=1, max=20), stop=stop_after_attempt(6))
+    def embed_texts(texts):
+        kw = {"dimensions": dimensions} if dimensions else {}
+        return [e.embedding for e in client.embeddings.create(model=PROFILE.model, input=texts, **kw).data]
+
+    vecs={}
+    for s in range(0, len(children), 64):
+        chunk = children[s:s+64]
+        for r, e in zip(chunk, embed_texts([r["text"] for r in chunk])):
+            vecs[r["id"]] = e
+        print(f"   embedded {len(vecs)}/{len(children)}")
+    return vecs
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reembed", action="store_true", help="embed exports with OpenAI instead of reading Zilliz")
+    ap.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    ap.add_argument("--dimensions", type=int, default=PROFILE.dimensions or 0, help="0 = keep the source size")
+    ap.add_argument("--quant", choices=["none", "int8", "binary"], default=PROFILE.quant)
+    ap.add_argument("--out", default=str(INDEX))
+    args = ap.parse_args()
+
+    children = load_children()
+    print(f"==> {len(children)} children in exports")
+    dims = args.dimensions or None
+    vecs = vectors_from_openai(children, dims) if args.reembed else vectors_from_zilliz({r["id"] for r in children})
+
+    ids = [r["id"] for r in children if r["id"] in vecs]
+    missing = len(children) - len(ids)
+    if missing:
+        print(f"[WARN] {missing} children have no vector and are left out of the index", file=sys.stderr)
+    X = reduce_dims(np.asarray([vecs[i] for i in ids], dtype=np.float32), dims)
+
+    out = Path(args.out); out.mkdir(parents=True, exist_ok=True)
+    np.save(out / VECTORS_FILE, X.astype(args.dtype))
+    (out / IDS_FILE).write_text("\n".join(ids) + "\n", encoding="utf-8")
+    for stale in (INT8_FILE, INT8_SCALE_FILE, BINARY_FILE):
+        (out / stale).unlink(missing_ok=True)
+    if args.quant == "int8":
+        codes, scale = quantize_int8(X)
+        np.save(out / INT8_FILE, codes); np.save(out / INT8_SCALE_FILE, scale)
+    elif args.quant == "binary":
+        np.save(out / BINARY_FILE, quantize_binary(X))
+    print(f"Done. {X.shape[0]} x {X.shape[1]} {args.dtype} (+{args.quant} codes) -> {out}")
+
+if __name__=="__main__":
+    main()
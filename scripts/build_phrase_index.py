@@ -0,0 +1,31 @@
+"""
+Prebuild the phrase index for the /search exact-quote fast path (data/index/phrases.pkl),
+so API workers load it instead of sorting the corpus' suffixes at startup.
+
+  python3 scripts/build_phrase_index.py
+  python3 scripts/build_phrase_index.py --depth 64   # resolve suffix order deeper (longer exact lookups)
+"""
+import sys, time, argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from api.corpus import Corpus
+from api.phrase_index import PhraseIndex, PHRASE_DEPTH
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--depth", type=int, default=PHRASE_DEPTH)
+    args = ap.parse_args()
+    t0 = time.time()
+    corpus = Corpus(str(ROOT / "data" / "exports"))
+    idx = PhraseIndex.build(corpus, depth=args.depth)
+    out = ROOT / "data" / "index" / "phrases.pkl"
+    idx.save(str(out))
+    st = idx.stats()
+    print(f"Done. {st['children']} docs, {st['tokens']} tokens, {st['vocab']} terms, "
+          f"{st['bytes'] / 2**20:.1f} MB -> {out} ({time.time()-t0:.1f}s)")
+
+if __name__=="__main__":
+    main()
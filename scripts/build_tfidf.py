@@ -0,0 +1,41 @@
+"""
+Fit the corpus-wide TF-IDF used by /search rerank="tfidf" and save it to
+data/index/tfidf.joblib. Prints per-rerank cost of fit-per-request vs. row slicing.
+
+  python3 scripts/build_tfidf.py
+"""
+import sys, time, random, statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from api.corpus import Corpus
+from api.fusion_generic import CorpusTfidf, tfidf_rerank
+
+QUERIES = [
+    "What is the Most Great Peace?",
+    "Explain the Bahá’í law of fasting.",
+    "Huqúqu’lláh exemptions",
+    "the earth is but one country",
+]
+
+def main():
+    corpus = Corpus(str(ROOT / "data" / "exports"))
+    t0 = time.time()
+    tfidf = CorpusTfidf.build(corpus.children, corpus.fingerprint)
+    out = ROOT / "data" / "index" / "tfidf.joblib"
+    tfidf.save(str(out))
+    print(f"Done. {tfidf.matrix.shape[0]} x {tfidf.matrix.shape[1]} (nnz {tfidf.matrix.nnz}) -> {out} ({time.time()-t0:.1f}s)")
+
+    rng = random.Random(0)
+    fit_ms, slice_ms = [], []
+    for _ in range(20):
+        cand = rng.sample(corpus.children, 100)
+        q = rng.choice(QUERIES)
+        t = time.perf_counter(); tfidf_rerank(q, cand, top_k=100); fit_ms.append((time.perf_counter()-t)*1000)
+        t = time.perf_counter(); tfidf_rerank(q, cand, top_k=100, corpus_tfidf=tfidf); slice_ms.append((time.perf_counter()-t)*1000)
+    print(f"rerank of 100 candidates: fit p50 {statistics.median(fit_ms):.1f} ms | slice p50 {statistics.median(slice_ms):.1f} ms")
+
+if __name__=="__main__":
+    main()
@@ -1,5 +1,6 @@
-import json, hashlib, time
+import os, json, hashlib, time, argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 import tiktoken
 
@@ -17,96 +18,95 @@ PARENT_MIN, PARENT_MAX = 850, 1250
 def ntoks(text): return len(ENC.encode(text))
 def sha256(s): return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+# Token counts are kept incrementally instead of re-encoding the whole buffer.
+# For stripped texts a and b, ntoks(a + " " + b) == ntoks(a) + ntoks(" " + b):
+# cl100k's pre-tokenizer never merges across that space, so each appended piece
+# contributes its own " "-prefixed count.
+class Piece:
+    __slots__ = ("text", "_first", "_cont")
+    def __init__(self, text):
+        self.text = text
+        self._first = None
+        self._cont = None
+    def first(self):
+        if self._first is None: self._first = ntoks(self.text)
+        return self._first
+    def cont(self):
+        if self._cont is None: self._cont = ntoks(" " + self.text)
+        return self._cont
+
 def extract_blocks(html_path: Path):
     html = html_path.read_text(encoding="utf-8")
     soup = BeautifulSoup(html, "lxml")
     for tag in soup.find_all(["header","nav","footer","script","style"]):
         tag.decompose()
     main = soup.find("main") or soup.body
+    base = soup.find("link", rel="canonical")
+    base_href = base["href"] if base and base.has_attr("href") else ""
     blocks=[]
     for el in main.find_all(["h1","h2","h3","h4","h5","h6","p","blockquote","li"], recursive=True):
         txt=el.get_text(" ", strip=True)
         if not txt: continue
         el_id=el.get("id") or ""
-        base = soup.find("link", rel="canonical")
-        base_href = base["href"] if base and base.has_attr("href") else ""
         src=f"{base_href}#{el_id}" if el_id and base_href else base_href or ""
         blocks.append((el.name.upper(), el_id, txt, src))
     return blocks
 
+def make_child(children, buf_text, buf_ids, buf_sources, work_id, author, title):
+    child_text="\n".join(buf_text)
+    paragraph_id=next((i for i in buf_ids if i), "")
+    source_url=next((s for s in buf_sources if s), "")
+    return {
+        "id": f"{work_id}-c{len(children)+1:05d}",
+        "parent_id": "",
+        "work_id": work_id,
+        "author": author,
+        "work_title": title,
+        "section_id": "",
+        "paragraph_id": paragraph_id,
+        "text": child_text,
+        "source_url": source_url,
+        "lang": "en",
+        "hash": sha256(child_text)
+    }
+
 def group_children(blocks, work_id, author, title):
     children=[]
     buf_text, buf_ids, buf_sources=[],[],[]
+    buf_toks=0  # == ntoks(" ".join(buf_text))
     for kind, el_id, txt, src in blocks:
+        piece=Piece(txt)
         if kind.startswith("H"):
-            if buf_text and ntoks(" ".join(buf_text))>=CHILD_MIN:
-                child_text="\n".join(buf_text)
-                paragraph_id=next((i for i in buf_ids if i), "")
-                source_url=next((s for s in buf_sources if s), "")
-                children.append({
-                    "id": f"{work_id}-c{len(children)+1:05d}",
-                    "parent_id": "",
-                    "work_id": work_id,
-                    "author": author,
-                    "work_title": title,
-                    "section_id": "",
-                    "paragraph_id": paragraph_id,
-                    "text": child_text,
-                    "source_url": source_url,
-                    "lang": "en",
-                    "hash": sha256(child_text)
-                })
+            if buf_text and buf_toks>=CHILD_MIN:
+                children.append(make_child(children, buf_text, buf_ids, buf_sources, work_id, author, title))
                 buf_text,buf_ids,buf_sources=[],[],[]
-            if ntoks(txt)<=40:
+                buf_toks=0
+            if piece.first()<=40:
+                buf_toks += piece.cont() if buf_text else piece.first()
                 buf_text.append(txt); buf_ids.append(el_id); buf_sources.append(src)
             continue
+        buf_toks += piece.cont() if buf_text else piece.first()
         buf_text.append(txt); buf_ids.append(el_id); buf_sources.append(src)
-        toks=ntoks(" ".join(buf_text))
+        toks=buf_toks
         if CHILD_MIN<=toks<=CHILD_MAX or toks>CHILD_MAX+80:
-            child_text="\n".join(buf_text)
-            paragraph_id=next((i for i in buf_ids if i), "")
-            source_url=next((s for s in buf_sources if s), "")
-            children.append({
-                "id": f"{work_id}-c{len(children)+1:05d}",
-                "parent_id": "",
-                "work_id": work_id,
-                "author": author,
-                "work_title": title,
-                "section_id": "",
-                "paragraph_id": paragraph_id,
-                "text": child_text,
-                "source_url": source_url,
-                "lang": "en",
-                "hash": sha256(child_text)
-            })
+            children.append(make_child(children, buf_text, buf_ids, buf_sources, work_id, author, title))
             buf_text,buf_ids,buf_sources=[],[],[]
+            buf_toks=0
     if buf_text:
-        child_text="\n".join(buf_text)
-        paragraph_id=next((i for i in buf_ids if i), "")
-        source_url=next((s for s in buf_sources if s), "")
-        children.append({
-            "id": f"{work_id}-c{len(children)+1:05d}",
-            "parent_id": "",
-            "work_id": work_id,
-            "author": author,
-            "work_title": title,
-            "section_id": "",
-            "paragraph_id": paragraph_id,
-            "text": child_text,
-            "source_url": source_url,
-            "lang": "en",
-            "hash": sha256(child_text)
-        })
+        children.append(make_child(children, buf_text, buf_ids, buf_sources, work_id, author, title))
     return children
 
 def group_parents(children, work_id):
     parents=[]
     cur=[]
+    cur_toks=0  # == ntoks(" ".join(x["text"] for x in cur))
     for ch in children:
+        piece=Piece(ch["text"])
+        cur_toks += piece.cont() if cur else piece.first()
         cur.append(ch)
-        toks=ntoks(" ".join(x["text"] for x in cur))
+        toks=cur_toks
         if PARENT_MIN<=toks<=PARENT_MAX or toks>PARENT_MAX+120:
-            parents.append(cur); cur=[]
+            parents.append(cur); cur=[]; cur_toks=0
     if cur: parents.append(cur)
     out_parents=[]
     for i, group in enumerate(parents,1):
@@ -121,25 +121,47 @@ def group_parents(children, work_id):
         })
     return out_parents, children
 
+def write_jsonl_atomic(path: Path, rows):
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w",encoding="utf-8") as fo:
+        for r in rows: fo.write(json.dumps(r,ensure_ascii=False)+"\n")
+    os.replace(tmp, path)
+
+def chunk_work(mpath: Path, norm_dir: Path = NORM, exports_dir: Path = EXPORTS):
+    """Chunk one work; returns its summary row, or None when the normalized HTML is missing."""
+    m=json.loads(mpath.read_text(encoding="utf-8"))
+    work_id=m["work_id"]; author=m["author"]; title=m["work_title"]
+    html_path=norm_dir/f"{work_id}.html"
+    if not html_path.exists():
+        return None
+    blocks=extract_blocks(html_path)
+    children=group_children(blocks,work_id,author,title)
+    parents,children=group_parents(children,work_id)
+    write_jsonl_atomic(exports_dir/f"{work_id}_children.jsonl", children)
+    write_jsonl_atomic(exports_dir/f"{work_id}_parents.jsonl", parents)
+    return {"work_id":work_id,"parents":len(parents),"children":len(children)}
+
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (1 = serial)")
+    args = ap.parse_args()
+
     EXPORTS.mkdir(parents=True, exist_ok=True)
     LOGS.mkdir(parents=True, exist_ok=True)
+    mpaths=sorted(MANIFESTS.glob("*.json"))
+    t0=time.time()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            results=list(ex.map(chunk_work, mpaths))
+    else:
+        results=[chunk_work(p) for p in mpaths]
     summary=[]
-    for mpath in sorted(MANIFESTS.glob("*.json")):
-        m=json.loads(mpath.read_text(encoding="utf-8"))
-        work_id=m["work_id"]; author=m["author"]; title=m["work_title"]
-        html_path=NORM/f"{work_id}.html"
-        if not html_path.exists():
-            print(f"[SKIP] {work_id}: normalized HTML missing"); continue
-        blocks=extract_blocks(html_path)
-        children=group_children(blocks,work_id,author,title)
-        parents,children=group_parents(children,work_id)
-        with (EXPORTS/f"{work_id}_children.jsonl").open("w",encoding="utf-8") as fo:
-            for r in children: fo.write(json.dumps(r,ensure_ascii=False)+"\n")
-        with (EXPORTS/f"{work_id}_parents.jsonl").open("w",encoding="utf-8") as fo:
-            for r in parents: fo.write(json.dumps(r,ensure_ascii=False)+"\n")
-        summary.append({"work_id":work_id,"parents":len(parents),"children":len(children)})
-        print(f"[OK] {work_id}: {len(parents)} parents, {len(children)} children")
+    for mpath, r in zip(mpaths, results):
+        if r is None:
+            print(f"[SKIP] {mpath.stem}: normalized HTML missing"); continue
+        summary.append(r)
+        print(f"[OK] {r['work_id']}: {r['parents']} parents, {r['children']} children")
+    print(f"Done. {len(summary)} works in {time.time()-t0:.1f}s ({args.jobs} jobs)")
     ts=time.strftime("%Y%m%d-%H%M%S")
     (LOGS/f"phase5_chunk_{ts}.json").write_text(json.dumps(summary,indent=2),encoding="utf-8")
 
@@ -0,0 +1,142 @@
+"""
+Pipelined bulk embedding for ingestion (used by embed_upsert.py).
+
+- batches are packed by tiktoken count (per-request token budget + max inputs)
+- several embedding requests stay in flight, gated by a shared TPM/RPM limiter
+  that pauses every worker after a 429
+- Milvus writes run on their own thread, overlapping the next embeddings
+- on_batch_done is called after each write, which is where callers checkpoint
+"""
+import time, queue, random, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List
+
+import tiktoken
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+ENC = tiktoken.get_encoding("cl100k_base")  # tokenizer of the text-embedding-3 models
+MAX_INPUT_TOKENS = 8191
+
+def ntoks(text: str) -> int:
+    return len(ENC.encode(text, disallowed_special=()))
+
+def pack_batches(records: Iterable[Dict], max_tokens: int = 60_000, max_inputs: int = 512) -> List[List[Dict]]:
+    """
+    Greedy packing in input order; each record gets an `_ntoks` count. Text over
+    MAX_INPUT_TOKENS is truncated into `_embed_text` only, so `text` is stored whole.
+    """
+    batches, cur, cur_toks = [], [], 0
+    for r in records:
+        n = ntoks(r["text"])
+        if n > MAX_INPUT_TOKENS:
+            r["_embed_text"] = ENC.decode(ENC.encode(r["text"], disallowed_special=())[:MAX_INPUT_TOKENS])
+            n = MAX_INPUT_TOKENS
+            print(f"[WARN] {r['id']}: truncated to {MAX_INPUT_TOKENS} tokens for embedding (stored text is complete)")
+        r["_ntoks"] = n
+        if cur and (cur_toks + n > max_tokens or len(cur) >= max_inputs):
+            batches.append(cur); cur, cur_toks = [], 0
+        cur.append(r); cur_toks += n
+    if cur: batches.append(cur)
+    return batches
+
+class RateLimiter:
+    """Token bucket over tokens/min and requests/min, plus a shared pause after 429s."""
+    def __init__(self, tpm: int = 1_000_000, rpm: int = 3_000):
+        self.tpm, self.rpm = float(tpm), float(rpm)
+        self.tokens, self.requests = float(tpm), float(rpm)
+        self.updated = time.monotonic()
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                el = now - self.updated
+                self.updated = now
+                self.tokens = min(self.tpm, self.tokens + el * self.tpm / 60.0)
+                self.requests = min(self.rpm, self.requests + el * self.rpm / 60.0)
+                if now >= self.pause_until and self.tokens >= tokens and self.requests >= 1:
+                    self.tokens -= tokens
+                    self.requests -= 1
+                    return
+                wait_s = max(
+                    self.pause_until - now,
+                    (tokens - self.tokens) * 60.0 / self.tpm,
+                    (1 - self.requests) * 60.0 / self.rpm,
+                    0.01,
+                )
+            time.sleep(wait_s)
+
+    def backoff(self, attempt: int):
+        delay = min(60.0, 2.0 ** attempt) * (0.5 + random.random())
+        with self.lock:
+            self.pause_until = max(self.pause_until, time.monotonic() + delay)
+
+RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+def run_pipeline(records: List[Dict],
+                 embed_fn: Callable[[List[str]], List[List[float]]],
+                 write_fn: Callable[[List[Dict], List[List[float]]], None],
+                 on_batch_done: Callable[[List[Dict]], None] = lambda batch: None,
+                 concurrency: int = 4,
+                 limiter: RateLimiter | None = None,
+                 max_tokens: int = 60_000,
+                 max_inputs: int = 512,
+                 max_attempts: int = 8) -> Dict[str, float]:
+    limiter = limiter or RateLimiter()
+    batches = pack_batches(records, max_tokens=max_tokens, max_inputs=max_inputs)
+    stats = {"batches": len(batches), "records": 0, "tokens": 0, "retries": 0}
+    t0 = time.time()
+
+    def embed_batch(batch):
+        n = sum(r["_ntoks"] for r in batch)
+        for attempt in range(max_attempts):
+            limiter.acquire(n)
+            try:
+                return batch, embed_fn([r.get("_embed_text", r["text"]) for r in batch])
+            except RETRYABLE:
+                if attempt == max_attempts - 1: raise
+                stats["retries"] += 1
+                limiter.backoff(attempt)
+
+    writes: "queue.Queue" = queue.Queue(maxsize=max(2, concurrency))
+    write_errors = []
+
+    def writer():
+        while True:
+            item = writes.get()
+            if item is None: return
+            if write_errors: continue  # drain after a failure
+            batch, embs = item
+            try:
+                write_fn(batch, embs)
+                on_batch_done(batch)
+                stats["records"] += len(batch)
+                stats["tokens"] += sum(r["_ntoks"] for r in batch)
+                el = time.time() - t0
+                print(f"   + wrote {len(batch)} (total {stats['records']}/{len(records)}, {stats['records']/max(el,1e-9):.0f} rows/s)")
+            except Exception as e:
+                write_errors.append(e)
+
+    wt = threading.Thread(target=writer, daemon=True)
+    wt.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            inflight = set()
+            for batch in batches:
+                if write_errors: break
+                if len(inflight) >= concurrency:
+                    done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                    for f in done: writes.put(f.result())
+                inflight.add(ex.submit(embed_batch, batch))
+            for f in inflight:
+                writes.put(f.result())
+    finally:
+        writes.put(None)
+        wt.join()
+    if write_errors:
+        raise write_errors[0]
+    stats["seconds"] = time.time() - t0
+    return stats
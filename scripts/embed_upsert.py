@@ -1,16 +1,21 @@
-import os, json, glob, hashlib, time
+import os, sys, json, glob, hashlib, time, argparse
 from pathlib import Path
 from typing import List, Dict
 
-from tenacity import retry, wait_exponential, stop_after_attempt
 from pymilvus import connections, Collection, utility, MilvusException
 from openai import OpenAI
 
+from embed_pipeline import RateLimiter, run_pipeline
+
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from api.embedding_profile import EmbeddingProfile, field_dim, check_dim
+
 EXPORTS = ROOT / "data" / "exports"
 LOGS = ROOT / "data" / "logs"
+STATE = ROOT / "data" / "state" / "embed_state.json"
 
-OPENAI_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+PROFILE = EmbeddingProfile.from_env()  # model + EMBED_DIMENSIONS; must match the collection's text_dense dim
 ZILLIZ_URI = os.getenv("ZILLIZ_URI")
 ZILLIZ_TOKEN = os.getenv("ZILLIZ_TOKEN")
 
@@ -27,10 +32,9 @@ def batched(it, n=64):
             yield buf; buf=[]
     if buf: yield buf
 
-@retry(wait=wait_exponential(min=1, max=20), stop=stop_after_attempt(6))
 def embed_texts(texts: List[str]) -> List[List[float]]:
-    # OpenAI returns ordered embeddings for inputs
-    resp = client.embeddings.create(model=OPENAI_MODEL, input=texts)
+    # OpenAI returns ordered embeddings for inputs; retries/backoff live in embed_pipeline
+    resp = client.embeddings.create(**PROFILE.create_kwargs(), input=texts)
     return [e.embedding for e in resp.data]
 
 def get_collection(name="brl_chunks") -> Collection:
@@ -40,10 +44,46 @@ def get_collection(name="brl_chunks") -> Collection:
 def fingerprint(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
-def already_loaded_hashes(col: Collection) -> set:
-    # If you added a scalar unique 'hash', we can query existing to skip (optional).
-    # For large sets this can be expensive; we’ll just skip this step and rely on PK uniqueness.
-    return set()
+def collection_hashes(col: Collection) -> Dict[str, str]:
+    """id -> hash for every row already in the collection (one paged scan, no vectors)."""
+    out = {}
+    it = col.query_iterator(batch_size=5000, expr="", output_fields=["id", "hash"])
+    while True:
+        batch = it.next()
+        if not batch: break
+        for r in batch:
+            out[r["id"]] = r.get("hash") or ""
+    it.close()
+    return out
+
+def load_state() -> Dict[str, str]:
+    if STATE.exists():
+        return json.loads(STATE.read_text(encoding="utf-8"))
+    return {}
+
+def save_state(state: Dict[str, str]):
+    STATE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, STATE)
+
+def load_exports() -> Dict[str, Dict]:
+    records = {}
+    for path in sorted(glob.glob(str(EXPORTS / "*_children.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip(): continue
+                r = json.loads(line)
+                r["hash"] = r.get("hash") or fingerprint(r["text"])
+                records[r["id"]] = r
+    return records
+
+def diff(records: Dict[str, Dict], known: Dict[str, str]):
+    added = [i for i in records if i not in known]
+    changed = [i for i in records if i in known and known[i] != records[i]["hash"]]
+    removed = [i for i in known if i not in records]
+    unchanged = len(records) - len(added) - len(changed)
+    return added, changed, removed, unchanged
 
 def record_to_row(r: Dict) -> Dict:
     # Ensure required fields exist; fill defaults
@@ -65,38 +105,78 @@ def record_to_row(r: Dict) -> Dict:
     }
 
 def upsert_rows(col: Collection, rows: List[Dict]):
-    # Pymilvus accepts dict rows with all fields present
+    # Pymilvus accepts dict rows with all fields present; upsert replaces rows with the same PK
     try:
-        col.insert(rows)
+        col.upsert(rows)
     except MilvusException as e:
         # Show a compact error
         raise
 
+def delete_ids(col: Collection, ids: List[str]):
+    for chunk in batched(ids, n=500):
+        col.delete(expr=f"id in {json.dumps(chunk, ensure_ascii=False)}")
+
 def main():
+    ap = argparse.ArgumentParser(description="Sync data/exports children into Zilliz (embed only new/changed chunks).")
+    ap.add_argument("--full", action="store_true", help="re-embed and upsert every chunk (removed chunks are still deleted)")
+    ap.add_argument("--from-collection", action="store_true",
+                    help="diff against id/hash in the collection instead of the local state file "
+                         "(default when no state file exists yet)")
+    ap.add_argument("--dry-run", action="store_true", help="only report what would change")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("EMBED_CONCURRENCY", "4")),
+                    help="embedding requests in flight")
+    ap.add_argument("--tpm", type=int, default=int(os.getenv("EMBED_TPM", "1000000")), help="token/min budget")
+    ap.add_argument("--rpm", type=int, default=int(os.getenv("EMBED_RPM", "3000")), help="request/min budget")
+    ap.add_argument("--batch-tokens", type=int, default=60_000, help="max tokens per embeddings request")
+    ap.add_argument("--batch-inputs", type=int, default=512, help="max inputs per embeddings request")
+    args = ap.parse_args()
+
     col = get_collection()
-    total = 0
-    for path in sorted(glob.glob(str(EXPORTS / "*_children.jsonl"))):
-        work_id = Path(path).name.replace("_children.jsonl","")
-        print(f"==> Processing {work_id}")
-        # Read JSONL
-        records=[]
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip(): continue
-                records.append(json.loads(line))
-        # Batch embed and upsert
-        for chunk in batched(records, n=64):
-            texts = [r["text"] for r in chunk]
-            embs = embed_texts(texts)
-            rows=[]
-            for r, e in zip(chunk, embs):
-                row = record_to_row(r)
-                row["text_dense"] = e
-                rows.append(row)
-            upsert_rows(col, rows)
-            total += len(rows)
-            print(f"   + upserted {len(rows)} (running total {total})")
-    print(f"Done. Upserted {total} child chunks.")
+    check_dim(PROFILE, field_dim(col), "brl_chunks.text_dense")
+    records = load_exports()
+    if args.full or args.from_collection or not STATE.exists():
+        known = collection_hashes(col)  # --full too: the ids already stored drive the delete pass
+    else:
+        known = load_state()
+    added, changed, removed, unchanged = diff(records, known)
+    if args.full:
+        changed, unchanged = [i for i in records if i in known], 0
+    print(f"==> added {len(added)} | changed {len(changed)} | removed {len(removed)} | unchanged {unchanged}")
+    if args.dry_run:
+        return
+
+    state = dict(known)
+    todo = [records[i] for i in added + changed]
+
+    def write(batch: List[Dict], embs: List[List[float]]):
+        rows=[]
+        for r, e in zip(batch, embs):
+            row = record_to_row(r)
+            row["text_dense"] = e
+            rows.append(row)
+        upsert_rows(col, rows)
+
+    def checkpoint(batch: List[Dict]):
+        # an interrupted run resumes from here (re-run without --full)
+        for r in batch:
+            state[r["id"]] = r["hash"]
+        save_state(state)
+
+    stats = run_pipeline(
+        todo, embed_texts, write, on_batch_done=checkpoint,
+        concurrency=args.concurrency, limiter=RateLimiter(tpm=args.tpm, rpm=args.rpm),
+        max_tokens=args.batch_tokens, max_inputs=args.batch_inputs,
+    ) if todo else {}
+    if removed:
+        delete_ids(col, removed)
+        for i in removed:
+            state.pop(i, None)
+        save_state(state)
+        print(f"   - deleted {len(removed)}")
+    LOGS.mkdir(parents=True, exist_ok=True)
+    summary = {"added": len(added), "changed": len(changed), "removed": len(removed), "unchanged": unchanged, **stats}
+    (LOGS / f"embed_sync_{time.strftime('%Y%m%d-%H%M%S')}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    print(f"Done. {json.dumps(summary)}")
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,109 @@
+"""
+Recall vs memory vs latency for embedding profiles (api/embedding_profile.py), offline.
+
+Every setting is cut from one full-precision local index (data/index): dimensions by
+Matryoshka truncation, int8 / binary codes computed in memory, two-stage search with
+--rescore. Queries are the golden set (recorded fixture vectors, see bench_retrieval.py)
+plus --synthetic corpus rows.
+
+  recall@k    overlap with the exact top-k of the full-size float index
+  hit@k/mrr   expected work in the top k (golden work ids; a synthetic query's own work)
+  scan MB     matrix every query scans; rescore MB is only touched for candidates
+
+  python3 scripts/embedding_report.py
+  python3 scripts/embedding_report.py --dims 1024,512,256 --quants none,int8,binary --rescore 4
+"""
+import os, sys, csv, json, time, random, argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+GOLDEN = ROOT / "eval" / "golden_set.csv"
+REPORT = ROOT / "eval" / "embedding_report.json"
+
+from bench_retrieval import FIXTURE, load_fixture, quality, summarize
+
+def load_queries(index, fixture: Path, synthetic: int, seed: int = 0) -> List[Dict]:
+    from api.embed_cache import normalize_query
+    vectors = load_fixture(fixture) if fixture.exists() else {}
+    out = []
+    for r in csv.DictReader(open(GOLDEN, newline="", encoding="utf-8")):
+        vec = vectors.get(normalize_query(r["question"]))
+        if vec is not None and len(vec) >= index.dim:
+            out.append({"question": r["question"], "expected": r["expected_work_id"], "golden": True, "vector": vec})
+    rng = random.Random(seed)
+    for row in rng.sample(range(len(index.ids)), min(synthetic, len(index.ids))):
+        doc = index.row_to_doc[row]
+        if doc < 0: continue
+        rec = index.corpus.children[doc]
+        out.append({"question": rec["id"], "expected": rec["work_id"], "golden": False,
+                    "vector": np.asarray(index.X[row], dtype=np.float32)})
+    return out
+
+def run_setting(index, queries: List[Dict], truth: List[List[str]], k: int) -> Dict:
+    lat, recall, scores = [], [], []
+    for q, exact in zip(queries, truth):
+        t = time.perf_counter()
+        hits = index.search(q["vector"], k)[0]
+        lat.append((time.perf_counter() - t) * 1000)
+        ids = [h.id for h in hits]
+        recall.append(len(set(ids) & set(exact)) / max(1, len(exact)))
+        scores.append(quality([h.fields for h in hits], q["expected"]))
+    mean = lambda key: float(np.mean([s[key] for s in scores])) if scores else 0.0
+    mem = index.memory()
+    return {
+        f"recall@{k}": float(np.mean(recall)) if recall else 0.0,
+        **{key: mean(key) for key in ("hit@5", "hit@10", "mrr@10")},
+        "scan_mb": mem["scan_bytes"] / 2**20, "rescore_mb": mem["rescore_bytes"] / 2**20,
+        "latency_ms": summarize(lat),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=os.getenv("LOCAL_INDEX_DIR", str(ROOT / "data" / "index")))
+    ap.add_argument("--fixture", default=str(FIXTURE))
+    ap.add_argument("--synthetic", type=int, default=200)
+    ap.add_argument("--dims", default="1536,1024,512,256", help="reduced sizes to try (the full size is always included)")
+    ap.add_argument("--quants", default="none,int8,binary")
+    ap.add_argument("--rescore", type=int, default=4, help="candidates = k * rescore for quantized scans")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--out", default=str(REPORT))
+    args = ap.parse_args()
+
+    os.chdir(ROOT)
+    from api.local_index import LocalIndex
+    from api.embedding_profile import reduce_dims
+    full = LocalIndex(args.index_dir)
+    X = np.asarray(full.X, dtype=np.float32)
+    queries = load_queries(full, Path(args.fixture), args.synthetic)
+    if not queries:
+        sys.exit("no queries: record the fixture (bench_retrieval.py --record) or pass --synthetic N")
+    print(f"==> {len(full.ids)} x {full.dim} index, {len(queries)} queries "
+          f"({sum(q['golden'] for q in queries)} golden), k={args.k}, rescore={args.rescore}")
+    truth = [[h.id for h in full.search(q["vector"], args.k)[0]] for q in queries]
+
+    dims = [full.dim] + sorted({int(d) for d in args.dims.split(",") if d.strip() and 0 < int(d) < full.dim}, reverse=True)
+    rows = []
+    for d in dims:
+        Xd = reduce_dims(X, d)
+        for quant in [q.strip() for q in args.quants.split(",") if q.strip()]:
+            index = LocalIndex(corpus=full.corpus, quant=quant, rescore=args.rescore, X=Xd, ids=full.ids)
+            r = {"dimensions": d, "quant": quant, **run_setting(index, queries, truth, args.k)}
+            rows.append(r)
+            print(f"{d:>5}d {quant:<7} recall@{args.k} {r[f'recall@{args.k}']:.3f}  hit@5 {r['hit@5']:.3f}  "
+                  f"mrr@10 {r['mrr@10']:.3f}  scan {r['scan_mb']:8.1f} MB  rescore {r['rescore_mb']:8.1f} MB  "
+                  f"p50 {r['latency_ms']['p50']:6.2f}  p95 {r['latency_ms']['p95']:6.2f} ms")
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps({
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "index": {"rows": len(full.ids), "dim": full.dim},
+        "k": args.k, "rescore": args.rescore, "n_queries": len(queries), "settings": rows,
+    }, indent=2), encoding="utf-8")
+    print(f"Wrote {args.out}")
+
+if __name__=="__main__":
+    main()
@@ -1,16 +1,20 @@
-import csv, json, os, statistics, time
+import csv, json, os, sys, statistics, time
 from pathlib import Path
 from dotenv import load_dotenv
 from pymilvus import connections, Collection
 from openai import OpenAI
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api.embedding_profile import EmbeddingProfile
+
 load_dotenv()
+PROFILE = EmbeddingProfile.from_env()
 ZILLIZ_URI=os.getenv("ZILLIZ_URI"); ZILLIZ_TOKEN=os.getenv("ZILLIZ_TOKEN")
 assert ZILLIZ_URI and ZILLIZ_TOKEN, "ZILLIZ_URI/ZILLIZ_TOKEN missing"
 client = OpenAI()
 
 def embed(q):
-    return client.embeddings.create(model="text-embedding-3-large", input=[q]).data[0].embedding
+    return client.embeddings.create(**PROFILE.create_kwargs(), input=[q]).data[0].embedding
 
 def dense_search(col, q, k=10):
     e = embed(q)
@@ -46,6 +50,7 @@ def main():
 
     rpt={
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "embedding": PROFILE.to_dict(),
         "n": len(rows),
         "hit@5": statistics.mean([r["hit@5"] for r in results]) if results else 0.0,
         "hit@10": statistics.mean([r["hit@10"] for r in results]) if results else 0.0,
@@ -0,0 +1,190 @@
+"""
+Closed-loop load test: N concurrent clients, each sending its next request as soon as
+the previous one returns (after Retry-After on 429/503). Reports throughput and p50/p95/p99
+per concurrency level.
+
+  python3 scripts/load_test.py --url http://127.0.0.1:8000 --path /answer
+  python3 scripts/load_test.py --stub                          # spawn the API with stubbed upstreams
+  python3 scripts/load_test.py --stub --app-root /tmp/old-tree # same, for another checkout (A/B)
+  python3 scripts/load_test.py --stub --probe /search --probe /healthz   # latency of light routes during the burst
+
+--stub serves api.app from --app-root on a local port with RETRIEVAL_BACKEND=local and the
+OpenAI clients replaced by stubs that only sleep (--embed-ms, --llm-ms), so the numbers
+show how the request path overlaps upstream waits, not how fast OpenAI is.
+"""
+import os, sys, csv, json, time, types, random, asyncio, argparse, subprocess, statistics
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+GOLDEN = ROOT / "eval" / "golden_set.csv"
+
+def pct(xs: List[float], p: float) -> float:
+    if not xs: return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))]
+
+def serve_stub(app_root: str, port: int, embed_ms: float, llm_ms: float):
+    """Child process: api.app with sleeping stand-ins for the OpenAI clients."""
+    os.chdir(app_root)
+    sys.path.insert(0, app_root)
+    os.environ.setdefault("RETRIEVAL_BACKEND", "local")
+    os.environ.setdefault("OPENAI_API_KEY", "load-test")
+    os.environ.setdefault("PROMPT_ID", "load-test")
+    os.environ.update(EMBED_CACHE_SIZE="0", EMBED_CACHE_PATH="", ANSWER_CACHE_SIZE="0")
+    import uvicorn
+    import api.app as A
+    A.STARTUP.load_all()
+    dim = A.LOCAL_INDEX.dim if A.LOCAL_INDEX is not None else 3072
+
+    def vectors(n):
+        return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=[random.random() for _ in range(dim)]) for _ in range(n)])
+    answer = types.SimpleNamespace(output_text="(stub answer)", usage=types.SimpleNamespace(input_tokens=0, output_tokens=0))
+
+    class Embeddings:
+        def create(self, model, input, **kw):
+            time.sleep(embed_ms / 1000.0); return vectors(len(input))
+    class Responses:
+        def create(self, **kw):
+            time.sleep(llm_ms / 1000.0); return answer
+    class AsyncEmbeddings:
+        async def create(self, model, input, **kw):
+            await asyncio.sleep(embed_ms / 1000.0); return vectors(len(input))
+    class AsyncResponses:
+        async def create(self, **kw):
+            await asyncio.sleep(llm_ms / 1000.0); return answer
+
+    A.client = types.SimpleNamespace(embeddings=Embeddings(), responses=Responses())
+    A.aclient = types.SimpleNamespace(embeddings=AsyncEmbeddings(), responses=AsyncResponses())
+    uvicorn.run(A.app, host="127.0.0.1", port=port, log_level="warning")
+
+def spawn_stub(args) -> subprocess.Popen:
+    cmd = [sys.executable, __file__, "--serve-stub", "--app-root", args.app_root, "--port", str(args.port),
+           "--embed-ms", str(args.embed_ms), "--llm-ms", str(args.llm_ms)]
+    proc = subprocess.Popen(cmd)
+    import httpx
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/healthz", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            sys.exit("stub server exited during startup")
+        time.sleep(0.25)
+    proc.kill()
+    sys.exit("stub server did not become healthy")
+
+def _summary(lat: List[float], status: Dict[int, int]) -> Dict:
+    return {"n": len(lat), "status": status, "p50": pct(lat, 50), "p95": pct(lat, 95), "p99": pct(lat, 99)}
+
+async def run_level(url: str, path: str, bodies: List[Dict], concurrency: int, total: int, timeout: float,
+                    probes: List[str] = ()) -> Dict:
+    """`probes`: paths hit by one extra client each (POST /search..., GET otherwise) while the level runs."""
+    import httpx
+    lat: List[float] = []
+    status: Dict[int, int] = {}
+    it = iter(range(total))
+    done = asyncio.Event()
+    probe_lat: Dict[str, List[float]] = {p: [] for p in probes}
+    probe_status: Dict[str, Dict[int, int]] = {p: {} for p in probes}
+
+    async def probe(client, p):
+        i = 0
+        while not done.is_set():
+            t = time.perf_counter()
+            try:
+                if p.startswith("/search"):
+                    r = await client.post(p, json=bodies[i % len(bodies)])
+                else:
+                    r = await client.get(p)
+                code = r.status_code
+            except httpx.HTTPError:
+                code = 0
+            probe_lat[p].append((time.perf_counter() - t) * 1000)
+            probe_status[p][code] = probe_status[p].get(code, 0) + 1
+            i += 1
+            await asyncio.sleep(0.05)
+
+    async def worker(client):
+        for i in it:
+            t = time.perf_counter()
+            try:
+                r = await client.post(path, json=bodies[i % len(bodies)])
+                code = r.status_code
+            except httpx.HTTPError:
+                code = 0
+            lat.append((time.perf_counter() - t) * 1000)
+            status[code] = status.get(code, 0) + 1
+            if code in (429, 503):  # back off like a well-behaved client
+                await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+
+    async def workers(client):
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        done.set()
+
+    n = concurrency + len(probes)
+    limits = httpx.Limits(max_connections=n, max_keepalive_connections=n)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(workers(client), *[probe(client, p) for p in probes])
+        wall = time.perf_counter() - t0
+    ok = status.get(200, 0)
+    return {
+        "concurrency": concurrency, "requests": total, "ok": ok, "status": status,
+        "throughput_rps": ok / wall, "p50": pct(lat, 50), "p95": pct(lat, 95), "p99": pct(lat, 99),
+        "mean": statistics.mean(lat) if lat else 0.0,
+        "probes": {p: _summary(probe_lat[p], probe_status[p]) for p in probes},
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default=None, help="target API; default is the --stub server")
+    ap.add_argument("--path", default="/answer")
+    ap.add_argument("--levels", default="25,50,100")
+    ap.add_argument("--requests", type=int, default=0, help="requests per level (default 4x concurrency)")
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--repeat-queries", action="store_true", help="reuse identical queries (lets caches/coalescing kick in)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--probe", action="append", default=[], help="path to sample with one client during each level (repeatable)")
+    ap.add_argument("--out", help="write results as JSON")
+    ap.add_argument("--stub", action="store_true")
+    ap.add_argument("--app-root", default=str(ROOT))
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--embed-ms", type=float, default=60.0)
+    ap.add_argument("--llm-ms", type=float, default=1500.0)
+    ap.add_argument("--startup-timeout", type=float, default=120.0)
+    ap.add_argument("--serve-stub", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve_stub:
+        serve_stub(args.app_root, args.port, args.embed_ms, args.llm_ms)
+        return
+
+    questions = [r["question"] for r in csv.DictReader(open(GOLDEN, newline="", encoding="utf-8"))]
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    proc = spawn_stub(args) if args.stub or not args.url else None
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    rows = []
+    try:
+        for c in levels:
+            total = args.requests or 4 * c
+            bodies = [{"query": q if args.repeat_queries else f"{q} ({i})", "k": args.k}
+                      for i, q in enumerate(questions * (total // len(questions) + 1))][:total]
+            r = asyncio.run(run_level(url, args.path, bodies, c, total, args.timeout, args.probe))
+            rows.append(r)
+            print(f"{args.path:<8} c={c:<4} {r['throughput_rps']:7.1f} req/s  p50 {r['p50']:8.0f}  p95 {r['p95']:8.0f}  "
+                  f"p99 {r['p99']:8.0f} ms  ok {r['ok']}/{total}  status {r['status']}")
+            for p, pr in r["probes"].items():
+                print(f"  probe {p:<10} n={pr['n']:<5} p50 {pr['p50']:8.0f}  p95 {pr['p95']:8.0f}  p99 {pr['p99']:8.0f} ms  "
+                      f"status {pr['status']}")
+    finally:
+        if proc is not None:
+            proc.terminate(); proc.wait()
+    if args.out:
+        Path(args.out).write_text(json.dumps({"url": url, "path": args.path, "stub": proc is not None,
+                                              "embed_ms": args.embed_ms, "llm_ms": args.llm_ms, "levels": rows}, indent=2))
+
+if __name__=="__main__":
+    main()
@@ -1,7 +1,9 @@
-import os, json, hashlib, time, sys
+import os, json, hashlib, time, sys, argparse
 from pathlib import Path
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -10,8 +12,11 @@ ORIG = ROOT / "data" / "originals"
 NORM = ROOT / "data" / "normalized"
 LOGS = ROOT / "data" / "logs"
 
+FETCH_WORKERS = 8
+
 SESSION = requests.Session()
 SESSION.headers.update({"User-Agent": "bahai-assistant/phase4 (+https://www.bahai.org/legal)"})
+# the HTTPS adapter is mounted in main(), with one pooled connection per fetch worker
 
 
 def sha256_bytes(b: bytes) -> str:
@@ -20,10 +25,24 @@ def sha256_bytes(b: bytes) -> str:
     return h.hexdigest()
 
 
-def download_xhtml(url: str) -> bytes:
-    resp = SESSION.get(url, timeout=60)
+def download_xhtml(url: str, etag: str | None = None, last_modified: str | None = None):
+    """Conditional GET. Returns (content or None on 304, response headers)."""
+    headers = {}
+    if etag: headers["If-None-Match"] = etag
+    if last_modified: headers["If-Modified-Since"] = last_modified
+    resp = SESSION.get(url, timeout=60, headers=headers)
+    if resp.status_code == 304:
+        return None, resp.headers
     resp.raise_for_status()
-    return resp.content
+    return resp.content, resp.headers
+
+
+def read_local_source(source_dir: Path, work_id: str) -> bytes:
+    """Offline stand-in for the website: <dir>/<work_id>.xhtml or <dir>/<work_id>/source.xhtml."""
+    for p in (source_dir / f"{work_id}.xhtml", source_dir / work_id / "source.xhtml"):
+        if p.exists():
+            return p.read_bytes()
+    raise FileNotFoundError(f"no local source for {work_id} in {source_dir}")
 
 
 def normalize_html(xhtml: bytes, base_url: str) -> bytes:
@@ -60,8 +79,38 @@ def normalize_html(xhtml: bytes, base_url: str) -> bytes:
     return out.encode("utf-8")
 
 
-def process_manifest(p: Path):
+def is_current(m: dict, norm_path: Path) -> bool:
+    """Normalized output exists and still matches the hash recorded in the manifest."""
+    return bool(m.get("normalized_hash")) and norm_path.exists() and sha256_bytes(norm_path.read_bytes()) == m["normalized_hash"]
+
+
+def fetch_manifest(p: Path, source_dir: Path | None = None, force: bool = False):
+    """
+    Fetch stage for one manifest. Returns (manifest, content or None, http_meta, status);
+    content is None when the work is unchanged and can skip parsing entirely.
+    """
     m = json.loads(p.read_text(encoding="utf-8"))
+    norm_path = NORM / f"{m['work_id']}.html"
+    current = not force and is_current(m, norm_path)
+    http = dict(m.get("http") or {})
+    if source_dir is not None:
+        content = read_local_source(source_dir, m["work_id"])
+    else:
+        content, headers = download_xhtml(
+            m["html_url"],
+            etag=http.get("etag") if current else None,
+            last_modified=http.get("last_modified") if current else None,
+        )
+        if headers.get("ETag"): http["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"): http["last_modified"] = headers["Last-Modified"]
+        if content is None:
+            return m, None, http, "not-modified"
+    if current and sha256_bytes(content) == (m.get("hashes") or {}).get("html"):
+        return m, None, http, "unchanged"
+    return m, content, http, "changed"
+
+
+def write_outputs(p: Path, m: dict, content: bytes, normalized: bytes, http: dict):
     work_id = m["work_id"]
     html_url = m["html_url"]
     downloads_page = m.get("downloads_page_url") or str(Path(html_url).parent) + "/"
@@ -72,13 +121,8 @@ def process_manifest(p: Path):
     src_path = work_dir / "source.xhtml"
     norm_path = NORM / f"{work_id}.html"
 
-    # Download (idempotent; only re-download if missing or forced)
-    content = download_xhtml(html_url)
     src_hash = sha256_bytes(content)
     src_path.write_bytes(content)
-
-    # Normalize
-    normalized = normalize_html(content, html_url)
     norm_hash = sha256_bytes(normalized)
     norm_path.write_bytes(normalized)
 
@@ -88,13 +132,14 @@ def process_manifest(p: Path):
     m["normalized_path"] = str(norm_path.as_posix())
     m["normalized_hash"] = norm_hash
     m["about_page_url"] = downloads_page
+    if http: m["http"] = http
     # Ensure license URL present
     m["license_terms_url"] = "https://www.bahai.org/legal"
-
-    p.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_manifest(p, m)
 
     return {
         "work_id": work_id,
+        "status": "changed",
         "src_hash": src_hash,
         "norm_hash": norm_hash,
         "src_path": str(src_path),
@@ -102,16 +147,81 @@ def process_manifest(p: Path):
     }
 
 
+def write_manifest(p: Path, m: dict):
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps(m, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+def _normalize(args):
+    content, url = args
+    try:
+        return normalize_html(content, url), None
+    except Exception as e:
+        return None, e
+
+
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--force", action="store_true", help="re-fetch and re-normalize every work")
+    ap.add_argument("--source-dir", type=Path, help="read <work_id>.xhtml from this directory instead of the web")
+    ap.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS, help="concurrent downloads")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="normalization processes")
+    args = ap.parse_args()
+
+    workers = max(1, args.fetch_workers)
+    SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=workers))
     LOGS.mkdir(parents=True, exist_ok=True)
-    results = []
-    for mp in sorted(MANIFESTS.glob("*.json")):
+    NORM.mkdir(parents=True, exist_ok=True)
+    mpaths = sorted(MANIFESTS.glob("*.json"))
+    t0 = time.time()
+
+    # 1) fetch concurrently; unchanged works drop out before any parsing
+    def fetch(p):
+        try:
+            return p, fetch_manifest(p, args.source_dir, args.force), None
+        except Exception as e:
+            return p, None, e
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        fetched = list(ex.map(fetch, mpaths))
+
+    results, changed = [], []
+    written = skipped = failed = 0
+    for p, r, err in fetched:
+        if err is not None:
+            failed += 1
+            print(f"[ERROR] {p.name}: {err}", file=sys.stderr); continue
+        m, content, http, status = r
+        if content is None:
+            if http != (m.get("http") or {}):
+                m["http"] = http
+                write_manifest(p, m)
+            results.append({"work_id": m["work_id"], "status": status})
+            skipped += 1
+            print(f"[SKIP] {m['work_id']}  {status}")
+            continue
+        changed.append((p, m, content, http))
+    t_fetch = time.time() - t0
+
+    # 2) normalize changed works in parallel processes
+    jobs = [(content, m["html_url"]) for _, m, content, _ in changed]
+    if args.jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as ex:
+            normalized = list(ex.map(_normalize, jobs))
+    else:
+        normalized = [_normalize(j) for j in jobs]
+    for (p, m, content, http), (norm, err) in zip(changed, normalized):
         try:
-            r = process_manifest(mp)
+            if err is not None: raise err
+            r = write_outputs(p, m, content, norm, http)
             results.append(r)
+            written += 1
             print(f"[OK] {r['work_id']}  src:{r['src_hash'][:8]}  norm:{r['norm_hash'][:8]}")
         except Exception as e:
-            print(f"[ERROR] {mp.name}: {e}", file=sys.stderr)
+            failed += 1
+            print(f"[ERROR] {p.name}: {e}", file=sys.stderr)
+    print(f"Done. {written} written, {skipped} skipped, {failed} failed "
+          f"(fetch {t_fetch:.1f}s, total {time.time() - t0:.1f}s)")
     # Write a run log
     ts = time.strftime("%Y%m%d-%H%M%S")
     (LOGS / f"phase4_normalize_{ts}.json").write_text(
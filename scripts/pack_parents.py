@@ -0,0 +1,21 @@
+"""
+Pack data/exports/*_parents.jsonl into the mmap parent store used by the API
+(data/index/parents.bin + parents.ids + parents.offsets.npy + parents.fingerprint).
+
+  python3 scripts/pack_parents.py
+"""
+import sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from api.parent_store import pack_parents
+
+def main():
+    t0 = time.time()
+    n = pack_parents(str(ROOT / "data" / "exports"), str(ROOT / "data" / "index"))
+    print(f"Done. Packed {n} parents ({time.time()-t0:.1f}s)")
+
+if __name__=="__main__":
+    main()
@@ -65,7 +65,7 @@ def main():
         )
         print_hits("Hybrid (RRF)", fused)
     else:
-        print("\n(No SparseSearchRequest in this wheel; dense works. If you want, I can add a client-side BM25+RRF fallback.)")
+        print("\n(No SparseSearchRequest in this wheel; the API uses the client-side BM25 index in api/bm25.py + RRF instead.)")
 
 if __name__=="__main__":
     main()